@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from app.observability.metrics import record_cache
+
+# =========================
+# CONFIG
+# =========================
+ANALYSIS_CACHE_PATH = os.environ.get("ANALYSIS_CACHE_PATH", "app/ai/analysis_cache.sqlite3")
+ANALYSIS_CACHE_TTL = int(os.environ.get("ANALYSIS_CACHE_TTL", "86400"))
+ANALYSIS_CACHE_MEMORY_SIZE = int(os.environ.get("ANALYSIS_CACHE_MEMORY_SIZE", "512"))
+
+
+def analysis_cache_key(email_text, model_name, date_context):
+    """
+    Hash del body normalizado + modelo + contexto de fecha del prompt.
+    Dos correos iguales (p. ej. la misma newsletter) comparten entrada.
+    """
+    normalized = re.sub(r"\s+", " ", email_text).strip()
+    raw = f"{model_name}\n{date_context}\n{normalized}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """
+    Cache de resultados de analyze_email_structured en dos niveles:
+    LRU en memoria delante de una tabla SQLite, ambos con caducidad por TTL.
+    """
+
+    def __init__(self, path=ANALYSIS_CACHE_PATH, ttl=ANALYSIS_CACHE_TTL,
+                 memory_size=ANALYSIS_CACHE_MEMORY_SIZE):
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[1] < self.ttl:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                record_cache("analysis", hits=1)
+                self.memory_hits += 1
+                return dict(entry[0])
+
+            row = self._conn.execute(
+                "SELECT value, created_at FROM analyses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] < self.ttl:
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                self.hits += 1
+                record_cache("analysis", hits=1)
+                return dict(value)
+
+            if entry or row:
+                self._evict(key)
+            self.misses += 1
+            record_cache("analysis", misses=1)
+            return None
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analyses (key, value, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now),
+            )
+            self._remember(key, dict(value), now)
+
+    def purge_expired(self):
+        """Borra del nivel persistente las entradas caducadas."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM analyses WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict(self, key):
+        self._memory.pop(key, None)
+        with self._conn:
+            self._conn.execute("DELETE FROM analyses WHERE key = ?", (key,))
+
+
+_cache = None
+# Se pide desde varios hilos del threadpool a la vez: sin lock se podían crear dos caches
+_cache_lock = threading.Lock()
+
+
+def get_analysis_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnalysisCache()
+            _cache.purge_expired()
+    return _cache
@@ -0,0 +1,227 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.ai.email_analysis_service import analyze_email_structured
+from app.auth.google_auth import OAuthRedirect, get_gmail_service, is_logged_in
+from app.auth.quota import background_priority
+from app.gmail.message_store import (
+    add_new_messages_listener,
+    get_message_store,
+    get_stored_message,
+    remove_new_messages_listener,
+    sync_message_store,
+)
+
+# =========================
+# CONFIG
+# =========================
+ANALYSIS_WORKER_ENABLED = os.environ.get("ANALYSIS_WORKER_ENABLED", "1") == "1"
+ANALYSIS_WORKER_CONCURRENCY = int(os.environ.get("ANALYSIS_WORKER_CONCURRENCY", "2"))
+ANALYSIS_WORKER_RPM = int(os.environ.get("ANALYSIS_WORKER_RPM", "15"))
+ANALYSIS_WORKER_MAX_ATTEMPTS = int(os.environ.get("ANALYSIS_WORKER_MAX_ATTEMPTS", "3"))
+ANALYSIS_WORKER_BACKOFF_SECONDS = float(os.environ.get("ANALYSIS_WORKER_BACKOFF_SECONDS", "2"))
+GMAIL_POLL_INTERVAL_SECONDS = float(os.environ.get("GMAIL_POLL_INTERVAL_SECONDS", "60"))
+
+# Solo se pre-analiza el correo que llega a la bandeja de entrada
+PREANALYZE_LABEL = "INBOX"
+
+
+class RateLimiter:
+    """Como mucho `per_minute` llamadas en cualquier ventana de 60 segundos."""
+
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self._calls = deque()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= 60:
+                    self._calls.popleft()
+                if len(self._calls) < self.per_minute:
+                    self._calls.append(now)
+                    return
+                await asyncio.sleep(60 - (now - self._calls[0]))
+
+
+class AnalysisWorker:
+    """
+    Cola de pre-análisis de correos nuevos.
+
+    - enqueue() deduplica: un mensaje en cola, en curso o ya analizado no se repite
+    - como mucho `concurrency` análisis a la vez y `per_minute` por minuto
+    - si el análisis o la descarga del mensaje fallan se reintenta con backoff exponencial
+    - solo escucha los mensajes nuevos del almacén mientras está arrancado
+    - el resultado se guarda en el almacén de mensajes (y en la cache de análisis)
+
+    analyze_fn y get_service se pueden sustituir (p. ej. un Gemini falso en pruebas).
+    """
+
+    def __init__(self, analyze_fn, store=None, get_service=get_gmail_service,
+                 concurrency=ANALYSIS_WORKER_CONCURRENCY, per_minute=ANALYSIS_WORKER_RPM,
+                 max_attempts=ANALYSIS_WORKER_MAX_ATTEMPTS,
+                 backoff_seconds=ANALYSIS_WORKER_BACKOFF_SECONDS):
+        self.analyze_fn = analyze_fn
+        self.store = store or get_message_store()
+        self.get_service = get_service
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.rate_limiter = RateLimiter(per_minute)
+
+        self._queue = asyncio.Queue()
+        self._pending = set()
+        self._in_flight = set()
+        self._tasks = []
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+
+    # ----- API -----
+    def enqueue(self, message_ids):
+        for message_id in message_ids:
+            if message_id in self._pending or message_id in self._in_flight:
+                continue
+            if self.store.get_analysis(message_id) is not None:
+                continue
+            self._pending.add(message_id)
+            self._queue.put_nowait((message_id, 1))
+
+    def start(self):
+        if not self._tasks:
+            # Sin workers nadie vaciaría la cola: el listener se registra solo aquí
+            add_new_messages_listener(self.on_new_messages)
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        remove_new_messages_listener(self.on_new_messages)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def join(self, poll_interval=0.05):
+        """Espera a que no quede nada en cola, en curso ni pendiente de reintento."""
+        while self._pending or self._in_flight:
+            await asyncio.sleep(poll_interval)
+
+    def status(self):
+        return {
+            "running": bool(self._tasks),
+            "backlog": len(self._pending),
+            "in_flight": len(self._in_flight),
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "concurrency": self.concurrency,
+            "per_minute": self.rate_limiter.per_minute,
+        }
+
+    # ----- internals -----
+    async def _run(self):
+        # Las descargas del worker ceden la cuota de Google a las peticiones del usuario
+        with background_priority():
+            while True:
+                message_id, attempt = await self._queue.get()
+                try:
+                    await self._process(message_id, attempt)
+                except Exception as e:
+                    self.failed += 1
+                    print(f"Error pre-analizando {message_id}: {e}")
+
+    async def _process(self, message_id, attempt):
+        self._pending.discard(message_id)
+        if self.store.get_analysis(message_id) is not None:
+            return
+        self._in_flight.add(message_id)
+        try:
+            message = await get_stored_message(
+                await run_in_threadpool(self.get_service), self.store, message_id
+            )
+            if message is None or not (message["body"] or "").strip():
+                return
+
+            await self.rate_limiter.acquire()
+            analysis = await run_in_threadpool(self.analyze_fn, message["body"])
+        except Exception as e:
+            # Red, 5xx o cuota de Gmail/Gemini: mismo reintento que un análisis con error
+            analysis = {"error": str(e) or type(e).__name__}
+        finally:
+            self._in_flight.discard(message_id)
+
+        if analysis.get("error"):
+            self._retry_or_fail(message_id, attempt, analysis["error"])
+            return
+
+        self.store.save_analysis(message_id, analysis)
+        self.completed += 1
+
+    def _retry_or_fail(self, message_id, attempt, error):
+        if attempt >= self.max_attempts:
+            self.failed += 1
+            print(f"Pre-análisis de {message_id} abandonado: {error}")
+            return
+        # Reintento con backoff exponencial sin ocupar un hueco de concurrencia
+        self.retries += 1
+        self._pending.add(message_id)
+        asyncio.get_running_loop().call_later(
+            self.backoff_seconds * 2 ** (attempt - 1),
+            self._queue.put_nowait,
+            (message_id, attempt + 1),
+        )
+
+    def on_new_messages(self, messages):
+        """Listener del almacén: encola los mensajes nuevos de la bandeja de entrada."""
+        self.enqueue([m["id"] for m in messages if PREANALYZE_LABEL in m.get("labelIds", [])])
+
+
+_worker = None
+
+
+def get_analysis_worker():
+    global _worker
+    if _worker is None:
+        _worker = AnalysisWorker(analyze_email_structured)
+    return _worker
+
+
+def get_analysis_worker_status():
+    """Estado del worker sin crearlo (con ANALYSIS_WORKER_ENABLED=0 nunca se instancia)."""
+    if _worker is not None:
+        return _worker.status()
+    return {
+        "running": False,
+        "backlog": 0,
+        "in_flight": 0,
+        "completed": 0,
+        "failed": 0,
+        "retries": 0,
+        "concurrency": ANALYSIS_WORKER_CONCURRENCY,
+        "per_minute": ANALYSIS_WORKER_RPM,
+    }
+
+
+# =========================
+# POLLING DE GMAIL
+# =========================
+async def poll_gmail_history(interval=GMAIL_POLL_INTERVAL_SECONDS):
+    """
+    Sincroniza el almacén con users.history.list cada `interval` segundos.
+    Los mensajes nuevos llegan al worker a través del listener del almacén.
+    """
+    while True:
+        if is_logged_in():
+            try:
+                with background_priority():
+                    await sync_message_store(await run_in_threadpool(get_gmail_service), get_message_store())
+            except OAuthRedirect:
+                pass
+            except Exception as e:
+                print(f"Error sincronizando historial: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,227 @@
+import os
+import re
+import threading
+from html.parser import HTMLParser
+
+# =========================
+# CONFIG
+# =========================
+# Tokens máximos del body que llegan al prompt (estimación ~4 caracteres/token)
+ANALYSIS_BODY_TOKEN_BUDGET = int(os.environ.get("ANALYSIS_BODY_TOKEN_BUDGET", "2000"))
+
+TRUNCATION_MARK = " […]"
+
+# Una etiqueta real (<p>, <br/>, <div class=...>, <a href=...>), no direcciones
+# en texto plano como <a@b.com> o <p.smith@x>
+HTML_HINT = re.compile(r"<(?:(?:html|body|div|p|br|table|span)[\s/>]|a\s)", re.IGNORECASE)
+
+# Cabeceras de respuesta/reenvío: a partir de aquí todo es historial citado
+REPLY_HEADER = re.compile(
+    r"^(On\s.+\swrote:|El\s.+\sescribió:|"
+    r"-{2,}\s*(Original Message|Mensaje original|Forwarded message|Mensaje reenviado)\s*-{2,})\s*$",
+    re.IGNORECASE,
+)
+# Estilo Outlook: "De: ..." seguido de "Enviado: ..." / "From: ..." + "Sent: ..."
+OUTLOOK_FROM = re.compile(r"^(From|De):\s", re.IGNORECASE)
+OUTLOOK_NEXT = re.compile(r"^(Sent|Enviado|Date|Fecha|To|Para):\s", re.IGNORECASE)
+
+SIGNATURE_DELIMITER = re.compile(r"^--\s?$")
+MOBILE_SIGNATURE = re.compile(r"^(Sent from my|Enviado desde mi)\b", re.IGNORECASE)
+
+BLOCK_TAGS = {
+    "p", "div", "br", "tr", "li", "h1", "h2", "h3", "h4", "h5", "h6",
+    "table", "ul", "ol", "blockquote", "section", "article", "header", "footer",
+}
+SKIP_TAGS = {"script", "style", "head", "title"}
+
+
+def estimate_tokens(text):
+    """Estimación barata (~4 caracteres por token), suficiente para repartir lotes."""
+    return len(text) // 4 + 1
+
+
+# =========================
+# ETAPAS (generadores de líneas)
+# =========================
+class _HtmlToText(HTMLParser):
+    """Convierte HTML a texto a medida que se alimenta (feed)."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._parts = []
+        self._skip_depth = 0
+        self._quote_depth = 0
+        # Un valor por <div> abierto: True si es un bloque gmail_quote
+        self._div_stack = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "blockquote":
+            # El historial citado de Gmail/Apple Mail va en blockquote/gmail_quote
+            self._quote_depth += 1
+        elif tag == "div":
+            is_quote = "gmail_quote" in (dict(attrs).get("class") or "")
+            self._div_stack.append(is_quote)
+            self._quote_depth += is_quote
+        if tag in BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == "blockquote":
+            self._quote_depth = max(0, self._quote_depth - 1)
+        elif tag == "div" and self._div_stack and self._div_stack.pop():
+            self._quote_depth = max(0, self._quote_depth - 1)
+        if tag in BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth and not self._quote_depth:
+            self._parts.append(data)
+
+    def take_lines(self, final=False):
+        """Devuelve las líneas ya completas (todas si final=True)."""
+        text = "".join(self._parts)
+        if final:
+            self._parts = []
+            return text.split("\n")
+        head, sep, tail = text.rpartition("\n")
+        self._parts = [tail]
+        return head.split("\n") if sep else []
+
+
+def _html_lines(text, chunk_size=4096):
+    parser = _HtmlToText()
+    for i in range(0, len(text), chunk_size):
+        parser.feed(text[i:i + chunk_size])
+        yield from parser.take_lines()
+    parser.close()
+    yield from parser.take_lines(final=True)
+
+
+def _plain_lines(text):
+    for line in text.splitlines():
+        yield line
+
+
+def _drop_quoted(lines):
+    previous = None
+    for line in lines:
+        stripped = line.strip()
+        if REPLY_HEADER.match(stripped):
+            break
+        if previous is not None:
+            if OUTLOOK_NEXT.match(stripped):
+                break
+            yield previous
+            previous = None
+        if OUTLOOK_FROM.match(stripped):
+            previous = line
+            continue
+        if stripped.startswith(">"):
+            continue
+        yield line
+    else:
+        if previous is not None:
+            yield previous
+
+
+def _drop_signature(lines):
+    for line in lines:
+        stripped = line.strip()
+        if SIGNATURE_DELIMITER.match(line.rstrip("\r")):
+            break
+        if MOBILE_SIGNATURE.match(stripped):
+            continue
+        yield line
+
+
+def _collapse_whitespace(lines):
+    blank = False
+    started = False
+    for line in lines:
+        line = re.sub(r"[ \t\u00a0]+", " ", line).strip()
+        if not line:
+            blank = started
+            continue
+        if blank:
+            yield ""
+            blank = False
+        started = True
+        yield line
+
+
+def _truncate(lines, max_chars):
+    used = 0
+    for line in lines:
+        cost = len(line) + 1
+        if used + cost > max_chars:
+            room = max_chars - used
+            cut = line[:room].rsplit(" ", 1)[0] if room > 0 else ""
+            yield cut + TRUNCATION_MARK
+            return
+        used += cost
+        yield line
+
+
+# =========================
+# PIPELINE
+# =========================
+def preprocess_email_body(body, token_budget=ANALYSIS_BODY_TOKEN_BUDGET):
+    """
+    Reduce el body antes de meterlo en el prompt:
+    HTML -> texto, fuera historial citado y firmas, espacios colapsados
+    y recorte a `token_budget` tokens.
+    Devuelve {"text", "original_tokens", "reduced_tokens"}.
+    """
+    body = body or ""
+    lines = _html_lines(body) if HTML_HINT.search(body) else _plain_lines(body)
+    text = "\n".join(
+        _truncate(_collapse_whitespace(_drop_signature(_drop_quoted(lines))), token_budget * 4)
+    )
+
+    if not text:
+        # Todo era historial o firma (p. ej. un reenvío sin comentario): mejor el original limpio
+        lines = _html_lines(body) if HTML_HINT.search(body) else _plain_lines(body)
+        text = "\n".join(_truncate(_collapse_whitespace(lines), token_budget * 4))
+
+    result = {
+        "text": text,
+        "original_tokens": estimate_tokens(body),
+        "reduced_tokens": estimate_tokens(text),
+    }
+    _stats.record(result)
+    return result
+
+
+class PreprocessingStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.emails = 0
+        self.original_tokens = 0
+        self.reduced_tokens = 0
+
+    def record(self, result):
+        with self._lock:
+            self.emails += 1
+            self.original_tokens += result["original_tokens"]
+            self.reduced_tokens += result["reduced_tokens"]
+
+    def stats(self):
+        return {
+            "emails": self.emails,
+            "original_tokens": self.original_tokens,
+            "reduced_tokens": self.reduced_tokens,
+            "reduction_ratio": (
+                1 - self.reduced_tokens / self.original_tokens if self.original_tokens else 0.0
+            ),
+        }
+
+
+_stats = PreprocessingStats()
+
+
+def get_preprocessing_stats():
+    return _stats
@@ -3,33 +3,21 @@ import json
 import re
 from datetime import datetime
 
-import google.generativeai as genai
-from google.generativeai.types import GenerationConfig
+from app.ai.analysis_cache import analysis_cache_key, get_analysis_cache
+from app.ai.body_preprocessing import estimate_tokens, preprocess_email_body
+from app.ai.incremental_json import IncrementalJsonObjectParser
+from app.ai.llm_backends import get_llm_backend
+from app.ai.llm_resilience import CircuitOpenError, get_llm_guard
+from app.observability.metrics import stage
 
-# =========================
-# GEMINI CONFIG
-# =========================
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-if not GEMINI_API_KEY:
-    raise RuntimeError("GEMINI_API_KEY no encontrada en variables de entorno")
-
-genai.configure(api_key=GEMINI_API_KEY)
-
-model = genai.GenerativeModel("gemini-2.5-flash-lite")
-##gemini-2.5-flash-lite
-#gemini-3-flash-preview
+# El modelo (Gemini, stub HTTP o fake) se elige con LLM_BACKEND: ver app/ai/llm_backends.py
 
 # =========================
-# MAIN FUNCTION
+# PROMPT
 # =========================
-def analyze_email_structured(email_text: str):
-    today = datetime.now()
-    today_str = today.strftime("%Y-%m-%d")
-    weekday_str = today.strftime("%A")
-
-    
-    prompt = f"""
+# Bloque de instrucciones común al análisis individual y al análisis por lotes
+def _instructions_block(today_str, weekday_str):
+    return f"""
 Eres un sistema automático de análisis de correos electrónicos.
 
 HOY ES:
@@ -57,10 +45,13 @@ Instrucciones:
    - Si es una newsletter o notificación: Redacta un simple "Recibido, gracias" o "Leído".
    - NO dejes el campo suggested_reply vacío o null.
 
-REGLAS DE SALIDA (CRÍTICO):
+"""
+
+
+SINGLE_OUTPUT_RULES = """REGLAS DE SALIDA (CRÍTICO):
 - RESPONDE ÚNICAMENTE CON JSON
-- EL PRIMER CARÁCTER DE LA RESPUESTA DEBE SER {{
-- EL ÚLTIMO CARÁCTER DE LA RESPUESTA DEBE SER }}
+- EL PRIMER CARÁCTER DE LA RESPUESTA DEBE SER {
+- EL ÚLTIMO CARÁCTER DE LA RESPUESTA DEBE SER }
 - NO escribas texto antes ni después
 - NO uses markdown
 - NO uses ``` 
@@ -73,7 +64,7 @@ REGLAS DE SALIDA (CRÍTICO):
 
 El JSON debe tener EXACTAMENTE esta estructura:
 
-{{
+{
   "summary": string,
   "meeting_detected": boolean,
   "proposed_datetime": "YYYY-MM-DDTHH:MM" o null,
@@ -81,31 +72,70 @@ El JSON debe tener EXACTAMENTE esta estructura:
   "suggested_reply": string,
   "suggested_label": string o null,
   "is_important": boolean
-}}
+}
+
+"""
 
-REGLAS PARA suggested_label:
+LABEL_RULES = """REGLAS PARA suggested_label:
 - Usa UNA sola etiqueta corta y humana
 - Ejemplos: Trabajo, Facturas, Soporte, Newsletter, Personal
 - Si no hay categoría clara, usa null
 
-Correo:
-<EMAIL>
-{email_text}
-</EMAIL>
 """
 
+
+def _date_context():
+    today = datetime.now()
+    return today.strftime("%Y-%m-%d"), today.strftime("%A")
+
+
+def build_analysis_prompt(email_text, today_str, weekday_str, output_rules=SINGLE_OUTPUT_RULES):
+    return (
+        _instructions_block(today_str, weekday_str)
+        + output_rules
+        + LABEL_RULES
+        + f"Correo:\n<EMAIL>\n{email_text}\n</EMAIL>\n"
+    )
+
+
+# =========================
+# MAIN FUNCTION
+# =========================
+def analyze_email_structured(email_text: str):
+    # HTML, historial citado y firmas fuera antes de llegar al prompt
+    with stage("preprocess"):
+        email_text = preprocess_email_body(email_text)["text"]
+    return _analyze_preprocessed(email_text)
+
+
+def _analyze_preprocessed(email_text, today_str=None, weekday_str=None):
+    """
+    analyze_email_structured con el body ya preprocesado. El lote lo usa como
+    fallback por correo con su misma fecha: misma clave de cache que el lote.
+    """
+    if today_str is None:
+        today_str, weekday_str = _date_context()
+
+    # =========================
+    # CACHE (mismo body + modelo + fecha => mismo análisis)
+    # =========================
+    cache = get_analysis_cache()
+    cache_key = analysis_cache_key(email_text, get_llm_backend().model_name, f"{today_str} {weekday_str}")
+    with stage("cache"):
+        cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    prompt = build_analysis_prompt(email_text, today_str, weekday_str)
+
     # =========================
     # GEMINI CALL
     # =========================
     try:
-       
-        response = model.generate_content(
-            prompt,
-            generation_config=GenerationConfig(
-                response_mime_type="application/json"
-            )
-        )
-        text = response.text or ""
+        text = _generate_json(prompt)
+    except CircuitOpenError as e:
+        # Gemini degradado: respuesta de respaldo sin esperar al timeout
+        return fallback_analysis(str(e))
     except Exception as e:
         print(f"❌ ERROR GEMINI: {e}")
         return {
@@ -118,24 +148,59 @@ Correo:
             "error": str(e),
         }
 
+    data, cacheable = parse_analysis_text(text)
+    if cacheable:
+        cache.set(cache_key, data)
+    return data
+
+
+def _generate_json(prompt):
+    """
+    Llamada al modelo con deadline, reintentos y circuit breaker (LlmGuard).
+    Lanza CircuitOpenError sin llamar si Gemini está degradado.
+    """
+    backend = get_llm_backend()
+    return get_llm_guard().call(lambda timeout: backend.generate(prompt, timeout=timeout))
+
+
+def _demo_analysis():
+    return {
+        "summary": "Correo analizado (modo demo)",
+        "meeting_detected": False,
+        "proposed_datetime": None,
+        "duration_minutes": None,
+        "suggested_reply": "Gracias por tu correo. Lo reviso y te confirmo en breve.",
+        "suggested_label": "trabajo",
+        "is_important": False, # <--- AÑADIR ESTO
+    }
+
+
+def fallback_analysis(error):
+    """
+    Respuesta demo mientras el circuit breaker está abierto. Lleva "error"
+    para que no se cachee ni se guarde y el worker lo reintente más tarde.
+    """
+    return {**_demo_analysis(), "degraded": True, "error": error}
+
+
+def parse_analysis_text(text):
+    """
+    Convierte la salida de Gemini en el análisis.
+    Devuelve (análisis, cacheable): los resultados de rescate no se cachean.
+    """
     # =========================
     # PARSE JSON 
     # =========================
     try:
         data = json.loads(text)
     except Exception:
+        data = None
+
+    # Texto alrededor del JSON, o JSON que no es un objeto (p. ej. [{...}], "ok", 3)
+    if not isinstance(data, dict):
         match = re.search(r"\{[\s\S]*\}", text)
         if not match:
-            return {
-                "summary": "Correo analizado (modo demo)",
-                "meeting_detected": False,
-                "proposed_datetime": None,
-                "duration_minutes": None,
-                "suggested_reply": "Gracias por tu correo. Lo reviso y te confirmo en breve.",
-                "suggested_label": "trabajo",
-                "is_important": False, # <--- AÑADIR ESTO
-                "raw_output": text,
-            }
+            return {**_demo_analysis(), "raw_output": text}, False
         try:
             data = json.loads(match.group(0))
         except:
@@ -144,31 +209,39 @@ Correo:
                 "meeting_detected": False,
                 "is_important": False, # <--- AÑADIR ESTO
                 "error": "Invalid JSON format"
-            }
+            }, False
+        if not isinstance(data, dict):
+            return {**_demo_analysis(), "raw_output": text}, False
 
     # =========================
     # NORMALIZE LABEL
     # =========================
+    normalize_suggested_label(data)
+    return data, True
+
+
+LABEL_MAP = {
+    "factura": "facturas",
+    "facturas": "facturas",
+    "pagos": "facturas",
+    "recibos": "facturas",
+    "cobros": "facturas", 
+    "newsletter": "newsletter",
+    "newsletters": "newsletter",
+    "promociones": "newsletter",
+    "trabajo": "trabajo",
+    "proyectos": "trabajo",
+    "reuniones": "trabajo",
+    "personal": "personal",
+    "soporte": "soporte",
+    "incidencias": "soporte",
+}
+
+
+def normalize_suggested_label(data):
     if data.get("suggested_label"):
         label = data["suggested_label"].strip().lower()
 
-        LABEL_MAP = {
-            "factura": "facturas",
-            "facturas": "facturas",
-            "pagos": "facturas",
-            "recibos": "facturas",
-            "cobros": "facturas", 
-            "newsletter": "newsletter",
-            "newsletters": "newsletter",
-            "promociones": "newsletter",
-            "trabajo": "trabajo",
-            "proyectos": "trabajo",
-            "reuniones": "trabajo",
-            "personal": "personal",
-            "soporte": "soporte",
-            "incidencias": "soporte",
-        }
-
         # Búsqueda parcial si no hay match exacto
         # (Mantiene tu lógica pero la hace más resistente si la IA dice "Reunión de trabajo")
         found = LABEL_MAP.get(label)
@@ -180,4 +253,219 @@ Correo:
         
         data["suggested_label"] = found
 
-    return data
\ No newline at end of file
+    return data
+
+
+# =========================
+# BATCH (varios correos por llamada)
+# =========================
+# Presupuesto aproximado de tokens de entrada por llamada en lote
+ANALYSIS_BATCH_TOKEN_BUDGET = int(os.getenv("ANALYSIS_BATCH_TOKEN_BUDGET", "24000"))
+
+BATCH_OUTPUT_RULES = """REGLAS DE SALIDA (CRÍTICO):
+- Vas a recibir VARIOS correos, cada uno dentro de <EMAIL id="...">
+- RESPONDE ÚNICAMENTE CON UN ARRAY JSON con UN objeto por correo
+- EL PRIMER CARÁCTER DE LA RESPUESTA DEBE SER [
+- EL ÚLTIMO CARÁCTER DE LA RESPUESTA DEBE SER ]
+- NO uses markdown
+- NO escribas nada fuera del JSON
+
+Cada objeto del array debe tener EXACTAMENTE esta estructura:
+
+{
+  "id": string (el id del correo, copiado tal cual),
+  "summary": string,
+  "meeting_detected": boolean,
+  "proposed_datetime": "YYYY-MM-DDTHH:MM" o null,
+  "duration_minutes": number o null,
+  "suggested_reply": string,
+  "suggested_label": string o null,
+  "is_important": boolean
+}
+
+"""
+
+
+def _split_by_token_budget(emails, budget):
+    chunk, used = [], 0
+    for email in emails:
+        cost = estimate_tokens(email["body"])
+        if chunk and used + cost > budget:
+            yield chunk
+            chunk, used = [], 0
+        chunk.append(email)
+        used += cost
+    if chunk:
+        yield chunk
+
+
+def build_batch_prompt(emails, today_str, weekday_str):
+    correos = "".join(
+        f'<EMAIL id="{email["id"]}">\n{email["body"]}\n</EMAIL>\n' for email in emails
+    )
+    return (
+        _instructions_block(today_str, weekday_str)
+        + BATCH_OUTPUT_RULES
+        + LABEL_RULES
+        + f"Correos:\n{correos}"
+    )
+
+
+def _parse_batch_response(text):
+    try:
+        items = json.loads(text)
+    except Exception:
+        match = re.search(r"\[[\s\S]*\]", text)
+        if not match:
+            return {}
+        try:
+            items = json.loads(match.group(0))
+        except Exception:
+            return {}
+
+    if not isinstance(items, list):
+        return {}
+    return {
+        str(item["id"]): item
+        for item in items
+        if isinstance(item, dict) and "id" in item
+    }
+
+
+def analyze_emails_batch(emails):
+    """
+    Analiza varios correos con el mínimo de llamadas a Gemini.
+    emails: lista de {"id": message_id, "body": texto}.
+    Las instrucciones van una sola vez por llamada y los correos se reparten
+    según ANALYSIS_BATCH_TOKEN_BUDGET. Si un correo no vuelve en la respuesta
+    (o viene mal), se analiza individualmente (_analyze_preprocessed).
+    Devuelve {message_id: análisis}.
+    """
+    emails = [
+        {"id": email["id"], "body": preprocess_email_body(email["body"])["text"]}
+        for email in emails
+    ]
+    today_str, weekday_str = _date_context()
+    date_context = f"{today_str} {weekday_str}"
+    model_name = get_llm_backend().model_name
+    cache = get_analysis_cache()
+
+    results = {}
+    pending = []
+    for email in emails:
+        cached = cache.get(analysis_cache_key(email["body"], model_name, date_context))
+        if cached is not None:
+            results[email["id"]] = cached
+        else:
+            pending.append(email)
+
+    for chunk in _split_by_token_budget(pending, ANALYSIS_BATCH_TOKEN_BUDGET):
+        prompt = build_batch_prompt(chunk, today_str, weekday_str)
+        try:
+            by_id = _parse_batch_response(_generate_json(prompt))
+        except CircuitOpenError as e:
+            for email in chunk:
+                results[email["id"]] = fallback_analysis(str(e))
+            continue
+        except Exception as e:
+            print(f"❌ ERROR GEMINI (lote): {e}")
+            by_id = {}
+
+        for email in chunk:
+            data = by_id.get(email["id"])
+            if not data or "summary" not in data:
+                # Fallback por elemento (el body ya está preprocesado)
+                results[email["id"]] = _analyze_preprocessed(email["body"], today_str, weekday_str)
+                continue
+
+            data = {k: v for k, v in data.items() if k != "id"}
+            normalize_suggested_label(data)
+            cache.set(analysis_cache_key(email["body"], model_name, date_context), data)
+            results[email["id"]] = data
+
+    return results
+
+
+# =========================
+# STREAMING (campos según se completan)
+# =========================
+# Mismo esquema que SINGLE_OUTPUT_RULES, pero con los campos útiles primero
+# y suggested_reply (el más largo) al final
+STREAM_OUTPUT_RULES = """REGLAS DE SALIDA (CRÍTICO):
+- RESPONDE ÚNICAMENTE CON JSON
+- EL PRIMER CARÁCTER DE LA RESPUESTA DEBE SER {
+- EL ÚLTIMO CARÁCTER DE LA RESPUESTA DEBE SER }
+- NO uses markdown
+- NO escribas nada fuera del JSON
+- RESPETA EL ORDEN DE LOS CAMPOS
+
+El JSON debe tener EXACTAMENTE esta estructura, en este orden:
+
+{
+  "summary": string,
+  "is_important": boolean,
+  "meeting_detected": boolean,
+  "proposed_datetime": "YYYY-MM-DDTHH:MM" o null,
+  "duration_minutes": number o null,
+  "suggested_label": string o null,
+  "suggested_reply": string
+}
+
+"""
+
+
+def analyze_email_stream(email_text: str):
+    """
+    Versión en streaming de analyze_email_structured. Genera eventos tipados:
+    - ("field", campo, valor) en cuanto Gemini completa cada campo
+    - ("done", análisis completo) al final (también el de respaldo)
+    - ("error", mensaje) si la llamada falla sin análisis que devolver
+    Un campo del modelo que se llame "error" o "done" sigue siendo un campo.
+    Comparte la cache con el análisis normal.
+    """
+    email_text = preprocess_email_body(email_text)["text"]
+    today_str, weekday_str = _date_context()
+    cache = get_analysis_cache()
+    cache_key = analysis_cache_key(email_text, get_llm_backend().model_name, f"{today_str} {weekday_str}")
+    cached = cache.get(cache_key)
+    if cached is not None:
+        for key, value in cached.items():
+            yield "field", key, value
+        yield "done", cached
+        return
+
+    prompt = build_analysis_prompt(email_text, today_str, weekday_str, STREAM_OUTPUT_RULES)
+    parser = IncrementalJsonObjectParser()
+    text = ""
+    sent = set()
+
+    guard = get_llm_guard()
+    try:
+        # Sin reintentos: puede que ya se hayan enviado campos al cliente
+        with guard.streaming():
+            for piece in get_llm_backend().stream(prompt, timeout=guard.timeout):
+                text += piece
+                for key, value in parser.feed(piece):
+                    if key == "suggested_label":
+                        value = normalize_suggested_label({key: value})[key]
+                    sent.add(key)
+                    yield "field", key, value
+    except CircuitOpenError as e:
+        data = fallback_analysis(str(e))
+        for key, value in data.items():
+            yield "field", key, value
+        yield "done", data
+        return
+    except Exception as e:
+        print(f"❌ ERROR GEMINI (stream): {e}")
+        yield "error", str(e)
+        return
+
+    # El análisis final sale del texto completo, igual que en el modo normal
+    data, cacheable = parse_analysis_text(text)
+    if cacheable:
+        cache.set(cache_key, data)
+    for key, value in data.items():
+        if key not in sent:
+            yield "field", key, value
+    yield "done", data
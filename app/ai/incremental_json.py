@@ -0,0 +1,108 @@
+import json
+
+
+class IncrementalJsonObjectParser:
+    """
+    Parser incremental de un objeto JSON plano que llega a trozos (streaming).
+
+    feed(chunk) devuelve los pares (campo, valor) de primer nivel que han
+    quedado completos con ese trozo, en el orden en que aparecen.
+    Se ignora cualquier texto antes de la primera "{" (p. ej. ```json).
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._started = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # Estado del par actual de primer nivel
+        self._key = None
+        self._key_start = None
+        self._value_start = None
+        self.fields = {}
+
+    @property
+    def finished(self):
+        return self._finished
+
+    def feed(self, chunk):
+        self._buffer += chunk
+        completed = []
+
+        while self._pos < len(self._buffer) and not self._finished:
+            i = self._pos
+            ch = self._buffer[i]
+            self._pos += 1
+
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._close_string(i, completed)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._key is None and self._key_start is None:
+                    self._key_start = i
+                elif self._depth == 1 and self._key is not None and self._value_start is None:
+                    self._value_start = i
+            elif ch in "{[":
+                if self._depth == 1 and self._key is not None and self._value_start is None:
+                    self._value_start = i
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._value_start is not None:
+                    # Cierre de un objeto/array anidado: el valor está completo
+                    self._emit(i + 1, completed)
+                elif self._depth == 0:
+                    self._emit(i, completed)
+                    self._finished = True
+            elif ch == ",":
+                if self._depth == 1:
+                    self._emit(i, completed)
+            elif ch == ":":
+                pass
+            elif not ch.isspace():
+                # Inicio de un escalar (número, true, false, null)
+                if self._depth == 1 and self._key is not None and self._value_start is None:
+                    self._value_start = i
+
+        return completed
+
+    def _close_string(self, end, completed):
+        if self._key is None and self._key_start is not None:
+            self._key = json.loads(self._buffer[self._key_start:end + 1])
+            self._key_start = None
+        elif self._value_start is not None:
+            self._emit(end + 1, completed)
+
+    def _emit(self, end, completed):
+        if self._key is None or self._value_start is None:
+            return
+        raw = self._buffer[self._value_start:end].strip()
+        if raw:
+            try:
+                value = json.loads(raw)
+            except ValueError:
+                value = None
+            else:
+                if self._key not in self.fields:
+                    self.fields[self._key] = value
+                    completed.append((self._key, value))
+        self._key = None
+        self._value_start = None
@@ -0,0 +1,241 @@
+import json
+import os
+import re
+import threading
+import time
+import urllib.request
+
+from app.ai.body_preprocessing import estimate_tokens
+from app.observability.metrics import record_llm_tokens
+
+# =========================
+# CONFIG
+# =========================
+# gemini (por defecto) | http (stub local) | fake (en proceso, para benchmarks)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
+##gemini-2.5-flash-lite
+#gemini-3-flash-preview
+LLM_HTTP_URL = os.getenv("LLM_HTTP_URL", "http://127.0.0.1:8765/generate")
+LLM_FAKE_LATENCY = float(os.getenv("LLM_FAKE_LATENCY", "0.3"))
+LLM_FAKE_TOKEN_DELAY = float(os.getenv("LLM_FAKE_TOKEN_DELAY", "0.0"))
+# Ruta a un JSON con el análisis que devuelve el backend fake
+LLM_FAKE_OUTPUT = os.getenv("LLM_FAKE_OUTPUT")
+
+
+def _record_tokens(backend, prompt, text, usage=None):
+    # Gemini devuelve el recuento exacto; el resto se estima (~4 caracteres por token)
+    if usage is not None and getattr(usage, "prompt_token_count", None):
+        record_llm_tokens(backend, usage.prompt_token_count, usage.candidates_token_count or 0)
+    else:
+        record_llm_tokens(backend, estimate_tokens(prompt), estimate_tokens(text))
+
+
+# =========================
+# GEMINI
+# =========================
+class GeminiBackend:
+    """
+    Gemini vía google.generativeai. El paquete se importa y el modelo se crea
+    en la primera llamada (el import cuesta ~0,6 s de arranque): sin
+    GEMINI_API_KEY la app arranca y el error sale al analizar.
+    """
+
+    name = "gemini"
+
+    def __init__(self, model_name=GEMINI_MODEL, api_key=None):
+        self.model_name = model_name
+        self._api_key = api_key
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None:
+                import google.generativeai as genai
+
+                api_key = self._api_key or os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    raise RuntimeError("GEMINI_API_KEY no encontrada en variables de entorno")
+                genai.configure(api_key=api_key)
+                self._model = genai.GenerativeModel(self.model_name)
+            return self._model
+
+    def _generate(self, prompt, timeout, stream):
+        from google.generativeai.types import GenerationConfig
+
+        options = {"timeout": timeout} if timeout else None
+        return self._get_model().generate_content(
+            prompt,
+            generation_config=GenerationConfig(
+                response_mime_type="application/json"
+            ),
+            stream=stream,
+            request_options=options,
+        )
+
+    def generate(self, prompt, timeout=None):
+        response = self._generate(prompt, timeout, stream=False)
+        text = response.text or ""
+        _record_tokens(self.name, prompt, text, getattr(response, "usage_metadata", None))
+        return text
+
+    def stream(self, prompt, timeout=None):
+        text, usage = "", None
+        for chunk in self._generate(prompt, timeout, stream=True):
+            # El recuento de tokens llega (acumulado) en los últimos fragmentos
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            piece = chunk.text or ""
+            text += piece
+            yield piece
+        _record_tokens(self.name, prompt, text, usage)
+
+
+# =========================
+# HTTP (stub local)
+# =========================
+class HttpLlmBackend:
+    """
+    Backend contra un servidor HTTP local (benchmarks/llm_stub_server.py):
+    POST {"prompt", "stream"} -> {"text"} o, con stream, NDJSON de {"text"}.
+    """
+
+    name = "http"
+
+    def __init__(self, url=LLM_HTTP_URL, model_name="http-stub"):
+        self.url = url
+        self.model_name = model_name
+
+    def _post(self, prompt, timeout, stream):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({"prompt": prompt, "stream": stream}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        return urllib.request.urlopen(request, timeout=timeout)
+
+    def generate(self, prompt, timeout=None):
+        with self._post(prompt, timeout, stream=False) as response:
+            text = json.loads(response.read())["text"]
+        _record_tokens(self.name, prompt, text)
+        return text
+
+    def stream(self, prompt, timeout=None):
+        text = ""
+        with self._post(prompt, timeout, stream=True) as response:
+            for line in response:
+                if line.strip():
+                    piece = json.loads(line)["text"]
+                    text += piece
+                    yield piece
+        _record_tokens(self.name, prompt, text)
+
+
+# =========================
+# FAKE (en proceso)
+# =========================
+FAKE_ANALYSIS = {
+    "summary": "Ana propone revisar el presupuesto del proyecto el jueves a las 10:00.",
+    "is_important": True,
+    "meeting_detected": True,
+    "proposed_datetime": "2026-10-22T10:00",
+    "duration_minutes": 60,
+    "suggested_label": "Trabajo",
+    "suggested_reply": (
+        "Hola Ana, gracias por la propuesta. El jueves a las 10:00 me viene bien para "
+        "revisar el presupuesto. Prepararé las cifras del último trimestre y las "
+        "desviaciones respecto al plan para que podamos decidir los ajustes. Si "
+        "necesitas que invite a alguien más del equipo, dímelo y lo añado a la "
+        "convocatoria. Un saludo."
+    ),
+}
+
+_BATCH_ID_RE = re.compile(r'<EMAIL id="([^"]*)">')
+
+
+def _load_fake_output():
+    if not LLM_FAKE_OUTPUT:
+        return FAKE_ANALYSIS
+    with open(LLM_FAKE_OUTPUT, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class FakeLlmBackend:
+    """
+    Modelo falso y determinista: siempre el mismo análisis, simulando la
+    generación token a token (~4 caracteres): `latency` segundos hasta el
+    primer token y `token_delay` por token. A un prompt por lotes responde
+    con un array con un análisis por cada <EMAIL id="...">.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency=LLM_FAKE_LATENCY, token_delay=LLM_FAKE_TOKEN_DELAY,
+                 chunk_tokens=4, analysis=None, model_name="fake"):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.chunk_tokens = chunk_tokens
+        self.analysis = analysis or _load_fake_output()
+        self.model_name = model_name
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def render(self, prompt):
+        ids = _BATCH_ID_RE.findall(prompt)
+        if ids:
+            output = [{"id": message_id, **self.analysis} for message_id in ids]
+        else:
+            output = self.analysis
+        return json.dumps(output, ensure_ascii=False, indent=2)
+
+    def _tokens(self, text):
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def generate(self, prompt, timeout=None):
+        with self._lock:
+            self.calls += 1
+        text = self.render(prompt)
+        time.sleep(self.latency + len(self._tokens(text)) * self.token_delay)
+        _record_tokens(self.name, prompt, text)
+        return text
+
+    def stream(self, prompt, timeout=None):
+        with self._lock:
+            self.calls += 1
+        text = self.render(prompt)
+        tokens = self._tokens(text)
+        time.sleep(self.latency)
+        for i in range(0, len(tokens), self.chunk_tokens):
+            chunk = tokens[i:i + self.chunk_tokens]
+            time.sleep(len(chunk) * self.token_delay)
+            yield "".join(chunk)
+        _record_tokens(self.name, prompt, text)
+
+
+# =========================
+# SELECCIÓN
+# =========================
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "http": HttpLlmBackend,
+    "fake": FakeLlmBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_llm_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if LLM_BACKEND not in BACKENDS:
+                raise RuntimeError(f"LLM_BACKEND desconocido: {LLM_BACKEND} (opciones: {', '.join(BACKENDS)})")
+            _backend = BACKENDS[LLM_BACKEND]()
+    return _backend
+
+
+def set_llm_backend(backend):
+    """Sustituye el backend (benchmarks o pruebas locales)."""
+    global _backend
+    _backend = backend
@@ -0,0 +1,257 @@
+import contextlib
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from app.ai.llm_backends import get_llm_backend
+from app.observability.metrics import observe_llm_call
+
+# =========================
+# CONFIG
+# =========================
+GEMINI_TIMEOUT_SECONDS = float(os.environ.get("GEMINI_TIMEOUT_SECONDS", "30"))
+GEMINI_MAX_RETRIES = int(os.environ.get("GEMINI_MAX_RETRIES", "2"))
+GEMINI_RETRY_BACKOFF_SECONDS = float(os.environ.get("GEMINI_RETRY_BACKOFF_SECONDS", "0.5"))
+GEMINI_BREAKER_FAILURES = int(os.environ.get("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_COOLDOWN_SECONDS = float(os.environ.get("GEMINI_BREAKER_COOLDOWN_SECONDS", "30"))
+GEMINI_MAX_IN_FLIGHT = int(os.environ.get("GEMINI_MAX_IN_FLIGHT", "8"))
+
+# Códigos HTTP que merece la pena reintentar (cuota, sobrecarga, deadline).
+# Las excepciones de google.api_core y urllib (backend http) exponen .code
+TRANSIENT_STATUS_CODES = {429, 500, 502, 503, 504}
+
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class CircuitOpenError(Exception):
+    """Gemini está degradado: no se llama hasta que pase el enfriamiento."""
+
+
+class LlmTimeoutError(TimeoutError):
+    pass
+
+
+def is_transient(error):
+    """Red, deadline o un código HTTP de TRANSIENT_STATUS_CODES."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # urllib envuelve los errores de red en URLError(reason)
+    if isinstance(getattr(error, "reason", None), (TimeoutError, ConnectionError)):
+        return True
+    return getattr(error, "code", None) in TRANSIENT_STATUS_CODES
+
+
+class CircuitBreaker:
+    """
+    closed -> open tras `failures` fallos seguidos; open -> half_open tras
+    `cooldown` segundos (deja pasar una llamada de prueba); half_open -> closed
+    si la prueba sale bien, o vuelta a open si falla.
+    """
+
+    def __init__(self, failures=GEMINI_BREAKER_FAILURES, cooldown=GEMINI_BREAKER_COOLDOWN_SECONDS):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    raise CircuitOpenError("Gemini no disponible temporalmente")
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self._trial_in_flight:
+                    raise CircuitOpenError("Gemini no disponible temporalmente")
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """La llamada se abandonó sin resultado (p. ej. el cliente cortó el stream)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.consecutive_failures >= self.failures:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class LatencyHistogram:
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.counts = [0] * (len(buckets_ms) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        with self._lock:
+            index = next((i for i, bound in enumerate(self.buckets_ms) if ms <= bound), len(self.buckets_ms))
+            self.counts[index] += 1
+            self.total += 1
+            self.sum_ms += ms
+
+    def snapshot(self):
+        labels = [f"<={bound}ms" for bound in self.buckets_ms] + [f">{self.buckets_ms[-1]}ms"]
+        return {
+            "count": self.total,
+            "mean_ms": self.sum_ms / self.total if self.total else 0.0,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class LlmGuard:
+    """
+    Envuelve las llamadas a Gemini: deadline por llamada, reintentos con jitter
+    para errores transitorios, circuit breaker y métricas de latencia.
+    """
+
+    def __init__(self, timeout=GEMINI_TIMEOUT_SECONDS, max_retries=GEMINI_MAX_RETRIES,
+                 backoff=GEMINI_RETRY_BACKOFF_SECONDS, breaker=None, max_in_flight=GEMINI_MAX_IN_FLIGHT):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        # Hilos propios: si una llamada se pasa del deadline, quien espera queda libre
+        self.max_in_flight = max_in_flight
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="gemini")
+        # Llamadas que superaron el deadline y siguen ocupando un hilo del executor
+        self._abandoned = 0
+        self._abandoned_lock = threading.Lock()
+        self.latency = {"ok": LatencyHistogram(), "error": LatencyHistogram()}
+        self.calls = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.short_circuited = 0
+        self.saturated = 0
+
+    def call(self, fn):
+        """
+        Ejecuta fn(timeout) con reintentos. Lanza CircuitOpenError sin llamar
+        si el breaker está abierto o todos los hilos están ocupados por llamadas
+        colgadas, o el último error si se agotan los intentos. Para el breaker
+        una llamada fallida cuenta una sola vez, con o sin reintentos.
+        """
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self.short_circuited += 1
+            raise
+
+        for attempt in range(self.max_retries + 1):
+            if self._abandoned >= self.max_in_flight:
+                # Esperaría en la cola hasta su deadline sin llegar a ejecutarse
+                self.saturated += 1
+                self.breaker.release()
+                raise CircuitOpenError(f"Gemini saturado: {self._abandoned} llamadas sin responder")
+
+            self.calls += 1
+            start = time.perf_counter()
+            future = self._executor.submit(fn, self.timeout)
+            try:
+                result = future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                self.timeouts += 1
+                self._abandon(future)
+                error = LlmTimeoutError(f"Gemini no respondió en {self.timeout:.0f}s")
+            except Exception as e:
+                error = e
+            else:
+                self._observe(time.perf_counter() - start, ok=True)
+                self.breaker.record_success()
+                return result
+
+            self._observe(time.perf_counter() - start, ok=False)
+            if attempt == self.max_retries or not is_transient(error):
+                self.breaker.record_failure()
+                raise error
+            self.retries += 1
+            # Backoff exponencial con jitter completo
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def _abandon(self, future):
+        """Cuenta el hilo ocupado hasta que la llamada abandonada termine (si termina)."""
+        if future.cancel():
+            return
+        with self._abandoned_lock:
+            self._abandoned += 1
+
+        def finished(_):
+            with self._abandoned_lock:
+                self._abandoned -= 1
+
+        future.add_done_callback(finished)
+
+    @contextlib.contextmanager
+    def streaming(self):
+        """Para respuestas en streaming: breaker y métricas, sin reintentos."""
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self.short_circuited += 1
+            raise
+        self.calls += 1
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self._observe(time.perf_counter() - start, ok=False)
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self._observe(time.perf_counter() - start, ok=True)
+        self.breaker.record_success()
+
+    def _observe(self, seconds, ok):
+        self.latency["ok" if ok else "error"].observe(seconds)
+        # /metrics y etapa "llm" del Server-Timing de la petición
+        observe_llm_call(get_llm_backend().name, seconds, ok)
+
+    def metrics(self):
+        return {
+            "breaker": {
+                "state": self.breaker.state,
+                "consecutive_failures": self.breaker.consecutive_failures,
+                "times_opened": self.breaker.times_opened,
+            },
+            "calls": self.calls,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "short_circuited": self.short_circuited,
+            "saturated": self.saturated,
+            "abandoned_in_flight": self._abandoned,
+            "latency": {outcome: h.snapshot() for outcome, h in self.latency.items()},
+        }
+
+
+_guard = None
+_guard_lock = threading.Lock()
+
+
+def get_llm_guard():
+    global _guard
+    with _guard_lock:
+        if _guard is None:
+            _guard = LlmGuard()
+    return _guard
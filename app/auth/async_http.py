@@ -0,0 +1,155 @@
+import asyncio
+import os
+import threading
+import weakref
+
+import httplib2
+from fastapi.concurrency import run_in_threadpool
+from google.auth.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.errors import HttpError
+
+from app.auth.google_auth import refresh_credentials
+from app.auth.quota import RATE_LIMIT_MAX_RETRIES, get_quota_scheduler, is_rate_limited
+from app.observability.metrics import stage, track_google_call
+
+try:
+    import httpx
+except ImportError:  # Sin httpx se ejecuta la petición bloqueante en el threadpool
+    httpx = None
+
+try:
+    import h2  # noqa: F401
+    HTTP2_ENABLED = True
+except ImportError:
+    HTTP2_ENABLED = False
+
+# =========================
+# CONFIG
+# =========================
+# Permite volver al transporte bloqueante (útil para comparar en benchmarks)
+ASYNC_TRANSPORT = httpx is not None and os.environ.get("GOOGLE_ASYNC_TRANSPORT", "1") == "1"
+MAX_CONNECTIONS = int(os.environ.get("GOOGLE_HTTP_MAX_CONNECTIONS", "20"))
+HTTP_TIMEOUT_SECONDS = float(os.environ.get("GOOGLE_HTTP_TIMEOUT", "30"))
+
+_client = None
+# Limita las peticiones en vuelo al tamaño del pool: la cola interna de httpcore
+# se recorre entera en cada asignación y se degrada mucho con colas largas.
+# Un semáforo por event loop (TestClient o reinicios crean loops nuevos)
+_slots = weakref.WeakKeyDictionary()
+
+
+def get_async_http_client():
+    """Cliente httpx compartido (pool de conexiones y HTTP/2 si h2 está instalado)."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            http2=HTTP2_ENABLED,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS,
+            ),
+            timeout=HTTP_TIMEOUT_SECONDS,
+        )
+    return _client
+
+
+def _connection_slots():
+    loop = asyncio.get_running_loop()
+    slots = _slots.get(loop)
+    if slots is None:
+        slots = _slots[loop] = asyncio.Semaphore(MAX_CONNECTIONS)
+    return slots
+
+
+async def close_async_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+_thread_http = threading.local()
+
+
+def thread_http(http):
+    """
+    Los clientes discovery se comparten (cache de google_auth) y httplib2 no es
+    thread-safe: en el threadpool cada hilo usa su propio AuthorizedHttp.
+    """
+    credentials = getattr(http, "credentials", None)
+    if not isinstance(credentials, Credentials):
+        return http
+
+    local_http = getattr(_thread_http, "http", None)
+    if local_http is None or local_http.credentials is not credentials:
+        local_http = AuthorizedHttp(credentials, http=httplib2.Http())
+        _thread_http.http = local_http
+    return local_http
+
+
+def _execute_blocking(request):
+    return request.execute(http=thread_http(request.http))
+
+
+def quota_user(http):
+    """Clave de usuario para la cuota: las credenciales con las que se firma."""
+    credentials = getattr(http, "credentials", None)
+    return str(id(credentials)) if isinstance(credentials, Credentials) else "default"
+
+
+async def execute_async(request):
+    """
+    Ejecuta un HttpRequest de googleapiclient sin bloquear el event loop.
+
+    El cliente discovery sigue construyendo la petición (URI, método, body) y
+    parseando la respuesta (postproc), pero el envío va por httpx. Los errores
+    se siguen lanzando como googleapiclient.errors.HttpError.
+
+    Antes de enviar se reserva la cuota del método en el QuotaScheduler; si
+    Google responde 429/403 rateLimitExceeded se reintenta con backoff exponencial.
+    """
+    scheduler = get_quota_scheduler()
+    method_id = getattr(request, "methodId", None)
+    user = quota_user(request.http)
+
+    for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+        with stage("quota"):
+            await scheduler.acquire(method_id, user)
+        try:
+            with track_google_call(method_id):
+                return await _send(request)
+        except HttpError as e:
+            if not is_rate_limited(e.resp.status, e.content):
+                raise
+            scheduler.rate_limited += 1
+            if attempt == RATE_LIMIT_MAX_RETRIES:
+                raise
+            await asyncio.sleep(scheduler.backoff(method_id, user, attempt))
+
+
+async def _send(request):
+    if not ASYNC_TRANSPORT:
+        return await run_in_threadpool(_execute_blocking, request)
+
+    headers = dict(request.headers or {})
+    headers.pop("content-length", None)
+
+    # AuthorizedHttp (google-auth-httplib2) expone las credenciales de Google
+    credentials = getattr(request.http, "credentials", None)
+    if isinstance(credentials, Credentials):
+        if not credentials.valid:
+            # Misma renovación que get_credentials: se guarda en token.json
+            await run_in_threadpool(refresh_credentials, credentials)
+        credentials.apply(headers)
+
+    async with _connection_slots():
+        response = await get_async_http_client().request(
+            request.method,
+            request.uri,
+            content=request.body,
+            headers=headers,
+        )
+
+    resp = httplib2.Response({"status": response.status_code, **response.headers})
+    return request.postproc(resp, response.content)
@@ -1,9 +1,13 @@
+import json
 import os
 import pickle
-from google_auth_oauthlib.flow import Flow
+import threading
+import time
 from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+
+# google_auth_oauthlib, google.auth.transport.requests y googleapiclient.discovery
+# se importan al usarse: suman ~0,3 s al arranque y no hacen falta hasta el login
+# o la primera llamada a Google
 
 # Permitir HTTP solo en local
 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
@@ -19,6 +23,8 @@ SCOPES = [
 CLIENT_SECRETS_FILE = os.environ.get("GOOGLE_CLIENT_SECRETS_FILE", "app/auth/client_secret.json")
 TOKEN_PATH = "app/auth/token.json"
 FLOW_STORAGE_PATH = "app/auth/flow_storage.pickle"
+# Segundos que se reutiliza un cliente discovery ya construido
+SERVICE_CACHE_TTL = int(os.environ.get("GOOGLE_SERVICE_CACHE_TTL", "3600"))
 
 RENDER_EXTERNAL_URL = os.environ.get('RENDER_EXTERNAL_URL') 
 if RENDER_EXTERNAL_URL:
@@ -33,28 +39,58 @@ class OAuthRedirect(Exception):
         self.url = url
 
 
+# Credenciales en memoria (evita releer token.json en cada petición)
+# y clientes discovery ya construidos: {(api, version, id(creds)): (service, creado_en)}
+_credentials = None
+_services = {}
+_lock = threading.Lock()
+# Serializa las renovaciones del token (red + escritura de token.json)
+_refresh_lock = threading.Lock()
+# Documentos discovery ya parseados: {(api, version): dict}
+_discovery_documents = {}
+
+
+def invalidate_credentials():
+    """Olvida las credenciales y los clientes cacheados (logout / nuevo login)."""
+    global _credentials
+    with _lock:
+        _credentials = None
+        _services.clear()
+
+
+def _set_credentials(creds):
+    global _credentials
+    with _lock:
+        _credentials = creds
+        _services.clear()
+
+
 def is_logged_in():
-    if not os.path.exists(TOKEN_PATH):
-        return False
-    try:
-        creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
-        return creds.valid or (creds.expired and creds.refresh_token)
-    except Exception:
-        return False
+    creds = _credentials
+    if creds is None:
+        if not os.path.exists(TOKEN_PATH):
+            return False
+        try:
+            creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
+        except Exception:
+            return False
+    return bool(creds.valid or (creds.expired and creds.refresh_token))
 
 
 def get_credentials():
-    if not os.path.exists(TOKEN_PATH):
-        raise OAuthRedirect(_build_auth_url())
+    creds = _credentials
+    if creds is not None and creds.valid:
+        return creds
 
-    creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
+    if creds is None:
+        if not os.path.exists(TOKEN_PATH):
+            raise OAuthRedirect(_build_auth_url())
+        creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
+        _set_credentials(creds)
 
     if creds.expired and creds.refresh_token:
         try:
-            creds.refresh(Request())
-            with open(TOKEN_PATH, "w") as token:
-                token.write(creds.to_json())
-            return creds
+            return refresh_credentials(creds)
         except Exception:
              raise OAuthRedirect(_build_auth_url())
 
@@ -64,8 +100,70 @@ def get_credentials():
     raise OAuthRedirect(_build_auth_url())
 
 
+def refresh_credentials(creds):
+    """
+    Renueva el token caducado (petición bloqueante a Google) y lo guarda en
+    token.json. Es la única vía de renovación: la usan get_credentials y el
+    transporte async. Si varios hilos llegan a la vez, solo uno renueva.
+    """
+    from google.auth.transport.requests import Request
+
+    with _refresh_lock:
+        if creds.valid:
+            return creds
+        creds.refresh(Request())
+        # Unas credenciales antiguas (p. ej. de antes de un logout) se renuevan
+        # para terminar su petición, pero no se guardan ni sustituyen a las actuales
+        if creds is _credentials:
+            with open(TOKEN_PATH, "w") as token:
+                token.write(creds.to_json())
+            # Token nuevo: los clientes construidos con el anterior se descartan
+            _set_credentials(creds)
+    return creds
+
+
+def _discovery_document(api, version):
+    """
+    Documento discovery del paquete (sin red), leído y parseado una sola vez
+    en el primer uso: construir un cliente a partir del dict es ~20x más rápido.
+    """
+    with _lock:
+        document = _discovery_documents.get((api, version))
+    if document is None:
+        from googleapiclient.discovery_cache import get_static_doc
+
+        document = json.loads(get_static_doc(api, version))
+        with _lock:
+            _discovery_documents[(api, version)] = document
+    return document
+
+
+def get_google_service(api, version, creds):
+    """
+    Devuelve un cliente discovery cacheado por credencial durante SERVICE_CACHE_TTL.
+    El documento discovery se carga del paquete (static_discovery), sin red.
+    """
+    from googleapiclient.discovery import build_from_document
+
+    key = (api, version, id(creds))
+    now = time.monotonic()
+
+    with _lock:
+        cached = _services.get(key)
+        if cached and now - cached[1] < SERVICE_CACHE_TTL:
+            return cached[0]
+
+    service = build_from_document(_discovery_document(api, version), credentials=creds)
+
+    with _lock:
+        _services[key] = (service, now)
+    return service
+
+
 def _build_auth_url():
     """Genera la URL y guarda state y code_verifier."""
+    from google_auth_oauthlib.flow import Flow
+
     flow = Flow.from_client_secrets_file(
         CLIENT_SECRETS_FILE,
         scopes=SCOPES,
@@ -99,7 +197,8 @@ def _build_auth_url():
 
 def exchange_code_for_token(callback_url: str):
     """Reconstruye el Flow y canjea el código."""
-    
+    from google_auth_oauthlib.flow import Flow
+
     save_data = {}
     
     # 1. Recuperamos datos
@@ -131,6 +230,7 @@ def exchange_code_for_token(callback_url: str):
     os.makedirs(os.path.dirname(TOKEN_PATH), exist_ok=True)
     with open(TOKEN_PATH, "w") as token:
         token.write(creds.to_json())
+    _set_credentials(creds)
         
     # Limpieza
     if os.path.exists(FLOW_STORAGE_PATH):
@@ -141,4 +241,4 @@ def exchange_code_for_token(callback_url: str):
 
 def get_gmail_service():
     creds = get_credentials()
-    return build("gmail", "v1", credentials=creds)
\ No newline at end of file
+    return get_google_service("gmail", "v1", creds)
@@ -0,0 +1,237 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import time
+from collections import deque
+
+# =========================
+# CONFIG
+# =========================
+QUOTA_ENABLED = os.environ.get("GOOGLE_QUOTA_ENABLED", "1") == "1"
+# Gmail: 250 unidades de cuota por usuario y segundo
+GMAIL_QUOTA_UNITS_PER_SECOND = float(os.environ.get("GMAIL_QUOTA_UNITS_PER_SECOND", "250"))
+# Calendar limita peticiones por usuario (coste 1 por método)
+CALENDAR_REQUESTS_PER_SECOND = float(os.environ.get("CALENDAR_REQUESTS_PER_SECOND", "10"))
+# Capacidad del bucket en segundos de cuota. Gmail mide la cuota como media
+# móvil y admite ráfagas cortas: con 1 s (250 unidades) una carga del inbox de
+# 50 mensajes (messages.list + 50 messages.get = 255) ya tenía que esperar
+QUOTA_BURST_SECONDS = float(os.environ.get("GOOGLE_QUOTA_BURST_SECONDS", "2"))
+RATE_LIMIT_MAX_RETRIES = int(os.environ.get("GOOGLE_RATE_LIMIT_MAX_RETRIES", "5"))
+RATE_LIMIT_BACKOFF_SECONDS = float(os.environ.get("GOOGLE_RATE_LIMIT_BACKOFF_SECONDS", "1"))
+
+# Prioridades: menor número = antes
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+# Unidades de cuota por método (https://developers.google.com/gmail/api/reference/quota)
+GMAIL_METHOD_COSTS = {
+    "gmail.users.getProfile": 1,
+    "gmail.users.watch": 100,
+    "gmail.users.stop": 50,
+    "gmail.users.history.list": 2,
+    "gmail.users.labels.list": 1,
+    "gmail.users.labels.get": 1,
+    "gmail.users.labels.create": 5,
+    "gmail.users.labels.update": 5,
+    "gmail.users.labels.delete": 5,
+    "gmail.users.messages.list": 5,
+    "gmail.users.messages.get": 5,
+    "gmail.users.messages.modify": 5,
+    "gmail.users.messages.trash": 5,
+    "gmail.users.messages.untrash": 5,
+    "gmail.users.messages.delete": 10,
+    "gmail.users.messages.send": 100,
+    "gmail.users.messages.batchModify": 50,
+    "gmail.users.messages.batchDelete": 50,
+    "gmail.users.threads.list": 10,
+    "gmail.users.threads.get": 10,
+    "gmail.users.threads.modify": 10,
+}
+DEFAULT_GMAIL_COST = 5
+
+RATE_LIMIT_REASONS = (b"rateLimitExceeded", b"userRateLimitExceeded")
+
+_priority = contextvars.ContextVar("google_api_priority", default=PRIORITY_INTERACTIVE)
+
+
+@contextlib.contextmanager
+def background_priority():
+    """Las llamadas a Google hechas dentro ceden el paso a las interactivas."""
+    token = _priority.set(PRIORITY_BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def method_cost(method_id):
+    """(api, unidades) de un methodId de discovery, p. ej. "gmail.users.messages.get"."""
+    api = (method_id or "").split(".", 1)[0] or "default"
+    if api == "gmail":
+        return api, GMAIL_METHOD_COSTS.get(method_id, DEFAULT_GMAIL_COST)
+    return api, 1
+
+
+def is_rate_limited(status, content):
+    """429, o 403 con motivo rateLimitExceeded/userRateLimitExceeded."""
+    if status == 429:
+        return True
+    if status == 403 and content:
+        content = content if isinstance(content, bytes) else str(content).encode()
+        return any(reason in content for reason in RATE_LIMIT_REASONS)
+    return False
+
+
+class TokenBucket:
+    """
+    Token bucket con cola de espera por prioridad (y FIFO dentro de cada una).
+    Capacidad = `burst_seconds` segundos de cuota.
+    """
+
+    def __init__(self, rate, burst_seconds=QUOTA_BURST_SECONDS):
+        self.rate = rate
+        self.capacity = rate * burst_seconds
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._drainer = None
+
+    def _refill(self):
+        now = time.monotonic()
+        if now > self._paused_until:
+            start = max(self._updated, self._paused_until)
+            self.tokens = min(self.capacity, self.tokens + (now - start) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds):
+        """Tras un 429 nadie sale del bucket hasta que pase el backoff."""
+        self._refill()
+        self.tokens = 0
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, cost, priority):
+        cost = min(cost, self.capacity)
+        self._refill()
+        if not self._waiters and self.tokens >= cost and time.monotonic() >= self._paused_until:
+            self.tokens -= cost
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), cost, future))
+        if self._drainer is None or self._drainer.done():
+            self._drainer = asyncio.create_task(self._drain())
+        await future
+
+    async def _drain(self):
+        while self._waiters:
+            self._refill()
+            priority, seq, cost, future = self._waiters[0]
+            if future.cancelled():
+                heapq.heappop(self._waiters)
+                continue
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            if self.tokens >= cost:
+                heapq.heappop(self._waiters)
+                self.tokens -= cost
+                future.set_result(None)
+                continue
+            await asyncio.sleep((cost - self.tokens) / self.rate)
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+
+class QuotaScheduler:
+    """
+    Planificador central de llamadas a Google: un token bucket por (api, usuario)
+    con el coste de cada método, cola por prioridad y métricas de espera.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._waits = {PRIORITY_INTERACTIVE: deque(maxlen=1000), PRIORITY_BACKGROUND: deque(maxlen=1000)}
+        self.calls = 0
+        self.units = 0
+        self.rate_limited = 0
+        self.retries = 0
+
+    def _bucket(self, api, user):
+        key = (api, user)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate = GMAIL_QUOTA_UNITS_PER_SECOND if api == "gmail" else CALENDAR_REQUESTS_PER_SECOND
+            bucket = self._buckets[key] = TokenBucket(rate)
+        return bucket
+
+    async def acquire(self, method_id, user="default", count=1):
+        """Espera a que haya cuota para `count` llamadas a method_id."""
+        api, cost = method_cost(method_id)
+        priority = _priority.get()
+        start = time.monotonic()
+        if QUOTA_ENABLED:
+            await self._bucket(api, user).acquire(cost * count, priority)
+        self._waits.setdefault(priority, deque(maxlen=1000)).append(time.monotonic() - start)
+        self.calls += count
+        self.units += cost * count
+
+    def backoff(self, method_id, user, attempt):
+        """Devuelve cuánto esperar antes de reintentar (exponencial con jitter)."""
+        self.retries += 1
+        delay = RATE_LIMIT_BACKOFF_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5)
+        api, _ = method_cost(method_id)
+        if QUOTA_ENABLED:
+            self._bucket(api, user).pause(delay)
+        return delay
+
+    def metrics(self):
+        def summary(waits):
+            waits = sorted(waits)
+            if not waits:
+                return {"count": 0}
+
+            def pick(pct):
+                return waits[min(len(waits) - 1, int(len(waits) * pct / 100))]
+
+            return {
+                "count": len(waits),
+                "mean_ms": sum(waits) / len(waits) * 1000,
+                "p50_ms": pick(50) * 1000,
+                "p99_ms": pick(99) * 1000,
+                "max_ms": waits[-1] * 1000,
+            }
+
+        return {
+            "enabled": QUOTA_ENABLED,
+            "calls": self.calls,
+            "units": self.units,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+            "queue_wait": {
+                "interactive": summary(self._waits[PRIORITY_INTERACTIVE]),
+                "background": summary(self._waits[PRIORITY_BACKGROUND]),
+            },
+            "buckets": {
+                f"{api}:{user}": {
+                    "rate": bucket.rate,
+                    "tokens": round(bucket.tokens, 1),
+                    "queued": bucket.queued,
+                }
+                for (api, user), bucket in self._buckets.items()
+            },
+        }
+
+
+_scheduler = QuotaScheduler()
+
+
+def get_quota_scheduler():
+    return _scheduler
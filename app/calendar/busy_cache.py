@@ -0,0 +1,307 @@
+import asyncio
+import os
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+import pytz
+from googleapiclient.errors import HttpError
+
+from app.auth.async_http import execute_async
+from app.observability.metrics import record_cache
+
+# =========================
+# CONFIG
+# =========================
+# Ventana móvil cacheada: desde ayer hasta CALENDAR_CACHE_DAYS días vista
+CALENDAR_CACHE_DAYS = int(os.environ.get("CALENDAR_CACHE_DAYS", "90"))
+# Antigüedad máxima de la cache antes de pedir los cambios con syncToken (0 = siempre)
+CALENDAR_SYNC_MAX_AGE_SECONDS = float(os.environ.get("CALENDAR_SYNC_MAX_AGE_SECONDS", "60"))
+
+TIMEZONE = pytz.timezone("Europe/Madrid")
+
+# Solo los campos necesarios para saber si un evento ocupa la agenda
+EVENT_FIELDS = (
+    "items(id,status,summary,transparency,start,end,attendees(self,responseStatus)),"
+    "nextPageToken,nextSyncToken"
+)
+
+
+def to_timestamp(value):
+    """datetime (naive = Madrid) -> segundos epoch."""
+    if value.tzinfo is None:
+        value = TIMEZONE.localize(value)
+    return value.timestamp()
+
+
+def parse_event_time(moment):
+    # Eventos de día completo: {"date": "YYYY-MM-DD"} desde la medianoche local
+    if "dateTime" in moment:
+        return datetime.fromisoformat(moment["dateTime"].replace("Z", "+00:00")).timestamp()
+    return TIMEZONE.localize(datetime.fromisoformat(moment["date"])).timestamp()
+
+
+def event_busy_interval(event):
+    """
+    (inicio, fin) si el evento ocupa la agenda con el mismo criterio que
+    freebusy: ni cancelado, ni transparente ("disponible"), ni rechazado.
+    """
+    if event.get("status") == "cancelled" or event.get("transparency") == "transparent":
+        return None
+    for attendee in event.get("attendees", []):
+        if attendee.get("self") and attendee.get("responseStatus") == "declined":
+            return None
+    if "start" not in event or "end" not in event:
+        return None
+    return parse_event_time(event["start"]), parse_event_time(event["end"])
+
+
+class IntervalIndex:
+    """
+    Intervalos [inicio, fin) con etiqueta, ordenados por inicio, con un árbol
+    de segmentos con el fin máximo de cada rango: las consultas de solape son
+    O(log n + k). Las altas y bajas marcan el índice y se reconstruye (O(n log n))
+    en la siguiente consulta, así una ráfaga de cambios cuesta una sola reconstrucción.
+    """
+
+    def __init__(self):
+        self._items = {}
+        self._dirty = False
+        self._starts = []
+        self._sorted = []
+        self._size = 1
+        self._tree = [float("-inf")] * 2
+
+    def __len__(self):
+        return len(self._items)
+
+    def upsert(self, key, start, end, label=None):
+        self._items[key] = (start, end, label)
+        self._dirty = True
+
+    def remove(self, key):
+        if self._items.pop(key, None) is not None:
+            self._dirty = True
+
+    def clear(self):
+        self._items.clear()
+        self._dirty = True
+
+    def _rebuild(self):
+        self._sorted = sorted(self._items.values(), key=lambda item: item[0])
+        self._starts = [item[0] for item in self._sorted]
+        size = 1
+        while size < len(self._sorted):
+            size *= 2
+        tree = [float("-inf")] * (2 * size)
+        for i, item in enumerate(self._sorted):
+            tree[size + i] = item[1]
+        for node in range(size - 1, 0, -1):
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+        self._size = size
+        self._tree = tree
+        self._dirty = False
+
+    def iter_overlaps(self, start, end):
+        """Intervalos que solapan [start, end), en orden de inicio."""
+        if self._dirty:
+            self._rebuild()
+        # Candidatos: los que empiezan antes de `end`; de ellos, los que acaban después de `start`
+        limit = bisect_left(self._starts, end)
+        if not limit:
+            return
+        tree, size = self._tree, self._size
+        stack = [(1, 0, size)]
+        while stack:
+            node, lo, hi = stack.pop()
+            if lo >= limit or tree[node] <= start:
+                continue
+            if node >= size:
+                yield self._sorted[lo]
+                continue
+            mid = (lo + hi) // 2
+            # Derecha primero en la pila para recorrer de izquierda a derecha
+            stack.append((2 * node + 1, mid, hi))
+            stack.append((2 * node, lo, mid))
+
+    def first_overlap(self, start, end):
+        return next(self.iter_overlaps(start, end), None)
+
+
+class CalendarBusyCache:
+    """
+    Bloques ocupados de un calendario en una ventana móvil, en un IntervalIndex.
+
+    - Se llena con events.list (solo los campos de EVENT_FIELDS) y se mantiene
+      con syncToken: cada refresco trae únicamente los eventos cambiados.
+    - Un syncToken caducado (410) o una ventana que ya no cubre CALENDAR_CACHE_DAYS
+      provocan una sincronización completa.
+    - Mientras no está lista (o fuera de la ventana) las consultas van a freebusy.query.
+    """
+
+    def __init__(self, calendar_id="primary", days=CALENDAR_CACHE_DAYS,
+                 max_age=CALENDAR_SYNC_MAX_AGE_SECONDS):
+        self.calendar_id = calendar_id
+        self.days = days
+        self.max_age = max_age
+        self.index = IntervalIndex()
+        self.sync_token = None
+        self.window = None
+        self.synced_at = 0.0
+        self._lock = asyncio.Lock()
+        self._fill_task = None
+        self.fill_errors = 0
+        self.full_syncs = 0
+        self.incremental_syncs = 0
+        self.freebusy_queries = 0
+        self.local_queries = 0
+
+    @property
+    def ready(self):
+        return self.sync_token is not None
+
+    def covers(self, start, end):
+        return self.window is not None and self.window[0] <= start and end <= self.window[1]
+
+    def _window_is_current(self, now):
+        # La ventana se desplaza cada día
+        return self.window is not None and self.window[1] - now >= (self.days - 1) * 86400
+
+    async def refresh(self, service):
+        async with self._lock:
+            now = time.time()
+            if self.ready and self._window_is_current(now):
+                try:
+                    await self._sync(service, {"syncToken": self.sync_token})
+                    self.incremental_syncs += 1
+                    return
+                except HttpError as e:
+                    if e.resp.status != 410:
+                        raise
+            await self._full_sync(service, now)
+
+    async def _full_sync(self, service, now):
+        today = datetime.fromtimestamp(now, TIMEZONE).replace(hour=0, minute=0, second=0, microsecond=0)
+        window_start = today - timedelta(days=1)
+        window_end = today + timedelta(days=self.days)
+        self.index.clear()
+        self.sync_token = None
+        await self._sync(service, {
+            "timeMin": window_start.isoformat(),
+            "timeMax": window_end.isoformat(),
+        })
+        self.window = (window_start.timestamp(), window_end.timestamp())
+        self.full_syncs += 1
+
+    async def _sync(self, service, params):
+        page_token = None
+        while True:
+            request = service.events().list(
+                calendarId=self.calendar_id,
+                singleEvents=True,
+                maxResults=2500,
+                fields=EVENT_FIELDS,
+                pageToken=page_token,
+                **params,
+            )
+            response = await execute_async(request)
+            for event in response.get("items", []):
+                self.apply_event(event)
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                break
+        self.sync_token = response.get("nextSyncToken")
+        self.synced_at = time.time()
+
+    def apply_event(self, event):
+        interval = event_busy_interval(event)
+        if interval is None:
+            self.index.remove(event["id"])
+        else:
+            self.index.upsert(event["id"], interval[0], interval[1], event.get("summary") or "Ocupado")
+
+    async def _ensure_fresh(self, service):
+        if self.ready and time.time() - self.synced_at < self.max_age and self._window_is_current(time.time()):
+            return True
+        if self.ready:
+            await self.refresh(service)
+            return True
+        # Cache fría: se llena en segundo plano y esta consulta va a freebusy
+        if self._fill_task is None:
+            self._fill_task = asyncio.create_task(self.refresh(service))
+            self._fill_task.add_done_callback(self._fill_done)
+        return False
+
+    def _fill_done(self, task):
+        # Sin esto el error se perdería ("Task exception was never retrieved") y la
+        # cache seguiría fría sin que nadie lo supiera; la siguiente consulta reintenta
+        if task is self._fill_task:
+            self._fill_task = None
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self.fill_errors += 1
+            print(f"⚠️ Error llenando la cache de agenda ({self.calendar_id}): {error}")
+
+    async def busy_intervals(self, service, start, end):
+        """[(inicio, fin, título o None)] que solapan [start, end) (segundos epoch)."""
+        if await self._ensure_fresh(service) and self.covers(start, end):
+            self.local_queries += 1
+            record_cache("calendar_busy", hits=1)
+            return list(self.index.iter_overlaps(start, end))
+        record_cache("calendar_busy", misses=1)
+        return await self._freebusy(service, start, end)
+
+    async def first_conflict(self, service, start, end):
+        """Título del primer evento que solapa [start, end) ("Ocupado" si viene de freebusy)."""
+        if await self._ensure_fresh(service) and self.covers(start, end):
+            self.local_queries += 1
+            record_cache("calendar_busy", hits=1)
+            item = self.index.first_overlap(start, end)
+            return item[2] if item else None
+        record_cache("calendar_busy", misses=1)
+        busy = await self._freebusy(service, start, end)
+        return (busy[0][2] or "Ocupado") if busy else None
+
+    async def _freebusy(self, service, start, end):
+        self.freebusy_queries += 1
+        response = await execute_async(service.freebusy().query(body={
+            "timeMin": datetime.fromtimestamp(start, pytz.utc).isoformat(),
+            "timeMax": datetime.fromtimestamp(end, pytz.utc).isoformat(),
+            "items": [{"id": self.calendar_id}],
+        }))
+        blocks = response.get("calendars", {}).get(self.calendar_id, {}).get("busy", [])
+        return [
+            (parse_event_time({"dateTime": b["start"]}), parse_event_time({"dateTime": b["end"]}), None)
+            for b in blocks
+        ]
+
+    def stats(self):
+        return {
+            "calendar_id": self.calendar_id,
+            "ready": self.ready,
+            "filling": self._fill_task is not None,
+            "fill_errors": self.fill_errors,
+            "busy_blocks": len(self.index),
+            "window_days": self.days,
+            "full_syncs": self.full_syncs,
+            "incremental_syncs": self.incremental_syncs,
+            "freebusy_queries": self.freebusy_queries,
+            "local_queries": self.local_queries,
+        }
+
+
+_caches = {}
+
+
+def get_busy_cache(calendar_id="primary"):
+    cache = _caches.get(calendar_id)
+    if cache is None:
+        cache = _caches[calendar_id] = CalendarBusyCache(calendar_id)
+    return cache
+
+
+def clear_busy_caches():
+    """Logout: la agenda cacheada es de la cuenta anterior."""
+    _caches.clear()
@@ -1,61 +1,35 @@
-from googleapiclient.discovery import build
-from datetime import timedelta, datetime
+import os
+from datetime import timedelta
 import pytz 
+from fastapi.concurrency import run_in_threadpool
+
+from app.auth.async_http import execute_async, quota_user, thread_http
+from app.auth.google_auth import get_google_service
+from app.auth.quota import get_quota_scheduler
+from app.calendar.busy_cache import IntervalIndex, get_busy_cache, to_timestamp
+from app.observability.metrics import track_google_call
+
+# Inserciones por petición batch HTTP (Calendar admite hasta 50 por batch sin penalización)
+CALENDAR_BATCH_SIZE = int(os.environ.get("CALENDAR_BATCH_SIZE", "50"))
 
 class MeetingConflictError(Exception):
     pass
 
 def get_calendar_service(credentials):
-    return build("calendar", "v3", credentials=credentials)
+    return get_google_service("calendar", "v3", credentials)
 
-def check_availability(service, start_dt, end_dt):
+async def check_availability(service, start_dt, end_dt, calendar_id="primary"):
     """
-    Usa events().list para buscar colisiones reales.
-    Devuelve el TÍTULO del primer evento en conflicto si está ocupado.
+    Busca colisiones en la cache local de bloques ocupados (busy_cache):
+    freebusy.query mientras se llena y syncToken para mantenerla al día.
+    Devuelve el TÍTULO del primer evento en conflicto si está ocupado
+    ("Ocupado" si la respuesta viene de freebusy, que no da títulos).
     Devuelve None si está libre.
     """
-    # Definir zona horaria local (Madrid)
-    madrid_tz = pytz.timezone('Europe/Madrid')
-    
-    # Normalizar fechas
-    if start_dt.tzinfo is None:
-        start_dt = madrid_tz.localize(start_dt)
-    else:
-        start_dt = start_dt.astimezone(madrid_tz)
-        
-    if end_dt.tzinfo is None:
-        end_dt = madrid_tz.localize(end_dt)
-    else:
-        end_dt = end_dt.astimezone(madrid_tz)
-
-    time_min = start_dt.isoformat()
-    time_max = end_dt.isoformat()
-
-    print(f"🕵️ CHECKING CONFLICTS: {time_min} -> {time_max}")
-
-    # Consultar eventos
-    events_result = service.events().list(
-        calendarId='primary',
-        timeMin=time_min,
-        timeMax=time_max,
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
-    
-    events = events_result.get('items', [])
-
-    for event in events:
-        
-        if event.get('transparency') == 'transparent':
-            continue
-            
-        print(f"⚠️ CONFLICTO ENCONTRADO: {event['summary']}")
-        
-        return event['summary'] 
+    cache = get_busy_cache(calendar_id)
+    return await cache.first_conflict(service, to_timestamp(start_dt), to_timestamp(end_dt))
 
-    return None 
-
-def create_meeting(
+async def create_meeting(
     credentials,
     title: str,
     start_datetime, 
@@ -72,12 +46,23 @@ def create_meeting(
 
     # 1. VERIFICAR CONFLICTOS
     # Ahora conflict_event tendrá el nombre de la reunión 
-    conflict_event_title = check_availability(service, start_datetime, end_datetime)
+    conflict_event_title = await check_availability(service, start_datetime, end_datetime)
     
     if conflict_event_title:
         raise MeetingConflictError(f"Agenda ocupada: Coincide con '{conflict_event_title}'")
 
     # 2. CREAR EL EVENTO
+    created_event = await execute_async(service.events().insert(
+        calendarId="primary",
+        body=_event_body(title, start_datetime, end_datetime, attendees)
+    ))
+    # El evento ya ocupa la agenda aunque la cache no se haya sincronizado todavía
+    get_busy_cache().apply_event(created_event)
+
+    return created_event.get("htmlLink")
+
+
+def _event_body(title, start_datetime, end_datetime, attendees):
     event_body = {
         "summary": title,
         "start": {
@@ -92,8 +77,113 @@ def create_meeting(
 
     if attendees:
         event_body["attendees"] = [{"email": email} for email in attendees]
+    return event_body
 
-    created_event = service.events().insert(
-        calendarId="primary",
-        body=event_body
-    ).execute()
\ No newline at end of file
+
+# =========================
+# CREACIÓN EN LOTE
+# =========================
+async def create_meetings_batch(credentials, meetings):
+    """
+    Crea varias reuniones con:
+    - una sola consulta de disponibilidad para la unión de sus franjas
+      (cache de busy_cache o, si no la cubre, una freebusy.query)
+    - detección de choques entre reuniones del propio lote (gana la primera)
+    - inserciones en peticiones batch HTTP de CALENDAR_BATCH_SIZE
+
+    meetings: [{"title", "start_datetime", "duration_minutes", "attendees"}]
+    Devuelve un resultado por reunión, en el mismo orden:
+    {"status": "created" | "conflict" | "error", "calendar_link" | "detail"}
+    """
+    service = get_calendar_service(credentials)
+    madrid_tz = pytz.timezone('Europe/Madrid')
+
+    slots = []
+    for meeting in meetings:
+        start_datetime = meeting["start_datetime"]
+        if start_datetime.tzinfo is None:
+            start_datetime = madrid_tz.localize(start_datetime)
+        end_datetime = start_datetime + timedelta(minutes=meeting["duration_minutes"])
+        slots.append((start_datetime, end_datetime))
+
+    results = [None] * len(meetings)
+    if not meetings:
+        return results
+
+    # 1. VERIFICAR CONFLICTOS: una consulta para todo el lote
+    starts = [to_timestamp(start) for start, _ in slots]
+    ends = [to_timestamp(end) for _, end in slots]
+    busy = IntervalIndex()
+    for i, (start, end, label) in enumerate(await get_busy_cache().busy_intervals(service, min(starts), max(ends))):
+        busy.upsert(("agenda", i), start, end, label or "Ocupado")
+
+    # Las reservas del lote son provisionales: si una inserción falla se retira
+    # y las reuniones que chocaban con ella se vuelven a evaluar
+    pending = list(range(len(meetings)))
+    while True:
+        accepted, conflicts = [], []
+        for i in pending:
+            if busy.first_overlap(starts[i], ends[i]):
+                conflicts.append(i)
+                continue
+            # Las siguientes del lote ya no pueden pisar esta
+            busy.upsert(("lote", i), starts[i], ends[i], meetings[i]["title"])
+            accepted.append(i)
+
+        # 2. CREAR LOS EVENTOS
+        failed = await _insert_meetings(service, meetings, slots, accepted, results)
+        for i in failed:
+            busy.remove(("lote", i))
+        if not failed or not conflicts:
+            break
+        pending = conflicts
+
+    for i in conflicts:
+        error = MeetingConflictError(f"Agenda ocupada: Coincide con '{busy.first_overlap(starts[i], ends[i])[2]}'")
+        results[i] = {"status": "conflict", "detail": str(error)}
+
+    return results
+
+
+async def _insert_meetings(service, meetings, slots, indices, results):
+    """Inserta las reuniones `indices` en batches HTTP. Devuelve las que fallaron."""
+    failed = []
+    for chunk_start in range(0, len(indices), CALENDAR_BATCH_SIZE):
+        chunk = indices[chunk_start:chunk_start + CALENDAR_BATCH_SIZE]
+        # Un batch HTTP cuesta lo mismo que sus peticiones sueltas
+        await get_quota_scheduler().acquire(
+            "calendar.events.insert", quota_user(service._http), count=len(chunk)
+        )
+        requests = {
+            str(i): service.events().insert(
+                calendarId="primary",
+                body=_event_body(meetings[i]["title"], *slots[i], meetings[i].get("attendees")),
+            )
+            for i in chunk
+        }
+        with track_google_call("calendar.events.insert.batch"):
+            responses = await run_in_threadpool(_execute_batch_http, service, requests)
+        for i in chunk:
+            response, exception = responses[str(i)]
+            if exception is not None:
+                print(f"Error creando evento '{meetings[i]['title']}': {exception}")
+                results[i] = {"status": "error", "detail": "Error interno creando el evento"}
+                failed.append(i)
+                continue
+            get_busy_cache().apply_event(response)
+            results[i] = {"status": "created", "calendar_link": response.get("htmlLink")}
+    return failed
+
+
+def _execute_batch_http(service, requests):
+    """Versión bloqueante: {request_id: (respuesta, excepción)} de una petición batch HTTP."""
+    responses = {}
+
+    def callback(request_id, response, exception):
+        responses[request_id] = (response, exception)
+
+    batch = service.new_batch_http_request(callback=callback)
+    for request_id, request in requests.items():
+        batch.add(request, request_id=request_id)
+    batch.execute(http=thread_http(service._http))
+    return responses
@@ -0,0 +1,144 @@
+import asyncio
+import os
+from datetime import datetime, time as day_time, timedelta
+from itertools import chain
+
+from app.auth.async_http import execute_async
+from app.calendar.busy_cache import TIMEZONE, parse_event_time, to_timestamp
+
+# =========================
+# CONFIG
+# =========================
+# Horario laboral (Europe/Madrid) en el que se proponen huecos
+CALENDAR_WORK_START = os.environ.get("CALENDAR_WORK_START", "09:00")
+CALENDAR_WORK_END = os.environ.get("CALENDAR_WORK_END", "18:00")
+# Días laborables: 0 = lunes ... 6 = domingo
+CALENDAR_WORK_DAYS = {int(d) for d in os.environ.get("CALENDAR_WORK_DAYS", "0,1,2,3,4").split(",")}
+# Los huecos empiezan en múltiplos de este paso (9:00, 9:15, ...)
+CALENDAR_SLOT_STEP_MINUTES = int(os.environ.get("CALENDAR_SLOT_STEP_MINUTES", "15"))
+# Límite de calendarios por freebusy.query
+FREEBUSY_MAX_CALENDARS = 50
+
+
+def _parse_hour(value):
+    hours, minutes = value.split(":")
+    return day_time(int(hours), int(minutes))
+
+
+def merge_busy(busy_lists):
+    """
+    Barrido sobre los intervalos ocupados de varios calendarios: se recorren
+    por orden de inicio y se fusionan solapes y contiguos en una pasada.
+    Cada lista ya viene ordenada (freebusy), así que sorted (Timsort) solo
+    intercala tramos: O(m log c). Generador: free_slots deja de consumir
+    en cuanto tiene los huecos pedidos.
+    """
+    current = None
+    for start, end in sorted(chain.from_iterable(busy_lists)):
+        if current is None:
+            current = [start, end]
+        elif start <= current[1]:
+            if end > current[1]:
+                current[1] = end
+        else:
+            yield current
+            current = [start, end]
+    if current is not None:
+        yield current
+
+
+def working_windows(start, end, work_start=CALENDAR_WORK_START, work_end=CALENDAR_WORK_END,
+                    work_days=CALENDAR_WORK_DAYS):
+    """Franjas laborables (epoch) dentro de [start, end), día a día en hora de Madrid."""
+    opening, closing = _parse_hour(work_start), _parse_hour(work_end)
+    day = datetime.fromtimestamp(start, TIMEZONE).date()
+    last = datetime.fromtimestamp(end, TIMEZONE).date()
+    while day <= last:
+        if day.weekday() in work_days:
+            # localize por día: los cambios de horario mueven el offset
+            window_start = TIMEZONE.localize(datetime.combine(day, opening)).timestamp()
+            window_end = TIMEZONE.localize(datetime.combine(day, closing)).timestamp()
+            window_start, window_end = max(window_start, start), min(window_end, end)
+            if window_start < window_end:
+                yield window_start, window_end
+        day += timedelta(days=1)
+
+
+def free_slots(busy, windows, duration, count, step=CALENDAR_SLOT_STEP_MINUTES * 60):
+    """
+    Los `count` primeros huecos de `duration` segundos que no pisan `busy`
+    (fusionado y ordenado, p. ej. merge_busy) dentro de `windows`. Los huecos
+    no se solapan entre sí. Un único avance sobre busy y windows, con salida anticipada.
+    """
+    slots = []
+    busy = iter(busy)
+    block = next(busy, None)
+    for window_start, window_end in windows:
+        cursor = -(-window_start // step) * step
+        while cursor + duration <= window_end:
+            while block is not None and block[1] <= cursor:
+                block = next(busy, None)
+            if block is not None and block[0] < cursor + duration:
+                # Ocupado: saltar al final del bloque, alineado al paso
+                cursor = -(-block[1] // step) * step
+                continue
+            slots.append((cursor, cursor + duration))
+            if len(slots) == count:
+                return slots
+            cursor += duration
+    return slots
+
+
+async def query_busy(service, calendar_ids, start, end):
+    """
+    freebusy.query de todos los calendarios (una llamada por cada 50).
+    Devuelve ({calendar_id: [(inicio, fin)]}, {calendar_id: motivo del error}).
+    """
+    chunks = [calendar_ids[i:i + FREEBUSY_MAX_CALENDARS]
+              for i in range(0, len(calendar_ids), FREEBUSY_MAX_CALENDARS)]
+    responses = await asyncio.gather(*[
+        execute_async(service.freebusy().query(body={
+            "timeMin": datetime.fromtimestamp(start, TIMEZONE).isoformat(),
+            "timeMax": datetime.fromtimestamp(end, TIMEZONE).isoformat(),
+            "items": [{"id": calendar_id} for calendar_id in chunk],
+        }))
+        for chunk in chunks
+    ])
+
+    busy, errors = {}, {}
+    for response in responses:
+        for calendar_id, data in response.get("calendars", {}).items():
+            if data.get("errors"):
+                # Calendario ajeno sin permisos o inexistente: no se puede tener en cuenta
+                errors[calendar_id] = data["errors"][0].get("reason", "unknown")
+                continue
+            busy[calendar_id] = [
+                (parse_event_time({"dateTime": b["start"]}), parse_event_time({"dateTime": b["end"]}))
+                for b in data.get("busy", [])
+            ]
+    return busy, errors
+
+
+async def suggest_slots(service, duration_minutes, attendees=(), start=None, days=14, count=5):
+    """
+    Primeros huecos libres en horario laboral para el usuario y los asistentes.
+    `start`: datetime (naive = Madrid); por defecto, ahora.
+    """
+    start_ts = to_timestamp(start) if start else datetime.now(TIMEZONE).timestamp()
+    end_ts = start_ts + days * 86400
+    calendar_ids = ["primary"] + [email for email in dict.fromkeys(attendees) if email]
+
+    busy_by_calendar, errors = await query_busy(service, calendar_ids, start_ts, end_ts)
+    busy = merge_busy(busy_by_calendar.values())
+    slots = free_slots(busy, working_windows(start_ts, end_ts), duration_minutes * 60, count)
+
+    return {
+        "slots": [
+            {
+                "start": datetime.fromtimestamp(slot_start, TIMEZONE).isoformat(),
+                "end": datetime.fromtimestamp(slot_end, TIMEZONE).isoformat(),
+            }
+            for slot_start, slot_end in slots
+        ],
+        "unavailable_calendars": errors,
+    }
@@ -1,9 +1,74 @@
-def get_or_create_label(service, label_name):
-    labels = service.users().labels().list(userId="me").execute().get("labels", [])
+import asyncio
 
-    for label in labels:
-        if label["name"] == label_name:
-            return label["id"]
+from googleapiclient.errors import HttpError
+
+from app.auth.async_http import execute_async
+
+
+class LabelIndex:
+    """
+    Índice en memoria nombre -> id de las labels de Gmail (sin distinguir mayúsculas).
+    Se rellena con un único labels.list por sesión y se actualiza al crear labels.
+    """
+
+    def __init__(self):
+        self._labels = {}
+        self._by_name = {}
+        self._loaded = False
+        self._lock = asyncio.Lock()
+
+    async def load(self, service):
+        async with self._lock:
+            if self._loaded:
+                return
+            results = await execute_async(service.users().labels().list(userId="me"))
+            self._labels = {}
+            self._by_name = {}
+            for label in results.get("labels", []):
+                self.add(label)
+            self._loaded = True
+
+    def add(self, label):
+        self._labels[label["id"]] = label
+        self._by_name[label["name"].lower()] = label["id"]
+
+    def get_id(self, label_name):
+        return self._by_name.get(label_name.lower())
+
+    def has_id(self, label_id):
+        return label_id in self._labels
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def labels(self):
+        return list(self._labels.values())
+
+    def invalidate(self):
+        """La próxima consulta vuelve a pedir labels.list."""
+        self._loaded = False
+
+    def clear(self):
+        self._labels = {}
+        self._by_name = {}
+        self._loaded = False
+
+
+_label_index = LabelIndex()
+
+
+def get_label_index():
+    return _label_index
+
+
+async def get_or_create_label(service, label_name):
+    index = get_label_index()
+    await index.load(service)
+
+    label_id = index.get_id(label_name)
+    if label_id:
+        return label_id
 
     label_body = {
         "name": label_name,
@@ -11,35 +76,48 @@ def get_or_create_label(service, label_name):
         "messageListVisibility": "show"
     }
 
-    created_label = service.users().labels().create(
-        userId="me",
-        body=label_body
-    ).execute()
-
+    try:
+        created_label = await execute_async(service.users().labels().create(
+            userId="me",
+            body=label_body
+        ))
+    except HttpError as e:
+        # 409: otra petición (u otro cliente) la ha creado mientras tanto
+        if e.resp.status != 409:
+            raise
+        index.invalidate()
+        await index.load(service)
+        label_id = index.get_id(label_name)
+        if not label_id:
+            raise
+        return label_id
+
+    index.add(created_label)
     return created_label["id"]
 
 
-def archive_and_label_message(service, message_id, label_name):
-    label_id = get_or_create_label(service, label_name)
+async def archive_and_label_message(service, message_id, label_name):
+    label_id = await get_or_create_label(service, label_name)
 
-    service.users().messages().modify(
+    await execute_async(service.users().messages().modify(
         userId="me",
         id=message_id,
         body={
             "addLabelIds": [label_id],
             "removeLabelIds": ["INBOX"]
         }
-    ).execute()
+    ))
 
-def get_labels(service):
+    return label_id
+
+async def get_labels(service):
     """
     Devuelve todas las labels de Gmail (system + user)
     """
-    results = service.users().labels().list(
-        userId="me"
-    ).execute()
+    index = get_label_index()
+    await index.load(service)
 
-    labels = results.get("labels", [])
+    labels = index.labels()
 
     return [
         {
@@ -50,47 +128,125 @@ def get_labels(service):
         for label in labels
     ]
 
-def trash_message(service, message_id):
-    service.users().messages().trash(
+async def trash_message(service, message_id):
+    await execute_async(service.users().messages().trash(
         userId="me",
         id=message_id
-    ).execute()
+    ))
 
-def add_label_to_message(service, message_id: str, label_name: str):
+async def add_label_to_message(service, message_id: str, label_name: str):
     """
     Añade una label a un mensaje de Gmail.
     Crea la label si no existe.
     NO elimina INBOX.
     """
 
-    # Obtener labels existentes
-    labels_response = service.users().labels().list(userId="me").execute()
-    labels = labels_response.get("labels", [])
-
-    label_id = None
-    for label in labels:
-        if label["name"].lower() == label_name.lower():
-            label_id = label["id"]
-            break
-
-    # Crear la label si no existe
-    if not label_id:
-        new_label = service.users().labels().create(
-            userId="me",
-            body={
-                "name": label_name,
-                "labelListVisibility": "labelShow",
-                "messageListVisibility": "show",
-            },
-        ).execute()
-        label_id = new_label["id"]
+    label_id = await get_or_create_label(service, label_name)
 
     # Añadir la label al mensaje
-    service.users().messages().modify(
+    await execute_async(service.users().messages().modify(
         userId="me",
         id=message_id,
         body={
             "addLabelIds": [label_id],
         },
-    ).execute()
+    ))
 
+    return label_id
+
+
+# =========================
+# BULK (batchModify)
+# =========================
+BATCH_MODIFY_MAX_IDS = 1000  # Límite de users.messages.batchModify
+
+BULK_ACTIONS = {
+    # acción: (addLabelIds, removeLabelIds); "LABEL" se sustituye por el id real
+    "archive": ([], ["INBOX"]),
+    "archive_label": (["LABEL"], ["INBOX"]),
+    "label": (["LABEL"], []),
+    "mark_read": ([], ["UNREAD"]),
+    "mark_unread": (["UNREAD"], []),
+    "trash": (["TRASH"], ["INBOX"]),
+}
+
+
+async def batch_modify_messages(service, message_ids, add_label_ids=(), remove_label_ids=()):
+    """
+    Aplica los mismos cambios de labels a muchos mensajes con batchModify,
+    en bloques de hasta BATCH_MODIFY_MAX_IDS ids por llamada.
+    Devuelve {message_id: None si fue bien, o el texto del error}.
+    """
+    results = {}
+    for start in range(0, len(message_ids), BATCH_MODIFY_MAX_IDS):
+        chunk = message_ids[start:start + BATCH_MODIFY_MAX_IDS]
+        try:
+            await execute_async(service.users().messages().batchModify(
+                userId="me",
+                body={
+                    "ids": chunk,
+                    "addLabelIds": list(add_label_ids),
+                    "removeLabelIds": list(remove_label_ids),
+                },
+            ))
+            error = None
+        except HttpError as e:
+            error = str(e)
+        for message_id in chunk:
+            results[message_id] = error
+    return results
+
+
+async def apply_bulk_operations(service, operations):
+    """
+    operations: lista de {"action", "message_ids", "label_name"}.
+    Las operaciones de cada id se combinan en orden de petición (si dos se
+    contradicen, p. ej. mark_read y mark_unread, gana la última) y se agrupan
+    los ids con el mismo resultado: un batchModify por grupo. Devuelve un
+    resultado por id. Lanza ValueError si alguna acción no existe o le falta
+    label_name.
+    """
+    changes = {}  # message_id -> (acciones, labels a añadir, labels a quitar)
+    for op in operations:
+        action = op["action"]
+        if action not in BULK_ACTIONS:
+            raise ValueError(f"Acción no soportada: {action}")
+
+        add, remove = BULK_ACTIONS[action]
+        if "LABEL" in add:
+            if not op.get("label_name"):
+                raise ValueError(f"La acción {action} necesita label_name")
+            label_id = await get_or_create_label(service, op["label_name"])
+            add = [label_id if lid == "LABEL" else lid for lid in add]
+
+        for message_id in op["message_ids"]:
+            actions, net_add, net_remove = changes.setdefault(message_id, ([], set(), set()))
+            if action in actions:
+                actions.remove(action)
+            actions.append(action)
+            net_add.difference_update(remove)
+            net_add.update(add)
+            net_remove.difference_update(add)
+            net_remove.update(remove)
+
+    groups = {}
+    for message_id, (actions, net_add, net_remove) in changes.items():
+        key = (tuple(sorted(net_add)), tuple(sorted(net_remove)))
+        groups.setdefault(key, []).append(message_id)
+
+    results = []
+    for (add, remove), message_ids in groups.items():
+        outcome = await batch_modify_messages(service, message_ids, add, remove)
+        for message_id in message_ids:
+            error = outcome[message_id]
+            actions = changes[message_id][0]
+            results.append({
+                "id": message_id,
+                "action": actions[-1],
+                "actions": actions,
+                "status": "ok" if error is None else "error",
+                "error": error,
+                "addLabelIds": list(add),
+                "removeLabelIds": list(remove),
+            })
+    return results
@@ -0,0 +1,183 @@
+import asyncio
+import base64
+import json
+import os
+import time
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.auth.async_http import execute_async
+from app.auth.google_auth import OAuthRedirect, get_gmail_service, is_logged_in
+from app.auth.quota import background_priority
+from app.gmail.message_store import get_message_store, sync_message_store
+
+# =========================
+# CONFIG
+# =========================
+# Topic de Pub/Sub con permiso de publicación para gmail-api-push@system.gserviceaccount.com.
+# Sin topic no hay push y el correo nuevo llega solo por polling
+GMAIL_PUSH_TOPIC = os.environ.get("GMAIL_PUSH_TOPIC")
+# Secreto compartido que la suscripción push añade a la URL (?token=...)
+GMAIL_PUSH_VERIFICATION_TOKEN = os.environ.get("GMAIL_PUSH_VERIFICATION_TOKEN")
+GMAIL_PUSH_LABEL_IDS = os.environ.get("GMAIL_PUSH_LABEL_IDS", "INBOX").split(",")
+# El watch caduca a los 7 días; Google recomienda renovarlo a diario
+GMAIL_WATCH_RENEW_SECONDS = float(os.environ.get("GMAIL_WATCH_RENEW_SECONDS", "86400"))
+GMAIL_WATCH_CHECK_SECONDS = float(os.environ.get("GMAIL_WATCH_CHECK_SECONDS", "300"))
+# Con push el polling queda solo como red de seguridad (notificaciones perdidas)
+GMAIL_PUSH_FALLBACK_POLL_SECONDS = float(os.environ.get("GMAIL_PUSH_FALLBACK_POLL_SECONDS", "900"))
+
+# Sin secreto /gmail/push quedaría abierto: el push exige topic y token
+PUSH_ENABLED = bool(GMAIL_PUSH_TOPIC and GMAIL_PUSH_VERIFICATION_TOKEN)
+if GMAIL_PUSH_TOPIC and not GMAIL_PUSH_VERIFICATION_TOKEN:
+    print("⚠️ GMAIL_PUSH_TOPIC sin GMAIL_PUSH_VERIFICATION_TOKEN: push desactivado, solo polling")
+
+
+class InvalidPushMessage(Exception):
+    pass
+
+
+def decode_push_message(envelope):
+    """
+    Decodifica el cuerpo de una push de Pub/Sub:
+    {"message": {"data": base64({"emailAddress", "historyId"}), "messageId", ...}, "subscription"}
+    """
+    try:
+        message = envelope["message"]
+        data = message["data"]
+        payload = json.loads(base64.b64decode(data + "=" * (-len(data) % 4)))
+        return {
+            "emailAddress": payload["emailAddress"],
+            "historyId": int(payload["historyId"]),
+            "messageId": message.get("messageId") or message.get("message_id"),
+        }
+    except (KeyError, TypeError, ValueError) as e:
+        raise InvalidPushMessage(f"Notificación push no válida: {e}")
+
+
+# =========================
+# WATCH
+# =========================
+async def start_watch(service, store, topic=GMAIL_PUSH_TOPIC, label_ids=GMAIL_PUSH_LABEL_IDS):
+    """
+    Registra (o renueva) users.watch. Guarda la caducidad y, si el almacén
+    aún no tiene punto de partida, el historyId devuelto.
+    """
+    response = await execute_async(service.users().watch(userId="me", body={
+        "topicName": topic,
+        "labelIds": label_ids,
+        "labelFilterBehavior": "include",
+    }))
+    with store.lock:
+        store.set_state("watch_expiration", response["expiration"])
+        store.set_state("watch_renewed_at", str(time.time()))
+        if store.get_history_id() is None:
+            store.set_history_id(response["historyId"])
+    return response
+
+
+async def stop_watch(service, store):
+    await execute_async(service.users().stop(userId="me"))
+    with store.lock:
+        store.set_state("watch_expiration", None)
+
+
+def watch_needs_renewal(store, now=None):
+    now = now or time.time()
+    expiration = store.get_state("watch_expiration")
+    renewed_at = store.get_state("watch_renewed_at")
+    if not expiration or not renewed_at:
+        return True
+    # Renovación diaria, o antes si por lo que sea queda menos de un periodo para caducar
+    return (
+        now - float(renewed_at) >= GMAIL_WATCH_RENEW_SECONDS
+        or int(expiration) / 1000 - now < GMAIL_WATCH_RENEW_SECONDS
+    )
+
+
+async def renew_watch_periodically(interval=GMAIL_WATCH_CHECK_SECONDS):
+    """Comprueba cada `interval` segundos si hay que (re)registrar el watch."""
+    while True:
+        if is_logged_in():
+            store = get_message_store()
+            try:
+                if watch_needs_renewal(store):
+                    with background_priority():
+                        await start_watch(await run_in_threadpool(get_gmail_service), store)
+            except OAuthRedirect:
+                pass
+            except Exception as e:
+                print(f"Error renovando Gmail watch: {e}")
+        await asyncio.sleep(interval)
+
+
+# =========================
+# INGESTA
+# =========================
+class PushIngestor:
+    """
+    Aplica las notificaciones push al almacén con history.list.
+
+    Pub/Sub puede entregar duplicadas, desordenadas o a ráfagas: las que no
+    traen un historyId nuevo se ignoran y, si llegan varias durante una
+    sincronización, se agrupan en una sola sincronización más.
+    """
+
+    def __init__(self, store=None, get_service=get_gmail_service):
+        self.store = store or get_message_store()
+        self.get_service = get_service
+        self._latest = 0
+        self._dirty = False
+        self._task = None
+        self.received = 0
+        self.ignored = 0
+        self.syncs = 0
+
+    def notify(self, notification):
+        """Registra la notificación y devuelve enseguida (Pub/Sub espera el ack)."""
+        self.received += 1
+        known = int(self.store.get_history_id() or 0)
+        if notification["historyId"] <= max(known, self._latest):
+            self.ignored += 1
+            return False
+
+        self._latest = notification["historyId"]
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._drain())
+        return True
+
+    async def _drain(self):
+        while self._dirty:
+            self._dirty = False
+            self.syncs += 1
+            try:
+                await sync_message_store(await run_in_threadpool(self.get_service), self.store)
+            except Exception as e:
+                if not isinstance(e, OAuthRedirect):
+                    print(f"Error aplicando notificación push: {e}")
+                # Una reentrega de Pub/Sub (o el polling de respaldo) lo volverá a intentar
+                self._latest = 0
+                return
+
+    async def join(self):
+        if self._task is not None:
+            await self._task
+
+    def stats(self):
+        return {
+            "enabled": PUSH_ENABLED,
+            "received": self.received,
+            "ignored": self.ignored,
+            "syncs": self.syncs,
+            "watch_expiration": self.store.get_state("watch_expiration"),
+        }
+
+
+_ingestor = None
+
+
+def get_push_ingestor():
+    global _ingestor
+    if _ingestor is None:
+        _ingestor = PushIngestor()
+    return _ingestor
@@ -1,7 +1,9 @@
 import base64
 from email.message import EmailMessage
 
-def send_email_reply(service, to_email, subject, body, thread_id=None):
+from app.auth.async_http import execute_async
+
+async def send_email_reply(service, to_email, subject, body, thread_id=None):
     message = EmailMessage()
     message.set_content(body)
     message["To"] = to_email
@@ -22,10 +24,10 @@ def send_email_reply(service, to_email, subject, body, thread_id=None):
     if thread_id:
         send_message["threadId"] = thread_id
 
-    service.users().messages().send(
+    await execute_async(service.users().messages().send(
         userId="me",
         body=send_message
-    ).execute()
+    ))
     
     # extrae los datos de destinatario, asunto y threadId
 def extract_email_metadata(message):
@@ -1,11 +1,37 @@
+import asyncio
 import base64
+import os
 
+from fastapi.concurrency import run_in_threadpool
+from googleapiclient.errors import HttpError
 
-def get_last_messages(service, label_id="INBOX", max_results=20):
+from app.auth import async_http
+from app.auth.async_http import execute_async, quota_user, thread_http
+from app.auth.quota import get_quota_scheduler
+from app.observability.metrics import track_google_call
+
+# Peticiones simultáneas (o tamaño de lote batch HTTP sin httpx). Gmail recomienda <= 50
+GMAIL_BATCH_SIZE = int(os.environ.get("GMAIL_BATCH_SIZE", "50"))
+
+# Cabeceras que se piden con format="metadata" (listados sin body)
+METADATA_HEADERS = ["From", "Subject", "Date"]
+
+
+async def get_last_messages(service, label_id="INBOX", max_results=20):
+    messages, _ = await list_message_page(service, label_id=label_id, page_size=max_results)
+    return messages
+
+
+async def list_message_page(service, label_id="INBOX", page_size=20, page_token=None):
+    """
+    Una página de messages.list: (referencias {id, threadId}, nextPageToken o None).
+    """
     params = {
         "userId": "me",
-        "maxResults": max_results,
+        "maxResults": page_size,
     }
+    if page_token:
+        params["pageToken"] = page_token
 
     SYSTEM_LABELS_USING_QUERY = {
         "SENT": "in:sent",
@@ -19,83 +45,93 @@ def get_last_messages(service, label_id="INBOX", max_results=20):
     else:
         params["labelIds"] = [label_id]
 
-    results = service.users().messages().list(**params).execute()
-    return results.get("messages", [])
+    results = await execute_async(service.users().messages().list(**params))
+    return results.get("messages", []), results.get("nextPageToken")
 
 
 
-def get_message_body(message):
-    """
-    Extrae el body de un mensaje Gmail (text/plain o text/html)
-    """
-    payload = message.get("payload", {})
-    body = ""
+# =========================
+# BODY (MIME)
+# =========================
+DEFAULT_CHARSET = "utf-8"
 
-    def extract_from_part(part):
-        data = part.get("body", {}).get("data")
-        if data:
-            return base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
-        return ""
 
-    # Caso simple
-    if payload.get("body", {}).get("data"):
-        return extract_from_part(payload)
+def _part_header(part, name):
+    for h in part.get("headers", []):
+        if h["name"].lower() == name:
+            return h["value"]
+    return ""
 
-    # Multipart
-    for part in payload.get("parts", []):
-        mime = part.get("mimeType", "")
 
-        if mime == "text/plain":
-            return extract_from_part(part)
+def _is_attachment(part):
+    if part.get("filename"):
+        return True
+    return _part_header(part, "content-disposition").lower().startswith("attachment")
 
-        if mime == "text/html" and not body:
-            body = extract_from_part(part)
 
-    return body
+def _part_charset(part):
+    content_type = _part_header(part, "content-type")
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.partition("=")
+        if key.strip().lower() == "charset":
+            return value.strip().strip('"\'') or DEFAULT_CHARSET
+    return DEFAULT_CHARSET
 
 
-def _extract_body_from_parts(parts):
-    for part in parts:
-        mime_type = part.get("mimeType", "")
+def decode_part(part):
+    """Decodifica el body de una parte respetando el charset de sus cabeceras."""
+    data = (part or {}).get("body", {}).get("data")
+    if not data:
+        return ""
+    raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+    try:
+        return raw.decode(_part_charset(part), errors="replace")
+    except LookupError:
+        # Charset desconocido para Python
+        return raw.decode(DEFAULT_CHARSET, errors="replace")
 
-        # Caso texto plano
-        if mime_type == "text/plain":
-            data = part.get("body", {}).get("data")
-            if data:
-                return base64.urlsafe_b64decode(data).decode("utf-8")
-
-        # Caso HTML (fallback)
-        if mime_type == "text/html":
-            data = part.get("body", {}).get("data")
-            if data:
-                html = base64.urlsafe_b64decode(data).decode("utf-8")
-                return html  # luego podemos limpiarlo
-
-        # Caso multipart (recursivo)
-        if part.get("parts"):
-            result = _extract_body_from_parts(part["parts"])
-            if result:
-                return result
 
-    return ""
+def iter_text_parts(payload):
+    """
+    Recorre el árbol MIME de forma iterativa y perezosa, en orden de documento,
+    generando las partes text/plain y text/html con datos (sin decodificar).
+    Los adjuntos se ignoran. Con format="metadata"/"minimal" no genera nada.
+    """
+    # Pila de iteradores: no copia ni invierte las listas de partes
+    stack = [iter((payload,))] if payload else []
+    while stack:
+        part = next(stack[-1], None)
+        if part is None:
+            stack.pop()
+            continue
+        children = part.get("parts")
+        if children:
+            stack.append(iter(children))
+            continue
+        mime_type = part.get("mimeType") or ("text/plain" if part is payload else "")
+        if mime_type not in ("text/plain", "text/html"):
+            continue
+        if not part.get("body", {}).get("data") or _is_attachment(part):
+            continue
+        yield mime_type, part
 
 
 def get_message_body(message):
-    payload = message.get("payload", {})
-
-    # Caso simple
-    if payload.get("body", {}).get("data"):
-        return base64.urlsafe_b64decode(
-            payload["body"]["data"]
-        ).decode("utf-8")
-
-    # Caso multipart
-    parts = payload.get("parts", [])
-    return _extract_body_from_parts(parts)
+    """
+    Extrae el body de un mensaje Gmail (text/plain o, si no hay, text/html)
+    """
+    html = None
+    for mime_type, part in iter_text_parts(message.get("payload")):
+        if mime_type == "text/plain":
+            return decode_part(part)
+        if html is None:
+            html = part
+    return decode_part(html)
 
 
 def extract_email_metadata(message):
-    headers = message.get("payload", {}).get("headers", [])
+    # Vale también para mensajes pedidos con format="metadata" o "minimal"
+    headers = (message.get("payload") or {}).get("headers", [])
 
     def get_header(name):
         for h in headers:
@@ -106,11 +142,12 @@ def extract_email_metadata(message):
     return {
         "from": get_header("From"),
         "subject": get_header("Subject"),
+        "date": get_header("Date"),
         "threadId": message.get("threadId")
     }
 
-def get_labels(service):
-    results = service.users().labels().list(userId="me").execute()
+async def get_labels(service):
+    results = await execute_async(service.users().labels().list(userId="me"))
     labels = results.get("labels", [])
 
     return [
@@ -122,13 +159,122 @@ def get_labels(service):
         for label in labels
     ]
 
-def get_message(service, message_id):
+def _get_request(service, message_id, format):
+    params = {"userId": "me", "id": message_id, "format": format}
+    if format == "metadata":
+        params["metadataHeaders"] = METADATA_HEADERS
+    return service.users().messages().get(**params)
+
+
+async def get_message(service, message_id, format="full"):
     """
-    Obtiene un mensaje completo de Gmail por ID
+    Obtiene un mensaje de Gmail por ID
+    (format="metadata" o "minimal" si solo hacen falta cabeceras/labels)
     """
-    return service.users().messages().get(
-        userId="me",
-        id=message_id,
-        format="full"
-    ).execute()
+    return await execute_async(_get_request(service, message_id, format))
 
+
+async def get_messages_batch(service, message_ids, batch_size=GMAIL_BATCH_SIZE, format="full"):
+    """
+    Obtiene varios mensajes de Gmail con como mucho `batch_size` peticiones en vuelo
+    (multiplexadas sobre HTTP/2). Sin transporte async usa la interfaz batch HTTP.
+    Devuelve los mensajes en el mismo orden que message_ids (omite los que fallan).
+    Con format="metadata" solo se piden las cabeceras METADATA_HEADERS.
+    """
+    unique_ids = list(dict.fromkeys(message_ids))
+
+    if not async_http.ASYNC_TRANSPORT:
+        results = []
+        for start in range(0, len(unique_ids), batch_size):
+            chunk = unique_ids[start:start + batch_size]
+            await _acquire_batch_quota(service, len(chunk))
+            with track_google_call("gmail.users.messages.get.batch"):
+                results.extend(await run_in_threadpool(
+                    _get_messages_batch_http, service, chunk, batch_size, format
+                ))
+        return results
+
+    semaphore = asyncio.Semaphore(batch_size)
+
+    async def fetch(message_id):
+        async with semaphore:
+            try:
+                return await execute_async(_get_request(service, message_id, format))
+            except HttpError as e:
+                print(f"Error obteniendo mensaje {message_id}: {e}")
+                return None
+
+    results = await asyncio.gather(*(fetch(mid) for mid in unique_ids))
+    return [msg for msg in results if msg is not None]
+
+
+async def iter_messages_batch(service, message_ids, batch_size=GMAIL_BATCH_SIZE, format="full"):
+    """
+    Como get_messages_batch, pero genera (message_id, mensaje o None) en el
+    orden de message_ids según van llegando, con como mucho `batch_size`
+    peticiones en vuelo: la memoria no depende del número de mensajes.
+    """
+    if not async_http.ASYNC_TRANSPORT:
+        for start in range(0, len(message_ids), batch_size):
+            chunk = message_ids[start:start + batch_size]
+            await _acquire_batch_quota(service, len(chunk))
+            with track_google_call("gmail.users.messages.get.batch"):
+                messages = await run_in_threadpool(
+                    _get_messages_batch_http, service, list(dict.fromkeys(chunk)), batch_size, format
+                )
+            by_id = {msg["id"]: msg for msg in messages}
+            for message_id in chunk:
+                yield message_id, by_id.get(message_id)
+        return
+
+    async def fetch(message_id):
+        try:
+            return await execute_async(_get_request(service, message_id, format))
+        except HttpError as e:
+            print(f"Error obteniendo mensaje {message_id}: {e}")
+            return None
+
+    # Ventana deslizante de tareas: se emiten en orden y se repone una por cada emitida
+    pending = iter(message_ids)
+    window = []
+    try:
+        for message_id in pending:
+            window.append((message_id, asyncio.create_task(fetch(message_id))))
+            if len(window) >= batch_size:
+                break
+        while window:
+            message_id, task = window.pop(0)
+            message = await task
+            next_id = next(pending, None)
+            if next_id is not None:
+                window.append((next_id, asyncio.create_task(fetch(next_id))))
+            yield message_id, message
+    finally:
+        for _, task in window:
+            task.cancel()
+
+
+async def _acquire_batch_quota(service, count):
+    # Un batch HTTP cuesta lo mismo que sus peticiones sueltas
+    await get_quota_scheduler().acquire(
+        "gmail.users.messages.get", quota_user(service._http), count=count
+    )
+
+
+def _get_messages_batch_http(service, unique_ids, batch_size, format):
+    """Versión bloqueante: una petición batch HTTP por cada `batch_size` mensajes."""
+    results = {}
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            print(f"Error obteniendo mensaje {request_id}: {exception}")
+            return
+        results[request_id] = response
+
+    for start in range(0, len(unique_ids), batch_size):
+        batch = service.new_batch_http_request(callback=callback)
+        for message_id in unique_ids[start:start + batch_size]:
+            batch.add(_get_request(service, message_id, format), request_id=message_id)
+        batch.execute(http=thread_http(service._http))
+
+    return [results[mid] for mid in unique_ids if mid in results]
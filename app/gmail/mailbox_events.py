@@ -0,0 +1,57 @@
+import asyncio
+import os
+
+from app.gmail.message_store import add_changes_listener
+
+# =========================
+# CONFIG
+# =========================
+# Eventos pendientes por cliente: si un cliente lento se queda atrás se descartan los más antiguos
+MAILBOX_EVENTS_QUEUE_SIZE = int(os.environ.get("MAILBOX_EVENTS_QUEUE_SIZE", "100"))
+
+
+class MailboxEventHub:
+    """
+    Reparte a los clientes conectados (SSE) los cambios que aplica
+    sync_message_store, vengan de una notificación push o del polling.
+    """
+
+    def __init__(self, queue_size=MAILBOX_EVENTS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, event):
+        self.published += 1
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(event)
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+_hub = None
+
+
+def get_mailbox_events():
+    global _hub
+    if _hub is None:
+        _hub = MailboxEventHub()
+        add_changes_listener(_hub.publish)
+    return _hub
@@ -0,0 +1,673 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+
+from googleapiclient.errors import HttpError
+
+from app.auth.async_http import execute_async
+from app.gmail.gmail_label_service import get_label_index
+from app.gmail.gmail_service import (
+    METADATA_HEADERS,
+    get_messages_batch,
+    iter_messages_batch,
+    list_message_page,
+    get_message_body,
+    extract_email_metadata,
+)
+from app.observability.metrics import record_cache
+
+# =========================
+# CONFIG
+# =========================
+MESSAGE_STORE_PATH = os.environ.get("MESSAGE_STORE_PATH", "app/gmail/message_store.sqlite3")
+
+# Labels "virtuales" que get_last_messages resuelve con una query
+QUERY_LABELS = {
+    "SENT": "SENT",
+    "DRAFT": "DRAFT",
+    "TRASH": "TRASH",
+    "ALL_MAIL": None,  # Todos los mensajes guardados
+}
+
+# Al cambiar el esquema se sube la versión y el almacén se reconstruye desde Gmail
+SCHEMA_VERSION = 5
+
+STORE_TABLES = (
+    "messages", "message_labels", "synced_labels", "first_page_tokens", "state", "message_analyses",
+    "thread_summaries",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT,
+    internal_date INTEGER,
+    sender TEXT,
+    subject TEXT,
+    date TEXT,
+    snippet TEXT,
+    body TEXT  -- NULL: aún no descargado (solo metadatos)
+);
+CREATE TABLE IF NOT EXISTS message_labels (
+    message_id TEXT NOT NULL,
+    label_id TEXT NOT NULL,
+    PRIMARY KEY (message_id, label_id)
+);
+CREATE INDEX IF NOT EXISTS idx_message_labels_label ON message_labels (label_id);
+CREATE TABLE IF NOT EXISTS synced_labels (
+    label TEXT PRIMARY KEY,
+    depth INTEGER NOT NULL
+);
+-- Primera página de cada (label, tamaño de página) tal como la devolvió Gmail:
+-- ids en su orden y nextPageToken, que continúa justo después del último
+CREATE TABLE IF NOT EXISTS first_page_tokens (
+    label TEXT NOT NULL,
+    page_size INTEGER NOT NULL,
+    message_ids TEXT NOT NULL,
+    next_token TEXT,
+    PRIMARY KEY (label, page_size)
+);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+-- Resumen de hilo (threads.get format=metadata) válido hasta que el historial lo toque
+CREATE TABLE IF NOT EXISTS thread_summaries (
+    thread_id TEXT PRIMARY KEY,
+    history_id TEXT,
+    summary TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS message_analyses (
+    message_id TEXT PRIMARY KEY,
+    analysis TEXT NOT NULL
+);
+"""
+
+
+class MessageStore:
+    """
+    Almacén local (SQLite) de mensajes ya parseados: metadatos, body y labelIds.
+    Se mantiene al día con users.history.list (ver sync_message_store).
+    """
+
+    def __init__(self, path=MESSAGE_STORE_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            for table in STORE_TABLES:
+                self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.executescript(SCHEMA)
+        # lock: acceso a SQLite; sync_lock: una sola sincronización con Gmail a la vez
+        self.lock = threading.RLock()
+        self.sync_lock = asyncio.Lock()
+
+    # ----- estado -----
+    def get_state(self, key):
+        with self.lock:
+            row = self._conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_state(self, key, value):
+        with self.lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def get_history_id(self):
+        return self.get_state("history_id")
+
+    def set_history_id(self, history_id):
+        self.set_state("history_id", str(history_id))
+
+    def clear(self, keep_analyses=False):
+        """keep_analyses=True conserva los análisis precalculados (resync de la misma cuenta)."""
+        with self.lock, self._conn:
+            for table in STORE_TABLES:
+                if keep_analyses and table == "message_analyses":
+                    continue
+                self._conn.execute(f"DELETE FROM {table}")
+
+    # ----- labels sincronizadas -----
+    def synced_depth(self, label):
+        with self.lock:
+            row = self._conn.execute(
+                "SELECT depth FROM synced_labels WHERE label = ?", (label,)
+            ).fetchone()
+        return row["depth"] if row else 0
+
+    def mark_label_synced(self, label, depth):
+        with self.lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO synced_labels (label, depth) VALUES (?, ?)", (label, depth)
+            )
+
+    def get_first_page(self, label, page_size):
+        """
+        Primera página guardada: (ids, nextPageToken o "" si no hay más páginas),
+        o None si no se conoce.
+        """
+        with self.lock:
+            row = self._conn.execute(
+                "SELECT message_ids, next_token FROM first_page_tokens "
+                "WHERE label = ? AND page_size = ?",
+                (label, page_size),
+            ).fetchone()
+        return (json.loads(row["message_ids"]), row["next_token"]) if row else None
+
+    def set_first_page(self, label, page_size, message_ids, next_token):
+        with self.lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO first_page_tokens (label, page_size, message_ids, next_token) "
+                "VALUES (?, ?, ?, ?)",
+                (label, page_size, json.dumps(message_ids), next_token or ""),
+            )
+
+    def invalidate_labels(self, label_ids, all_mail=False):
+        """
+        Olvida la primera página guardada (profundidad y nextPageToken) de las
+        labels cuyo contenido ha cambiado: el token de Gmail ya no empieza donde
+        acaba la página del almacén. La siguiente petición la vuelve a pedir.
+        all_mail=True también para ALL_MAIL (mensajes nuevos o borrados).
+        """
+        with self.lock, self._conn:
+            self._invalidate_labels(label_ids, all_mail)
+
+    def _invalidate_labels(self, label_ids, all_mail=False):
+        label_ids = set(label_ids)
+        labels = {
+            row["label"] for row in self._conn.execute(
+                "SELECT label FROM synced_labels UNION SELECT label FROM first_page_tokens"
+            )
+        }
+        stale = [
+            (label,) for label in labels
+            if QUERY_LABELS.get(label, label) in label_ids
+            or (all_mail and QUERY_LABELS.get(label, label) is None)
+        ]
+        self._conn.executemany("DELETE FROM synced_labels WHERE label = ?", stale)
+        self._conn.executemany("DELETE FROM first_page_tokens WHERE label = ?", stale)
+
+    # ----- mensajes -----
+    def save_message(self, message, with_body=True):
+        """
+        Parsea un mensaje de Gmail y lo guarda.
+        with_body=False para mensajes pedidos con format="metadata": se conserva
+        el body que ya hubiera guardado.
+        """
+        meta = extract_email_metadata(message)
+        with self.lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO messages "
+                "(id, thread_id, internal_date, sender, subject, date, snippet, body) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET "
+                "thread_id = excluded.thread_id, internal_date = excluded.internal_date, "
+                "sender = excluded.sender, subject = excluded.subject, date = excluded.date, "
+                "snippet = excluded.snippet, body = COALESCE(excluded.body, messages.body)",
+                (
+                    message["id"],
+                    message.get("threadId"),
+                    int(message.get("internalDate", 0)),
+                    meta["from"],
+                    meta["subject"],
+                    meta["date"],
+                    message.get("snippet", ""),
+                    get_message_body(message) if with_body else None,
+                ),
+            )
+            self._set_labels(message["id"], message.get("labelIds", []))
+
+    def _set_labels(self, message_id, label_ids):
+        self._conn.execute("DELETE FROM message_labels WHERE message_id = ?", (message_id,))
+        self._conn.executemany(
+            "INSERT INTO message_labels (message_id, label_id) VALUES (?, ?)",
+            [(message_id, label_id) for label_id in label_ids],
+        )
+
+    def has_message(self, message_id):
+        with self.lock:
+            row = self._conn.execute("SELECT 1 FROM messages WHERE id = ?", (message_id,)).fetchone()
+        return row is not None
+
+    def has_body(self, message_id):
+        with self.lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM messages WHERE id = ? AND body IS NOT NULL", (message_id,)
+            ).fetchone()
+        return row is not None
+
+    def get_message(self, message_id):
+        with self.lock:
+            row = self._conn.execute("SELECT * FROM messages WHERE id = ?", (message_id,)).fetchone()
+            if row is None:
+                return None
+            return self._row_to_message(row)
+
+    def list_by_label(self, label, limit=20):
+        label_id = QUERY_LABELS.get(label, label)
+        with self.lock:
+            if label_id is None:
+                rows = self._conn.execute(
+                    "SELECT * FROM messages ORDER BY internal_date DESC, id DESC LIMIT ?", (limit,)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT m.* FROM messages m "
+                    "JOIN message_labels l ON l.message_id = m.id "
+                    "WHERE l.label_id = ? ORDER BY m.internal_date DESC, m.id DESC LIMIT ?",
+                    (label_id, limit),
+                ).fetchall()
+            return [self._row_to_message(row) for row in rows]
+
+    def modify_labels(self, message_id, add=(), remove=()):
+        with self.lock, self._conn:
+            self._invalidate_thread_of(message_id)
+            self._invalidate_labels([*add, *remove])
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO message_labels (message_id, label_id) VALUES (?, ?)",
+                [(message_id, label_id) for label_id in add],
+            )
+            self._conn.executemany(
+                "DELETE FROM message_labels WHERE message_id = ? AND label_id = ?",
+                [(message_id, label_id) for label_id in remove],
+            )
+
+    def delete_message(self, message_id):
+        with self.lock, self._conn:
+            self._invalidate_thread_of(message_id)
+            label_ids = [
+                row["label_id"] for row in self._conn.execute(
+                    "SELECT label_id FROM message_labels WHERE message_id = ?", (message_id,)
+                )
+            ]
+            self._invalidate_labels(label_ids, all_mail=True)
+            self._conn.execute("DELETE FROM messages WHERE id = ?", (message_id,))
+            self._conn.execute("DELETE FROM message_labels WHERE message_id = ?", (message_id,))
+            self._conn.execute("DELETE FROM message_analyses WHERE message_id = ?", (message_id,))
+
+    # ----- hilos -----
+    def get_thread_summary(self, thread_id):
+        with self.lock:
+            row = self._conn.execute(
+                "SELECT summary FROM thread_summaries WHERE thread_id = ?", (thread_id,)
+            ).fetchone()
+        return json.loads(row["summary"]) if row else None
+
+    def save_thread_summary(self, thread_id, history_id, summary):
+        with self.lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO thread_summaries (thread_id, history_id, summary) "
+                "VALUES (?, ?, ?)",
+                (thread_id, history_id, json.dumps(summary)),
+            )
+
+    def invalidate_threads(self, thread_ids):
+        with self.lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM thread_summaries WHERE thread_id = ?",
+                [(thread_id,) for thread_id in thread_ids],
+            )
+
+    def _invalidate_thread_of(self, message_id):
+        self._conn.execute(
+            "DELETE FROM thread_summaries WHERE thread_id = "
+            "(SELECT thread_id FROM messages WHERE id = ?)",
+            (message_id,),
+        )
+
+    # ----- análisis precalculados (ver app/ai/analysis_worker.py) -----
+    def save_analysis(self, message_id, analysis):
+        with self.lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO message_analyses (message_id, analysis) VALUES (?, ?)",
+                (message_id, json.dumps(analysis)),
+            )
+
+    def analysed_message_ids(self):
+        with self.lock:
+            return [row["message_id"] for row in self._conn.execute("SELECT message_id FROM message_analyses")]
+
+    def retain_analyses(self, message_ids):
+        """Borra los análisis de los mensajes que no están en `message_ids`."""
+        keep = set(message_ids)
+        with self.lock, self._conn:
+            stale = [(mid,) for mid in self.analysed_message_ids() if mid not in keep]
+            self._conn.executemany("DELETE FROM message_analyses WHERE message_id = ?", stale)
+
+    def get_analysis(self, message_id):
+        with self.lock:
+            row = self._conn.execute(
+                "SELECT analysis FROM message_analyses WHERE message_id = ?", (message_id,)
+            ).fetchone()
+        return json.loads(row["analysis"]) if row else None
+
+    def _row_to_message(self, row):
+        label_ids = [
+            r["label_id"]
+            for r in self._conn.execute(
+                "SELECT label_id FROM message_labels WHERE message_id = ?", (row["id"],)
+            )
+        ]
+        return {
+            "id": row["id"],
+            "threadId": row["thread_id"],
+            "internalDate": row["internal_date"],
+            "from": row["sender"],
+            "subject": row["subject"],
+            "date": row["date"],
+            "snippet": row["snippet"],
+            "body": row["body"],
+            "labelIds": label_ids,
+        }
+
+
+_store = None
+
+# Callbacks a los que sync_message_store pasa los mensajes nuevos del historial
+_new_message_listeners = []
+# Callbacks a los que se pasa el resumen de cada sincronización con cambios
+# ({"historyId", "added", "deleted", "updated", "resync"})
+_change_listeners = []
+
+
+def add_new_messages_listener(callback):
+    _new_message_listeners.append(callback)
+
+
+def remove_new_messages_listener(callback):
+    if callback in _new_message_listeners:
+        _new_message_listeners.remove(callback)
+
+
+def add_changes_listener(callback):
+    _change_listeners.append(callback)
+
+
+def _notify_changes(changes):
+    for callback in _change_listeners:
+        callback(changes)
+
+
+def get_message_store():
+    global _store
+    if _store is None:
+        _store = MessageStore()
+    return _store
+
+
+# =========================
+# SYNC
+# =========================
+async def full_resync(service, store):
+    """
+    Vacía el almacén y guarda el historyId actual como punto de partida.
+    Las labels se vuelven a rellenar bajo demanda (ver list_messages).
+    Los análisis precalculados se conservan para los mensajes que siguen
+    existiendo en Gmail (comprobado con messages.get format="minimal"):
+    el historial caducado no dice cuáles se borraron mientras tanto.
+    """
+    profile = await execute_async(service.users().getProfile(userId="me"))
+    analysed = store.analysed_message_ids()
+    existing = await get_messages_batch(service, analysed, format="minimal") if analysed else []
+    with store.lock:
+        store.clear(keep_analyses=True)
+        store.retain_analyses(message["id"] for message in existing)
+        store.set_history_id(profile["historyId"])
+        store.set_state("email", profile.get("emailAddress"))
+
+
+async def sync_message_store(service, store):
+    """
+    Aplica los cambios de users.history.list desde el último historyId visto.
+    Solo hace resync completo si no hay historyId o Gmail ya lo ha expirado (404).
+    """
+    async with store.sync_lock:
+        start_history_id = store.get_history_id()
+        if start_history_id is None:
+            await full_resync(service, store)
+            _notify_changes(_resync_changes(store))
+            return
+
+        history = []
+        page_token = None
+        try:
+            while True:
+                params = {"userId": "me", "startHistoryId": start_history_id}
+                if page_token:
+                    params["pageToken"] = page_token
+                response = await execute_async(service.users().history().list(**params))
+                history.extend(response.get("history", []))
+                page_token = response.get("nextPageToken")
+                if not page_token:
+                    break
+        except HttpError as e:
+            if e.resp.status == 404:
+                await full_resync(service, store)
+                _notify_changes(_resync_changes(store))
+                return
+            raise
+
+        to_fetch = []
+        added = set()
+        deleted = set()
+        updated = set()
+        seen_label_ids = set()
+        touched_threads = set()
+        for record in history:
+            for item in record.get("messages", []):
+                touched_threads.add(item.get("threadId"))
+            for item in record.get("messagesAdded", []):
+                to_fetch.append(item["message"]["id"])
+                added.add(item["message"]["id"])
+                seen_label_ids.update(item["message"].get("labelIds", []))
+            for item in record.get("messagesDeleted", []):
+                deleted.add(item["message"]["id"])
+            for item in record.get("labelsAdded", []):
+                seen_label_ids.update(item.get("labelIds", []))
+                message_id = item["message"]["id"]
+                updated.add(message_id)
+                if store.has_message(message_id):
+                    store.modify_labels(message_id, add=item.get("labelIds", []))
+                else:
+                    to_fetch.append(message_id)
+            for item in record.get("labelsRemoved", []):
+                updated.add(item["message"]["id"])
+                store.modify_labels(item["message"]["id"], remove=item.get("labelIds", []))
+
+        for message_id in deleted:
+            store.delete_message(message_id)
+
+        # Cualquier cambio en un hilo invalida su resumen cacheado
+        store.invalidate_threads(touched_threads - {None})
+
+        # Una label desconocida en el historial: se creó fuera de esta sesión
+        label_index = get_label_index()
+        if label_index.loaded and any(not label_index.has_id(lid) for lid in seen_label_ids):
+            label_index.invalidate()
+
+        # Mensajes nuevos (o que entran en una label sin estar guardados): cambia la
+        # primera página de sus labels; labelsAdded/Removed ya lo hace modify_labels
+        if to_fetch:
+            store.invalidate_labels(seen_label_ids, all_mail=bool(added))
+
+        to_fetch = [mid for mid in to_fetch if mid not in deleted]
+        new_messages = []
+        # Solo metadatos: el body se descarga al abrir/analizar el mensaje
+        for message in await get_messages_batch(service, to_fetch, format="metadata"):
+            store.save_message(message, with_body=False)
+            if message["id"] in added:
+                new_messages.append(message)
+
+        history_id = response.get("historyId", start_history_id)
+        store.set_history_id(history_id)
+
+    if new_messages:
+        for callback in _new_message_listeners:
+            callback(new_messages)
+    if added or deleted or updated:
+        _notify_changes({
+            "historyId": str(history_id),
+            "added": sorted(added - deleted),
+            "deleted": sorted(deleted),
+            "updated": sorted(updated - added - deleted),
+            "resync": False,
+        })
+
+
+def _resync_changes(store):
+    return {
+        "historyId": store.get_history_id(),
+        "added": [],
+        "deleted": [],
+        "updated": [],
+        "resync": True,
+    }
+
+
+async def list_messages(service, store, label="INBOX", limit=20, with_body=False):
+    """
+    Devuelve los últimos mensajes de una label desde el almacén local.
+    La primera vez que se pide una label (o más profundidad) se rellena desde Gmail
+    solo con metadatos; los bodies se descargan si with_body=True.
+    """
+    messages, _ = await list_messages_page(service, store, label, limit, with_body=with_body)
+    return messages
+
+
+async def list_messages_page(service, store, label="INBOX", page_size=20, cursor=None, with_body=False):
+    """Una página completa: (mensajes, siguiente cursor o None)."""
+    async with store.sync_lock:
+        message_ids, next_cursor = await open_message_page(service, store, label, page_size, cursor)
+        messages = [m async for m in iter_page_messages(service, store, message_ids, with_body)]
+        if cursor is None:
+            store.mark_label_synced(label, page_size)
+    return messages, next_cursor
+
+
+async def open_message_page(service, store, label="INBOX", page_size=20, cursor=None):
+    """
+    Resuelve qué mensajes forman una página: (ids, siguiente cursor o None).
+    El cursor es el pageToken de Gmail. La primera página sale del almacén
+    si la label ya está sincronizada a esa profundidad (sin llamadas a Gmail):
+    son los ids que devolvió Gmail en su orden, así que el cursor guardado
+    continúa exactamente donde acaba (sin huecos ni repetidos).
+    """
+    if cursor is None and store.synced_depth(label) >= page_size:
+        first_page = store.get_first_page(label, page_size)
+        if first_page is not None:
+            record_cache("first_page", hits=1)
+            ids, next_token = first_page
+            return ids, next_token or None
+    if cursor is None:
+        record_cache("first_page", misses=1)
+
+    refs, next_cursor = await list_message_page(
+        service, label_id=label, page_size=page_size, page_token=cursor
+    )
+    ids = [ref["id"] for ref in refs]
+    if cursor is None:
+        store.set_first_page(label, page_size, ids, next_cursor)
+    return ids, next_cursor
+
+
+async def iter_page_messages(service, store, message_ids, with_body=False):
+    """
+    Genera los mensajes de una página en orden, descargando de Gmail solo los
+    que falten en el almacén (format="metadata", o "full" si with_body=True).
+    """
+    if with_body:
+        missing = [mid for mid in message_ids if not store.has_body(mid)]
+    else:
+        missing = [mid for mid in message_ids if not store.has_message(mid)]
+    record_cache("messages", hits=len(message_ids) - len(missing), misses=len(missing))
+    fetched = iter_messages_batch(service, missing, format="full" if with_body else "metadata")
+    missing = set(missing)
+
+    try:
+        for message_id in message_ids:
+            if message_id in missing:
+                _, message = await fetched.__anext__()
+                if message is None:
+                    continue
+                store.save_message(message, with_body=with_body)
+            message = store.get_message(message_id)
+            if message is not None:
+                yield message
+    finally:
+        # Cliente desconectado a mitad de stream: se cancelan las descargas en vuelo
+        await fetched.aclose()
+
+
+async def load_bodies(service, store, message_ids):
+    """Descarga (format="full") los mensajes que falten o no tengan body."""
+    missing = [mid for mid in message_ids if not store.has_body(mid)]
+    record_cache("message_bodies", hits=len(message_ids) - len(missing), misses=len(missing))
+    for full_msg in await get_messages_batch(service, missing):
+        store.save_message(full_msg)
+
+
+async def get_stored_message(service, store, message_id):
+    """Devuelve un mensaje del almacén, descargando el body solo si no está."""
+    await load_bodies(service, store, [message_id])
+    return store.get_message(message_id)
+
+
+async def get_stored_messages(service, store, message_ids):
+    """Como get_stored_message, pero descarga todos los que falten de una vez."""
+    await load_bodies(service, store, message_ids)
+    messages = (store.get_message(mid) for mid in message_ids)
+    return [msg for msg in messages if msg is not None]
+
+
+# =========================
+# HILOS
+# =========================
+async def get_thread_summary(service, store, thread_id):
+    """
+    Resumen compacto de un hilo: una sola llamada threads.get (format="metadata")
+    y después cache en el almacén hasta que el historial (o una acción propia)
+    toque el hilo. Antes de usar el cacheado se aplican los cambios del
+    historial (un history.list): una respuesta llegada desde el último
+    polling lo invalida.
+    """
+    summary = store.get_thread_summary(thread_id)
+    if summary is not None:
+        await sync_message_store(service, store)
+        summary = store.get_thread_summary(thread_id)
+    if summary is not None:
+        record_cache("thread_summary", hits=1)
+        return summary
+    record_cache("thread_summary", misses=1)
+
+    thread = await execute_async(service.users().threads().get(
+        userId="me",
+        id=thread_id,
+        format="metadata",
+        metadataHeaders=METADATA_HEADERS,
+    ))
+
+    messages = []
+    for message in thread.get("messages", []):
+        store.save_message(message, with_body=False)
+        meta = extract_email_metadata(message)
+        messages.append({
+            "id": message["id"],
+            "from": meta["from"],
+            "date": meta["date"],
+            "snippet": message.get("snippet", ""),
+            "labelIds": message.get("labelIds", []),
+        })
+
+    summary = {
+        "threadId": thread_id,
+        "historyId": thread.get("historyId"),
+        "messageCount": len(messages),
+        "messages": messages,
+    }
+    store.save_thread_summary(thread_id, summary["historyId"], summary)
+    return summary
@@ -1,12 +1,18 @@
-from fastapi import FastAPI, Request, HTTPException # <--- AÑADIDO HTTPException
-from fastapi.responses import RedirectResponse
+from fastapi import FastAPI, Request, HTTPException, Query, Header # <--- AÑADIDO HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse, Response, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Optional
+from contextlib import asynccontextmanager
+import asyncio
+import hmac
+import json
 import os
 from app.auth.google_auth import get_credentials, OAuthRedirect
 from dotenv import load_dotenv
-import base64
 
 load_dotenv()
 
@@ -20,10 +26,13 @@ FRONTEND_URL = os.environ.get("FRONTEND_URL", "http://localhost:5173")
 # =========================
 # AUTH / GOOGLE
 # =========================
+from app.auth.async_http import execute_async, close_async_http_client
+from app.auth.quota import get_quota_scheduler
 from app.auth.google_auth import (
     get_gmail_service,
     get_credentials,
     is_logged_in,
+    invalidate_credentials,
     TOKEN_PATH,
     exchange_code_for_token
 )
@@ -31,38 +40,114 @@ from app.auth.google_auth import (
 # =========================
 # GMAIL
 # =========================
-from app.gmail.gmail_service import (
-    get_last_messages,
-    get_message,
-    get_message_body,
-    extract_email_metadata,
-)
 from app.gmail.gmail_send_service import send_email_reply
+from app.gmail.gmail_push_service import (
+    GMAIL_PUSH_FALLBACK_POLL_SECONDS,
+    GMAIL_PUSH_VERIFICATION_TOKEN,
+    PUSH_ENABLED,
+    InvalidPushMessage,
+    decode_push_message,
+    get_push_ingestor,
+    renew_watch_periodically,
+    start_watch,
+    stop_watch,
+)
+from app.gmail.mailbox_events import get_mailbox_events
+from app.gmail.message_store import (
+    get_message_store,
+    sync_message_store,
+    get_thread_summary,
+    list_messages_page,
+    open_message_page,
+    iter_page_messages,
+    get_stored_message,
+    get_stored_messages,
+)
 from app.gmail.gmail_label_service import (
     archive_and_label_message,
     get_labels, 
     trash_message,
-    add_label_to_message
+    add_label_to_message,
+    get_label_index,
+    apply_bulk_operations,
 )
 
 # =========================
 # IA
 # =========================
-from app.ai.email_analysis_service import analyze_email_structured
+from app.ai.email_analysis_service import (
+    analyze_email_structured,
+    analyze_email_stream,
+    analyze_emails_batch,
+)
+from app.ai.analysis_cache import get_analysis_cache
+from app.ai.body_preprocessing import get_preprocessing_stats
+from app.ai.llm_resilience import get_llm_guard
+from app.ai.analysis_worker import (
+    get_analysis_worker,
+    get_analysis_worker_status,
+    poll_gmail_history,
+    ANALYSIS_WORKER_ENABLED,
+    GMAIL_POLL_INTERVAL_SECONDS,
+)
 
 # =========================
 # CALENDAR
 # =========================
 
-from app.calendar.calendar_service import create_meeting, MeetingConflictError 
+from app.calendar.calendar_service import (
+    create_meeting,
+    create_meetings_batch,
+    get_calendar_service,
+    MeetingConflictError,
+)
+from app.calendar.busy_cache import clear_busy_caches
+from app.calendar.slot_finder import suggest_slots
+
+# =========================
+# MÉTRICAS
+# =========================
+from app.observability.metrics import MetricsMiddleware, get_metrics_registry, stage
+from app.observability.profiling import (
+    ProfilingMiddleware,
+    check_admin_token,
+    get_profile_store,
+    profiling_enabled,
+)
 
 # =========================
 # FASTAPI SETUP
 # =========================
-app = FastAPI(title="Gmail AI Agent")
+_background_tasks = []
 
-# Forzar login en cada arranque 
-if os.path.exists(TOKEN_PATH):
+
+@asynccontextmanager
+async def lifespan(app):
+    # Pre-análisis en segundo plano del correo nuevo que llega por el historial
+    if ANALYSIS_WORKER_ENABLED:
+        get_analysis_worker().start()
+    # El historial alimenta /gmail/events aunque no haya worker: sin push es la
+    # única fuente de cambios; con push el polling es solo de respaldo
+    interval = GMAIL_PUSH_FALLBACK_POLL_SECONDS if PUSH_ENABLED else GMAIL_POLL_INTERVAL_SECONDS
+    _background_tasks.append(asyncio.create_task(poll_gmail_history(interval)))
+    if PUSH_ENABLED:
+        _background_tasks.append(asyncio.create_task(renew_watch_periodically()))
+    try:
+        yield
+    finally:
+        for task in _background_tasks:
+            task.cancel()
+        _background_tasks.clear()
+        if ANALYSIS_WORKER_ENABLED:
+            await get_analysis_worker().stop()
+        await close_async_http_client()
+
+
+app = FastAPI(title="Gmail AI Agent", lifespan=lifespan)
+
+# Las credenciales válidas (o renovables) sobreviven a los reinicios.
+# FORCE_LOGIN_ON_STARTUP=1 recupera el comportamiento anterior (login en cada arranque)
+if os.environ.get("FORCE_LOGIN_ON_STARTUP", "0") == "1" and os.path.exists(TOKEN_PATH):
     try:
         os.remove(TOKEN_PATH)
     except:
@@ -84,8 +169,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Paginación de /emails
 )
 
+# Por fuera de CORS: latencia por ruta y Server-Timing también en esas respuestas
+app.add_middleware(MetricsMiddleware)
+# Perfil por muestreo de las peticiones con ?profile=1 / X-Profile: 1 (solo admin)
+app.add_middleware(ProfilingMiddleware)
+
+
+# =========================
+# CREDENCIALES EN RUTAS ASYNC
+# =========================
+# Con el token caducado get_credentials lo renueva contra Google y escribe
+# token.json: en el event loop bloquearía todas las peticiones en curso
+async def _google_credentials():
+    return await run_in_threadpool(get_credentials)
+
+
+async def _gmail_service():
+    return await run_in_threadpool(get_gmail_service)
+
 
 # =========================
 # MODELOS
@@ -110,14 +214,31 @@ class MeetingRequest(BaseModel):
     duration_minutes: int = 60
     attendees: list[str] = []
     
+class MeetingBatchRequest(BaseModel):
+    meetings: list[MeetingRequest]
+
 class LabelRequest(BaseModel):
     label_name: str
 
+
+class AnalyzeBatchRequest(BaseModel):
+    message_ids: list[str]
+
+
+class BulkOperation(BaseModel):
+    action: str  # archive | archive_label | label | mark_read | mark_unread | trash
+    message_ids: list[str]
+    label_name: Optional[str] = None
+
+
+class BulkRequest(BaseModel):
+    operations: list[BulkOperation]
+
 # =========================
 # BASIC ROUTES
 # =========================
 @app.get("/")
-def root():
+async def root():
     return RedirectResponse(FRONTEND_URL)
 
 
@@ -135,87 +256,254 @@ def login():
 
 
 @app.get("/logout")
-def logout():
+async def logout():
     if os.path.exists(TOKEN_PATH):
         try:
             os.remove(TOKEN_PATH)
         except:
             pass
+    invalidate_credentials()
+    get_label_index().clear()
+    get_message_store().clear()
+    clear_busy_caches()
     # CAMBIO: Devolvemos un JSON simple en lugar de una redirección
     return {"status": "logged_out"}
 
 
 @app.get("/oauth2callback")
-def oauth2callback(request: Request):
-    exchange_code_for_token(str(request.url))
+async def oauth2callback(request: Request):
+    await run_in_threadpool(exchange_code_for_token, str(request.url))
+
+    # Las labels y la agenda cacheada se vuelven a cargar una vez en la nueva sesión
+    get_label_index().clear()
+    clear_busy_caches()
+
+    # Si entra otra cuenta, el almacén local ya no vale
+    store = get_message_store()
+    profile = await execute_async((await _gmail_service()).users().getProfile(userId="me"))
+    if store.get_state("email") not in (None, profile.get("emailAddress")):
+        store.clear()
+
     return RedirectResponse(FRONTEND_URL)
 
 
+# =========================
+# GMAIL PUSH (Pub/Sub)
+# =========================
+@app.post("/gmail/watch")
+async def gmail_watch():
+    """Registra (o renueva) la notificación push de Gmail en GMAIL_PUSH_TOPIC."""
+    if not PUSH_ENABLED:
+        raise HTTPException(status_code=400, detail="GMAIL_PUSH_TOPIC no configurado")
+    return await start_watch(await _gmail_service(), get_message_store())
+
+
+@app.delete("/gmail/watch")
+async def gmail_stop_watch():
+    await stop_watch(await _gmail_service(), get_message_store())
+    return {"status": "stopped"}
+
+
+@app.post("/gmail/push")
+async def gmail_push(request: Request, token: Optional[str] = None):
+    """
+    Webhook de la suscripción push de Pub/Sub. Responde 204 enseguida (ack)
+    y el delta del historial se aplica en segundo plano.
+    Solo existe con el push activado, y siempre exige el token de verificación.
+    """
+    if not PUSH_ENABLED:
+        raise HTTPException(status_code=404, detail="Push de Gmail desactivado")
+    if not hmac.compare_digest(token or "", GMAIL_PUSH_VERIFICATION_TOKEN):
+        raise HTTPException(status_code=403, detail="Token de verificación incorrecto")
+
+    try:
+        notification = decode_push_message(await request.json())
+    except (InvalidPushMessage, ValueError) as e:
+        # Ack igualmente: si no, Pub/Sub la reenviaría indefinidamente
+        print(f"⚠️ {e}")
+        return Response(status_code=204)
+
+    account = get_message_store().get_state("email")
+    if account and notification["emailAddress"].lower() != account.lower():
+        return Response(status_code=204)
+
+    get_push_ingestor().notify(notification)
+    return Response(status_code=204)
+
+
+@app.get("/gmail/push/stats")
+async def gmail_push_stats():
+    return {**get_push_ingestor().stats(), "events": get_mailbox_events().stats()}
+
+
+# Comentario SSE periódico para que proxies y navegador no cierren la conexión
+MAILBOX_EVENTS_HEARTBEAT_SECONDS = 15
+
+
+@app.get("/gmail/events")
+async def gmail_events():
+    """
+    Server-Sent Events con los cambios del buzón (push o polling):
+    - event: mailbox -> {"historyId", "added", "deleted", "updated", "resync"}
+    """
+    hub = get_mailbox_events()
+    queue = hub.subscribe()
+
+    async def events():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), MAILBOX_EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse_event("mailbox", event)
+        finally:
+            hub.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # =========================
 # GMAIL LABELS
 # =========================
 @app.get("/gmail/labels")
-def gmail_labels():
-    service = get_gmail_service()
-    return get_labels(service)
+async def gmail_labels():
+    service = await _gmail_service()
+    return await get_labels(service)
 
 # =========================
 # EMAILS (CON LABEL)
 # =========================
+# Campos que puede devolver /emails (ver parámetro fields)
+EMAIL_LIST_FIELDS = (
+    "id", "threadId", "from", "subject", "date", "snippet", "body", "unread", "labels", "analysis",
+)
+DEFAULT_EMAIL_LIST_FIELDS = ("id", "from", "subject", "date", "snippet", "unread", "labels", "analysis")
+
+
 @app.get("/emails")
-def read_emails(label: str = "INBOX"):
+async def read_emails(
+    request: Request,
+    label: str = "INBOX",
+    fields: Optional[str] = None,
+    page_size: int = Query(20, ge=1, le=500),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+):
     """
     label:
     - INBOX
     - SENT
     - DRAFT
     - o cualquier labelId de Gmail
+
+    fields: proyección opcional separada por comas (p. ej. "id,subject,body").
+    Por defecto no se incluye el body: el listado se construye solo con
+    metadatos (format="metadata") y el body se descarga al abrir el correo.
+
+    Paginación: la cabecera X-Next-Cursor trae el cursor de la página siguiente
+    (pageToken de Gmail); se pasa como ?cursor=... Sin cabecera no hay más páginas.
+
+    stream=true (o Accept: application/x-ndjson): NDJSON, un correo por línea
+    en cuanto se descarga y decodifica.
     """
-    service = get_gmail_service()
-    messages = get_last_messages(service, label_id=label)
+    if fields:
+        selected = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = set(selected) - set(EMAIL_LIST_FIELDS)
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Campos desconocidos: {', '.join(sorted(unknown))}",
+            )
+    else:
+        selected = DEFAULT_EMAIL_LIST_FIELDS
+    with_body = "body" in selected
+
+    service = await _gmail_service()
+    store = get_message_store()
+
+    # Solo se piden a Gmail los cambios desde el último historyId
+    with stage("sync"):
+        await sync_message_store(service, store)
+
+    headers = {}
+
+    if stream or "application/x-ndjson" in request.headers.get("accept", ""):
+        # Como list_messages_page: no resolver la página a mitad de una sincronización
+        async with store.sync_lock:
+            message_ids, next_cursor = await open_message_page(service, store, label, page_size, cursor)
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+
+        async def lines():
+            async for msg in iter_page_messages(service, store, message_ids, with_body):
+                yield json.dumps(_email_list_item(msg, selected, store), ensure_ascii=False) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
+
+    with stage("page"):
+        messages, next_cursor = await list_messages_page(
+            service, store, label=label, page_size=page_size, cursor=cursor, with_body=with_body
+        )
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    with stage("serialize"):
+        return JSONResponse([_email_list_item(msg, selected, store) for msg in messages], headers=headers)
 
-    emails = []
 
-    for msg in messages:
-        full_msg = get_message(service, msg["id"])
-        body = get_message_body(full_msg)
-        meta = extract_email_metadata(full_msg)
-
-        label_ids = full_msg.get("labelIds", [])
-        unread = "UNREAD" in label_ids
-
-        emails.append({
-            "id": msg["id"],
-            "from": meta["from"],
-            "subject": meta["subject"],
-            "snippet": full_msg.get("snippet"),
-            "body": body,
-            "unread": unread,
-            "labels": full_msg.get("labelIds", []),
-        })
+def _email_list_item(msg, selected, store):
+    label_ids = msg["labelIds"]
+    email = {
+        "id": msg["id"],
+        "threadId": msg["threadId"],
+        "from": msg["from"],
+        "subject": msg["subject"],
+        "date": msg["date"],
+        "snippet": msg["snippet"],
+        "unread": "UNREAD" in label_ids,
+        "labels": label_ids,
+    }
+    if "body" in selected:
+        email["body"] = msg["body"]
+    if "analysis" in selected:
+        # Análisis precalculado por el worker (None si aún no existe)
+        email["analysis"] = store.get_analysis(msg["id"])
+    return {key: email[key] for key in selected}
+
 
-    return emails
+async def _get_stored_message_or_404(service, message_id):
+    msg = await get_stored_message(service, get_message_store(), message_id)
+    if msg is None:
+        raise HTTPException(status_code=404, detail="Mensaje no encontrado")
+    return msg
 
 @app.get("/emails/{message_id}")
-def get_email_details(message_id: str):
+async def get_email_details(message_id: str):
     """
     Obtiene el cuerpo completo y comprueba si hay respuestas en el hilo.
+    El hilo se resume con un único threads.get de metadatos, cacheado hasta
+    que el historial de Gmail lo cambie.
     """
-    service = get_gmail_service()
+    service = await _gmail_service()
+    store = get_message_store()
     
-    # 1. Obtener mensaje original
-    msg = get_message(service, message_id)
-    body = get_message_body(msg)
-    meta = extract_email_metadata(msg)
+    # 1. Obtener mensaje original (almacén local)
+    msg = await _get_stored_message_or_404(service, message_id)
     
     # 2. Lógica de Thread (Buscar respuestas)
     last_reply = None
+    thread = None
     thread_id = msg.get("threadId")
     
     if thread_id:
         try:
-            thread = service.users().threads().get(userId="me", id=thread_id).execute()
-            messages = thread.get("messages", [])
+            thread = await get_thread_summary(service, store, thread_id)
+            messages = thread["messages"]
             
             # Buscar mensajes posteriores al actual que sean mios (SENT)
             for m in reversed(messages):
@@ -234,10 +522,11 @@ def get_email_details(message_id: str):
         "threadId": thread_id,
         "labelIds": msg.get("labelIds", []),
         "snippet": msg.get("snippet", ""),
-        "subject": meta["subject"],
-        "from": meta["from"],
-        "body": body,
-        "last_reply": last_reply # <--- Esto es lo que busca el frontend
+        "subject": msg["subject"],
+        "from": msg["from"],
+        "body": msg["body"],
+        "last_reply": last_reply, # <--- Esto es lo que busca el frontend
+        "thread": thread,
     }
 
 
@@ -246,11 +535,18 @@ def get_email_details(message_id: str):
 # ANALYZE EMAIL BY ID
 # =========================
 @app.post("/emails/{message_id}/analyze")
-def analyze_email_by_id(message_id: str):
-    service = get_gmail_service()
+async def analyze_email_by_id(message_id: str):
+    service = await _gmail_service()
+    store = get_message_store()
 
-    message = get_message(service, message_id)
-    body = get_message_body(message)
+    # Ya pre-analizado por el worker: respuesta inmediata
+    with stage("store"):
+        precomputed = store.get_analysis(message_id)
+        if precomputed is not None:
+            return precomputed
+
+        message = await _get_stored_message_or_404(service, message_id)
+    body = message["body"]
 
     if not body or body.strip() == "":
         return {
@@ -258,24 +554,194 @@ def analyze_email_by_id(message_id: str):
             "message": "No se pudo extraer el cuerpo del correo",
         }
 
-    return analyze_email_structured(body)
+    # Gemini sigue siendo bloqueante: se ejecuta fuera del event loop
+    analysis = await run_in_threadpool(analyze_email_structured, body)
+    if not analysis.get("error"):
+        store.save_analysis(message_id, analysis)
+    return analysis
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/emails/{message_id}/analyze/stream")
+async def analyze_email_by_id_stream(message_id: str):
+    """
+    Igual que /emails/{id}/analyze pero por Server-Sent Events:
+    - event: field  -> {"name": campo, "value": valor} en cuanto se completa
+    - event: done   -> análisis completo
+    - event: error  -> {"error": ...}
+    """
+    service = await _gmail_service()
+    store = get_message_store()
+
+    precomputed = store.get_analysis(message_id)
+    if precomputed is None:
+        message = await _get_stored_message_or_404(service, message_id)
+        body = message["body"]
+        if not body or body.strip() == "":
+            raise HTTPException(status_code=422, detail="EMPTY_EMAIL_BODY")
+
+    async def events():
+        if precomputed is not None:
+            for key, value in precomputed.items():
+                yield _sse_event("field", {"name": key, "value": value})
+            yield _sse_event("done", precomputed)
+            return
+
+        # El iterador de Gemini es bloqueante: se consume en el threadpool
+        async for kind, *payload in iterate_in_threadpool(analyze_email_stream(body)):
+            if kind == "field":
+                key, value = payload
+                yield _sse_event("field", {"name": key, "value": value})
+            elif kind == "done":
+                analysis = payload[0]
+                # El de respaldo (circuit breaker) o el de rescate llevan "error": no se guardan
+                if not analysis.get("error"):
+                    store.save_analysis(message_id, analysis)
+                yield _sse_event("done", analysis)
+            else:
+                yield _sse_event("error", {"error": payload[0]})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/emails/analyze-batch")
+async def analyze_emails_by_ids(data: AnalyzeBatchRequest):
+    """
+    Analiza varios correos empaquetándolos en pocas llamadas a Gemini.
+    Devuelve {message_id: análisis} (o el error EMPTY_EMAIL_BODY por correo).
+    """
+    service = await _gmail_service()
+    messages = await get_stored_messages(service, get_message_store(), data.message_ids)
+
+    results = {}
+    emails = []
+    for message in messages:
+        if not message["body"] or message["body"].strip() == "":
+            results[message["id"]] = {
+                "error": "EMPTY_EMAIL_BODY",
+                "message": "No se pudo extraer el cuerpo del correo",
+            }
+        else:
+            emails.append({"id": message["id"], "body": message["body"]})
+
+    results.update(await run_in_threadpool(analyze_emails_batch, emails))
+    return {"results": results}
+
+
+@app.get("/ai/cache/stats")
+async def analysis_cache_stats():
+    return get_analysis_cache().stats()
+
+
+@app.get("/google/quota/metrics")
+async def google_quota_metrics():
+    """Cuota consumida, rate limits, reintentos y espera en cola por prioridad."""
+    return get_quota_scheduler().metrics()
+
+
+@app.get("/ai/llm/metrics")
+async def llm_metrics():
+    """Estado del circuit breaker de Gemini, reintentos, timeouts e histogramas de latencia."""
+    return get_llm_guard().metrics()
+
+
+@app.get("/ai/preprocessing/stats")
+async def preprocessing_stats():
+    """Tokens de entrada estimados antes y después del preprocesado del body."""
+    return get_preprocessing_stats().stats()
+
+
+@app.get("/ai/worker/status")
+async def analysis_worker_status():
+    return {"enabled": ANALYSIS_WORKER_ENABLED, **get_analysis_worker_status()}
+
+
+def _subsystem_metrics():
+    """Estadísticas que ya llevan los subsistemas, en formato /metrics."""
+    quota = get_quota_scheduler().metrics()
+    guard = get_llm_guard()
+    worker = get_analysis_worker_status()
+    return [
+        ("google_quota_units_total", "counter", "Unidades de cuota de Google consumidas",
+         [({}, quota["units"])]),
+        ("google_rate_limited_total", "counter", "Respuestas 429/rateLimitExceeded de Google",
+         [({}, quota["rate_limited"])]),
+        ("llm_circuit_open", "gauge", "1 si el circuit breaker del modelo está abierto",
+         [({}, int(guard.breaker.state == "open"))]),
+        ("llm_retries_total", "counter", "Reintentos de llamadas al modelo", [({}, guard.retries)]),
+        ("llm_timeouts_total", "counter", "Llamadas al modelo que superaron el deadline", [({}, guard.timeouts)]),
+        ("analysis_worker_backlog", "gauge", "Correos pendientes de pre-análisis", [({}, worker["backlog"])]),
+        ("mailbox_event_subscribers", "gauge", "Clientes conectados a /gmail/events",
+         [({}, get_mailbox_events().stats()["subscribers"])]),
+    ]
+
+
+get_metrics_registry().add_collector(_subsystem_metrics)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Métricas en formato de texto de Prometheus (latencias, Google, modelo, caches)."""
+    return PlainTextResponse(
+        get_metrics_registry().render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+# =========================
+# PROFILING (ADMIN)
+# =========================
+def _require_admin(token):
+    if not profiling_enabled():
+        raise HTTPException(status_code=404, detail="Profiling desactivado (falta PROFILING_ADMIN_TOKEN)")
+    if not check_admin_token(token):
+        raise HTTPException(status_code=403, detail="X-Admin-Token incorrecto")
+
+
+@app.get("/admin/profiles")
+async def list_profiles(x_admin_token: Optional[str] = Header(None)):
+    """Últimos perfiles capturados (los más recientes primero)."""
+    _require_admin(x_admin_token)
+    return {"profiles": get_profile_store().list()}
+
+
+@app.get("/admin/profiles/{profile_id}")
+async def download_profile(profile_id: str, x_admin_token: Optional[str] = Header(None)):
+    """
+    Pilas en formato "collapsed" (una por línea con su número de muestras):
+    se abre con speedscope o flamegraph.pl.
+    """
+    _require_admin(x_admin_token)
+    collapsed = get_profile_store().get(profile_id)
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return PlainTextResponse(
+        collapsed,
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'},
+    )
 
 # =========================
 # REPLY EMAIL
 # =========================
 @app.post("/reply")
-def reply_to_email(data: ReplyRequest):
-    service = get_gmail_service()
-    original_message = get_message(service, data.message_id)
-    meta = extract_email_metadata(original_message)
+async def reply_to_email(data: ReplyRequest):
+    service = await _gmail_service()
+    meta = await _get_stored_message_or_404(service, data.message_id)
 
-    send_email_reply(
+    await send_email_reply(
         service=service,
         to_email=meta["from"],
         subject=f"Re: {meta['subject']}",
         body=data.reply_text,
         thread_id=meta["threadId"],
     )
+    # El hilo tiene un mensaje nuevo: el resumen cacheado ya no vale
+    get_message_store().invalidate_threads([meta["threadId"]])
 
     return {"status": "reply sent"}
 
@@ -283,31 +749,36 @@ def reply_to_email(data: ReplyRequest):
 # ARCHIVE / LABEL
 # =========================
 @app.post("/archive")
-def archive_email(data: ArchiveRequest):
-    service = get_gmail_service()
+async def archive_email(data: ArchiveRequest):
+    service = await _gmail_service()
 
-    archive_and_label_message(
+    label_id = await archive_and_label_message(
         service=service,
         message_id=data.message_id,
         label_name=data.label_name,
     )
+    get_message_store().modify_labels(data.message_id, add=[label_id], remove=["INBOX"])
 
     return {"status": "email archived and labeled"}
 
 # =========================
 # CALENDAR (ENDPOINT ACTUALIZADO)
 # =========================
-@app.post("/calendar/meeting")
-def create_calendar_meeting(data: MeetingRequest):
-    credentials = get_credentials()
-
+def _parse_meeting_start(value):
     try:
-        start_dt = datetime.fromisoformat(data.start_datetime.replace("Z", "+00:00"))
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
     except ValueError:
-        start_dt = datetime.fromisoformat(data.start_datetime)
+        return datetime.fromisoformat(value)
+
+
+@app.post("/calendar/meeting")
+async def create_calendar_meeting(data: MeetingRequest):
+    credentials = await _google_credentials()
+
+    start_dt = _parse_meeting_start(data.start_datetime)
 
     try:
-        link = create_meeting(
+        link = await create_meeting(
             credentials=credentials,
             title=data.title,
             start_datetime=start_dt,
@@ -330,32 +801,105 @@ def create_calendar_meeting(data: MeetingRequest):
         raise HTTPException(status_code=500, detail="Error interno creando el evento")
 
 
+@app.post("/calendar/meetings/batch")
+async def create_calendar_meetings_batch(data: MeetingBatchRequest):
+    """
+    Crea varias reuniones de una vez (p. ej. tras analizar en lote la bandeja).
+    Una consulta de disponibilidad para todo el lote, choques dentro del lote
+    incluidos, e inserciones por batch HTTP. Responde un resultado por reunión,
+    en el mismo orden: created (con calendar_link), conflict o error (con detail).
+    """
+    credentials = await _google_credentials()
+
+    results = [None] * len(data.meetings)
+    valid, meetings = [], []
+    for i, meeting in enumerate(data.meetings):
+        try:
+            start_dt = _parse_meeting_start(meeting.start_datetime)
+        except ValueError:
+            results[i] = {"status": "error", "detail": "start_datetime debe ser una fecha ISO 8601"}
+            continue
+        valid.append(i)
+        meetings.append({
+            "title": meeting.title,
+            "start_datetime": start_dt,
+            "duration_minutes": meeting.duration_minutes,
+            "attendees": meeting.attendees,
+        })
+
+    try:
+        created = await create_meetings_batch(credentials, meetings)
+    except Exception as e:
+        print(f"Error creando eventos en lote: {e}")
+        raise HTTPException(status_code=500, detail="Error interno creando los eventos")
+
+    for i, result in zip(valid, created):
+        results[i] = result
+    return {
+        "results": results,
+        "created": sum(r["status"] == "created" for r in results),
+        "conflicts": sum(r["status"] == "conflict" for r in results),
+    }
+
+@app.get("/calendar/suggest-slots")
+async def calendar_suggest_slots(
+    duration_minutes: int = Query(60, ge=5, le=480),
+    attendees: list[str] = Query([]),
+    start: Optional[str] = None,
+    days: int = Query(14, ge=1, le=60),
+    count: int = Query(5, ge=1, le=50),
+):
+    """
+    Huecos libres para una reunión (p. ej. cuando proposed_datetime choca):
+    agenda del usuario + asistentes en una sola freebusy.query, solo en
+    horario laboral de Madrid. attendees admite repetirse o ir separado por comas.
+    """
+    credentials = await _google_credentials()
+    start_dt = None
+    if start:
+        try:
+            start_dt = _parse_meeting_start(start)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="start debe ser una fecha ISO 8601")
+
+    emails = [email.strip() for value in attendees for email in value.split(",") if email.strip()]
+    return await suggest_slots(
+        get_calendar_service(credentials),
+        duration_minutes=duration_minutes,
+        attendees=emails,
+        start=start_dt,
+        days=days,
+        count=count,
+    )
+
+
 # =========================
 # USER / AUTH UTILS
 # =========================
 @app.get("/auth/status")
-def auth_status():
+async def auth_status():
     return {"logged_in": is_logged_in()}
 
 @app.post("/emails/{message_id}/mark-read")
-def mark_email_as_read(message_id: str):
-    service = get_gmail_service()
+async def mark_email_as_read(message_id: str):
+    service = await _gmail_service()
 
-    service.users().messages().modify(
+    await execute_async(service.users().messages().modify(
         userId="me",
         id=message_id,
         body={
             "removeLabelIds": ["UNREAD"]
         }
-    ).execute()
+    ))
+    get_message_store().modify_labels(message_id, remove=["UNREAD"])
 
     return {"status": "marked as read"}
 
 @app.get("/auth/user")
-def get_user_info():
-    service = get_gmail_service()
+async def get_user_info():
+    service = await _gmail_service()
 
-    profile = service.users().getProfile(userId="me").execute()
+    profile = await execute_async(service.users().getProfile(userId="me"))
 
     return {
         "email": profile.get("emailAddress")
@@ -363,30 +907,63 @@ def get_user_info():
 
 
 @app.post("/emails/{message_id}/trash")
-def trash_email_endpoint(message_id: str):
-    service = get_gmail_service()
-    trash_message(service, message_id)
+async def trash_email_endpoint(message_id: str):
+    service = await _gmail_service()
+    await trash_message(service, message_id)
+    get_message_store().modify_labels(message_id, add=["TRASH"], remove=["INBOX"])
     return {"status": "trashed"}
 
 
 @app.post("/emails/{message_id}/label")
-def add_label_to_email_json(message_id: str, data: LabelRequest):
-    service = get_gmail_service()
+async def add_label_to_email_json(message_id: str, data: LabelRequest):
+    service = await _gmail_service()
 
-    add_label_to_message(
+    label_id = await add_label_to_message(
         service=service,
         message_id=message_id,
         label_name=data.label_name,
     )
+    get_message_store().modify_labels(message_id, add=[label_id])
 
     return {"status": "label added"}
 
 
 @app.post("/emails/{message_id}/add-label")
-def add_label_to_email_query(message_id: str, label: str):
+async def add_label_to_email_query(message_id: str, label: str):
     try:
-        service = get_gmail_service()
-        add_label_to_message(service, message_id, label)
+        service = await _gmail_service()
+        label_id = await add_label_to_message(service, message_id, label)
+        get_message_store().modify_labels(message_id, add=[label_id])
         return {"status": "ok"}
     except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# =========================
+# BULK TRIAGE
+# =========================
+@app.post("/emails/bulk")
+async def bulk_triage(data: BulkRequest):
+    """
+    Aplica muchas operaciones de golpe: los ids con los mismos cambios de
+    labels se envían juntos en users.messages.batchModify (hasta 1000 por llamada).
+    """
+    service = await _gmail_service()
+
+    try:
+        results = await apply_bulk_operations(
+            service, [op.model_dump() for op in data.operations]
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    store = get_message_store()
+    for result in results:
+        if result["status"] == "ok":
+            store.modify_labels(
+                result["id"],
+                add=result["addLabelIds"],
+                remove=result["removeLabelIds"],
+            )
+
+    return {"results": results}
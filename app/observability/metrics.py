@@ -0,0 +1,303 @@
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# =========================
+# CONFIG
+# =========================
+# METRICS_ENABLED=0 deja el middleware en paso directo (sin histogramas ni Server-Timing)
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+# Cabecera Server-Timing con el desglose por etapas de cada respuesta
+METRICS_SERVER_TIMING = os.environ.get("METRICS_SERVER_TIMING", "1") == "1"
+# Límites (segundos) de los histogramas de latencia
+LATENCY_BUCKETS = tuple(
+    float(b) for b in os.environ.get(
+        "METRICS_LATENCY_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60"
+    ).split(",")
+)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# =========================
+# MÉTRICAS (formato de texto de Prometheus, sin dependencias)
+# =========================
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        for key, value in sorted(self.values().items()):
+            yield self.name + _labels_text(self.labelnames, key), value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # key -> [cuenta por bucket (no acumulada, + el de +Inf), suma, total]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series = {key: ([*counts], total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield self.name + "_bucket" + _labels_text(
+                    self.labelnames, key, [("le", _number(bound))]
+                ), cumulative
+            yield self.name + "_sum" + _labels_text(self.labelnames, key), total
+            yield self.name + "_count" + _labels_text(self.labelnames, key), count
+
+
+class MetricsRegistry:
+    """
+    Métricas propias (Counter, Histogram) y colectores: funciones que, al
+    pedir /metrics, leen estadísticas que ya llevan otros módulos y
+    devuelven [(nombre, tipo, ayuda, [(labels, valor)])].
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(f"{sample} {_number(value)}" for sample, value in metric.samples())
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"Error en colector de métricas: {e}")
+                continue
+            for name, metric_type, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels_text(labels.keys(), labels.values())} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry():
+    return _registry
+
+
+HTTP_REQUESTS = _registry.register(Counter(
+    "http_requests_total", "Peticiones HTTP atendidas", ("method", "route", "status")
+))
+HTTP_LATENCY = _registry.register(Histogram(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP por ruta", ("method", "route")
+))
+GOOGLE_LATENCY = _registry.register(Histogram(
+    "google_api_request_duration_seconds", "Latencia de las llamadas a APIs de Google por método",
+    ("method", "outcome"),
+))
+LLM_LATENCY = _registry.register(Histogram(
+    "llm_request_duration_seconds", "Latencia de las llamadas al modelo", ("backend", "outcome")
+))
+LLM_TOKENS = _registry.register(Counter(
+    "llm_tokens_total", "Tokens enviados (in) y generados (out) por el modelo", ("backend", "direction")
+))
+CACHE_REQUESTS = _registry.register(Counter(
+    "cache_requests_total", "Consultas a caches locales por resultado", ("cache", "result")
+))
+
+
+def _cache_hit_ratio():
+    totals = {}
+    for (cache, result), value in CACHE_REQUESTS.values().items():
+        hits, count = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (value if result == "hit" else 0), count + value)
+    return [(
+        "cache_hit_ratio", "gauge", "Aciertos / consultas de cada cache local",
+        [({"cache": cache}, hits / count) for cache, (hits, count) in sorted(totals.items()) if count],
+    )]
+
+
+_registry.add_collector(_cache_hit_ratio)
+
+
+def record_cache(cache, hits=0, misses=0):
+    if hits:
+        CACHE_REQUESTS.inc(hits, cache=cache, result="hit")
+    if misses:
+        CACHE_REQUESTS.inc(misses, cache=cache, result="miss")
+
+
+def record_llm_tokens(backend, tokens_in, tokens_out):
+    LLM_TOKENS.inc(tokens_in, backend=backend, direction="in")
+    LLM_TOKENS.inc(tokens_out, backend=backend, direction="out")
+
+
+# =========================
+# ETAPAS POR PETICIÓN (Server-Timing)
+# =========================
+_request_timing = contextvars.ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    """Tiempo acumulado y número de veces de cada etapa durante una petición."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            total, count = self.stages.get(name, (0.0, 0))
+            self.stages[name] = (total + seconds, count + 1)
+
+    def header(self):
+        with self._lock:
+            stages = dict(self.stages)
+        parts = [
+            f'{name};dur={total * 1000:.1f}' + (f';desc="{count}x"' if count > 1 else "")
+            for name, (total, count) in stages.items()
+        ]
+        parts.append(f"app;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def record_stage(name, seconds):
+    timing = _request_timing.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Suma lo que tarda el bloque a la etapa `name` de la petición en curso (si la hay)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+@contextlib.contextmanager
+def track_google_call(method_id):
+    """Histograma por método de Google + etapa "google" de la petición."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        GOOGLE_LATENCY.observe(elapsed, method=method_id or "unknown", outcome=outcome)
+        record_stage("google", elapsed)
+
+
+def observe_llm_call(backend, seconds, ok):
+    LLM_LATENCY.observe(seconds, backend=backend, outcome="ok" if ok else "error")
+    record_stage("llm", seconds)
+
+
+# =========================
+# MIDDLEWARE ASGI
+# =========================
+class MetricsMiddleware:
+    """
+    Latencia y status por plantilla de ruta (/emails/{message_id}, no el id
+    concreto) y cabecera Server-Timing con las etapas medidas hasta que se
+    envían las cabeceras. En respuestas en streaming la latencia cubre hasta
+    el último fragmento.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = _request_timing.set(timing)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if METRICS_SERVER_TIMING:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timing.header().encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timing.reset(token)
+            route = scope.get("route")
+            # Sin ruta (404) no se usa la URL: cada path distinto sería una serie nueva
+            route = getattr(route, "path", None) or "unmatched"
+            elapsed = time.perf_counter() - timing.started
+            HTTP_LATENCY.observe(elapsed, method=scope["method"], route=route)
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=str(status))
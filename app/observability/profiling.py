@@ -0,0 +1,247 @@
+import asyncio
+import hmac
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from functools import lru_cache
+
+from starlette.responses import JSONResponse
+
+# =========================
+# CONFIG
+# =========================
+# Token de administración: sin él el profiling está desactivado y el
+# middleware es un paso directo
+PROFILING_ADMIN_TOKEN = os.environ.get("PROFILING_ADMIN_TOKEN")
+# Periodo de muestreo (ms)
+PROFILING_INTERVAL_MS = float(os.environ.get("PROFILING_INTERVAL_MS", "5"))
+# Perfiles que se guardan (los más recientes)
+PROFILING_MAX_PROFILES = int(os.environ.get("PROFILING_MAX_PROFILES", "20"))
+# Tope de muestreo por petición (respuestas en streaming largas)
+PROFILING_MAX_SECONDS = float(os.environ.get("PROFILING_MAX_SECONDS", "60"))
+
+# Se activa por petición con ?profile=1 o la cabecera X-Profile: 1,
+# siempre junto a X-Admin-Token
+PROFILE_HEADER = b"x-profile"
+ADMIN_TOKEN_HEADER = b"x-admin-token"
+
+SAMPLER_THREAD_NAME = "request-profiler"
+
+
+def profiling_enabled():
+    return bool(PROFILING_ADMIN_TOKEN)
+
+
+def check_admin_token(token):
+    return profiling_enabled() and hmac.compare_digest(token or "", PROFILING_ADMIN_TOKEN)
+
+
+# =========================
+# PILAS (formato "collapsed" de flamegraph.pl / speedscope)
+# =========================
+_SITE_PACKAGES = f"{os.sep}site-packages{os.sep}"
+_CWD = os.getcwd() + os.sep
+
+
+@lru_cache(maxsize=4096)
+def _frame_label(code):
+    filename = code.co_filename
+    if _SITE_PACKAGES in filename:
+        filename = filename.split(_SITE_PACKAGES, 1)[1]
+    elif filename.startswith(_CWD):
+        filename = filename[len(_CWD):]
+    else:
+        filename = os.path.basename(filename)
+    # co_qualname solo existe desde Python 3.11
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({filename}:{code.co_firstlineno})"
+
+
+# Bucles de los pools de hilos esperando trabajo: sus muestras no aportan nada
+_IDLE_WAIT_FILES = ("threading.py", "queue.py")
+_IDLE_WORKER_LOOPS = (
+    ("_worker", f"concurrent{os.sep}futures{os.sep}thread.py"),
+    ("run", f"anyio{os.sep}_backends{os.sep}_asyncio.py"),  # WorkerThread.run
+)
+
+
+def _is_idle(codes):
+    """`codes` va de la hoja a la raíz."""
+    for code in codes:
+        if not code.co_filename.endswith(_IDLE_WAIT_FILES):
+            return any(
+                code.co_name == name and code.co_filename.endswith(path)
+                for name, path in _IDLE_WORKER_LOOPS
+            )
+    return False
+
+
+class StackSampler:
+    """
+    Hilo que cada `interval` segundos toma la pila de todos los hilos
+    (sys._current_frames) y cuenta las pilas iguales.
+
+    Las muestras del hilo del event loop se separan según qué corre en ese
+    momento: la tarea de la petición perfilada, otras tareas (peticiones
+    concurrentes, workers) o nada (el loop en select: esperando red o
+    timers). Los hilos del threadpool no se pueden atribuir a una petición
+    concreta y aparecen con su nombre.
+    """
+
+    def __init__(self, interval, max_seconds, loop=None, task=None):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.loop = loop
+        self.task = task
+        self.loop_thread = threading.get_ident() if loop else None
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=SAMPLER_THREAD_NAME, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            self._sample()
+
+    def _thread_label(self, ident, names):
+        if ident != self.loop_thread:
+            return names.get(ident, f"thread-{ident}")
+        current = asyncio.current_task(self.loop)
+        if current is None:
+            return "event-loop (esperando E/S)"
+        return "event-loop (esta petición)" if current is self.task else "event-loop (otras tareas)"
+
+    def _sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if names.get(ident) == SAMPLER_THREAD_NAME:
+                continue
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            if _is_idle(codes):
+                continue
+            stack = [self._thread_label(ident, names)]
+            stack.extend(_frame_label(code) for code in reversed(codes))
+            self.stacks[";".join(stack)] += 1
+        self.samples += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# =========================
+# ÚLTIMOS PERFILES
+# =========================
+class ProfileStore:
+    def __init__(self, max_profiles=PROFILING_MAX_PROFILES):
+        self._profiles = deque(maxlen=max_profiles)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def new_id(self):
+        return f"{int(time.time())}-{next(self._ids)}"
+
+    def add(self, info, collapsed):
+        with self._lock:
+            self._profiles.append((info, collapsed))
+
+    def list(self):
+        with self._lock:
+            return [info for info, _ in reversed(self._profiles)]
+
+    def get(self, profile_id):
+        with self._lock:
+            for info, collapsed in self._profiles:
+                if info["id"] == profile_id:
+                    return collapsed
+        return None
+
+
+_profile_store = ProfileStore()
+
+
+def get_profile_store():
+    return _profile_store
+
+
+# =========================
+# MIDDLEWARE ASGI
+# =========================
+def _wants_profile(scope):
+    if b"profile=1" in scope["query_string"].split(b"&"):
+        return True
+    return any(name == PROFILE_HEADER and value == b"1" for name, value in scope["headers"])
+
+
+class ProfilingMiddleware:
+    """
+    Perfil por muestreo de las peticiones que lo piden (?profile=1 o
+    X-Profile: 1) con X-Admin-Token válido. La respuesta lleva la cabecera
+    X-Profile-Id y el perfil se descarga de /admin/profiles/{id}. El resto
+    de peticiones solo pagan mirar la query y las cabeceras.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILING_ADMIN_TOKEN or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        token = dict(scope["headers"]).get(ADMIN_TOKEN_HEADER, b"").decode("latin-1")
+        if not check_admin_token(token):
+            response = JSONResponse({"detail": "Se necesita X-Admin-Token para perfilar"}, status_code=403)
+            await response(scope, receive, send)
+            return
+
+        store = get_profile_store()
+        profile_id = store.new_id()
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        sampler = StackSampler(
+            PROFILING_INTERVAL_MS / 1000, PROFILING_MAX_SECONDS,
+            loop=asyncio.get_running_loop(), task=asyncio.current_task(),
+        )
+        started_at = datetime.now().isoformat(timespec="seconds")
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            route = getattr(scope.get("route"), "path", None)
+            store.add({
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route,
+                "status": status,
+                "started_at": started_at,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                "samples": sampler.samples,
+                "interval_ms": PROFILING_INTERVAL_MS,
+            }, sampler.collapsed())
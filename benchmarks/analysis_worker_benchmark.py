@@ -0,0 +1,101 @@
+"""
+Worker de pre-análisis contra un Gemini falso.
+
+Encola N mensajes nuevos (ya en el almacén), los analiza con concurrencia y
+límite por minuto, con un porcentaje de fallos que fuerzan reintentos, y
+compara la latencia de "analizar" bajo demanda con leer el análisis precalculado.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.analysis_worker_benchmark --messages 40 --gemini-latency 0.3
+"""
+import argparse
+import asyncio
+import os
+import random
+import threading
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from app.ai.analysis_worker import AnalysisWorker  # noqa: E402
+from app.gmail.message_store import MessageStore  # noqa: E402
+from benchmarks.fake_gmail import fake_message  # noqa: E402
+
+
+class FakeGemini:
+    """analyze_email_structured falso: latencia fija y fallos aleatorios."""
+
+    def __init__(self, latency, failure_rate, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, email_text):
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.failure_rate
+        time.sleep(self.latency)
+        if fail:
+            return {"summary": "Error analizando correo", "error": "429 Resource exhausted"}
+        return {
+            "summary": email_text[:40],
+            "meeting_detected": False,
+            "proposed_datetime": None,
+            "duration_minutes": None,
+            "suggested_reply": "Recibido, gracias",
+            "suggested_label": None,
+            "is_important": False,
+        }
+
+
+async def run(args):
+    store = MessageStore(":memory:")
+    ids = [f"m{i}" for i in range(args.messages)]
+    for message_id in ids:
+        store.save_message(fake_message(message_id))
+
+    gemini = FakeGemini(args.gemini_latency, args.failure_rate)
+    worker = AnalysisWorker(
+        gemini, store=store, get_service=lambda: None,
+        concurrency=args.concurrency, per_minute=args.rpm,
+        max_attempts=3, backoff_seconds=0.1,
+    )
+    worker.start()
+
+    start = time.perf_counter()
+    worker.on_new_messages([fake_message(mid) for mid in ids])
+    # Duplicados: no deben generar llamadas extra
+    worker.on_new_messages([fake_message(mid) for mid in ids])
+    await worker.join()
+    elapsed = time.perf_counter() - start
+    await worker.stop()
+
+    status = worker.status()
+    print(f"{args.messages} mensajes, concurrencia {args.concurrency}, {args.rpm}/min, "
+          f"fallos {args.failure_rate:.0%}")
+    print(f"pre-análisis total : {elapsed:8.2f} s  ({gemini.calls} llamadas a Gemini)")
+    print(f"completados        : {status['completed']:8d}  reintentos {status['retries']}, "
+          f"fallidos {status['failed']}")
+
+    start = time.perf_counter()
+    for message_id in ids:
+        store.get_analysis(message_id)
+    precomputed = (time.perf_counter() - start) / len(ids)
+    print(f"analizar bajo demanda : {args.gemini_latency * 1000:8.1f} ms/correo")
+    print(f"analizar precalculado : {precomputed * 1000:8.3f} ms/correo")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--gemini-latency", type=float, default=0.3)
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
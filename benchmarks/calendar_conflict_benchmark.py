@@ -0,0 +1,149 @@
+"""
+Comprobación de conflictos de agenda: events.list por consulta vs cache local
+de bloques ocupados (app/calendar/busy_cache.py).
+
+Con un calendario sintético de `--events` eventos en `--days` días
+(benchmarks/fake_calendar.py, `--latency` por petición):
+- índice: consultas de solape en IntervalIndex frente a un recorrido lineal
+- antes: events.list con timeMin/timeMax por cada comprobación
+- después: freebusy.query con la cache fría, sincronización completa en segundo
+  plano, consultas locales y sincronización incremental con syncToken
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.calendar_conflict_benchmark --events 10000 --days 90 --checks 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+os.environ["GOOGLE_ASYNC_TRANSPORT"] = "0"
+
+from app.auth.async_http import execute_async  # noqa: E402
+from app.calendar.busy_cache import CalendarBusyCache, IntervalIndex  # noqa: E402
+from benchmarks.fake_calendar import FakeCalendarApi, _iso, build_fake_calendar_service  # noqa: E402
+
+
+async def legacy_check(service, start, end):
+    """check_availability anterior: una llamada a events.list por comprobación."""
+    result = await execute_async(service.events().list(
+        calendarId="primary", timeMin=_iso(start), timeMax=_iso(end),
+        singleEvents=True, orderBy="startTime",
+    ))
+    for event in result.get("items", []):
+        if event.get("transparency") != "transparent":
+            return event["summary"]
+    return None
+
+
+def random_slots(count, days, seed):
+    rng = random.Random(seed)
+    now = time.time()
+    slots = []
+    for _ in range(count):
+        start = now + rng.randrange(0, (days - 1) * 86400, 900)
+        slots.append((start, start + rng.choice((30, 60)) * 60))
+    return slots
+
+
+def bench_index(args):
+    rng = random.Random(2)
+    index, intervals = IntervalIndex(), []
+    for i in range(args.events):
+        start = rng.uniform(0, args.days * 86400)
+        end = start + rng.choice((15, 30, 60, 120)) * 60
+        index.upsert(i, start, end, i)
+        intervals.append((start, end, i))
+    queries = [(s, s + 3600) for s in (rng.uniform(0, args.days * 86400) for _ in range(args.queries))]
+
+    started = time.perf_counter()
+    index.first_overlap(0, 1)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    fast = [sorted(item[2] for item in index.iter_overlaps(s, e)) for s, e in queries]
+    fast_us = (time.perf_counter() - started) / len(queries) * 1e6
+
+    started = time.perf_counter()
+    slow = [sorted(i for a, b, i in intervals if a < e and b > s) for s, e in queries]
+    slow_us = (time.perf_counter() - started) / len(queries) * 1e6
+
+    assert fast == slow, "IntervalIndex no coincide con el recorrido lineal"
+    print(f"índice    {args.events} intervalos, construcción {build_ms:.1f} ms; "
+          f"solape {fast_us:.1f} µs/consulta (lineal {slow_us:.0f} µs), {args.queries} consultas idénticas")
+
+
+async def bench_api(args):
+    slots = random_slots(args.checks, args.days, seed=3)
+
+    api = FakeCalendarApi(latency=args.latency)
+    api.populate(args.events, args.days, seed=1)
+    service = build_fake_calendar_service(api)
+
+    # Antes: una llamada por comprobación
+    started = time.perf_counter()
+    legacy = [await legacy_check(service, s, e) for s, e in slots]
+    elapsed = time.perf_counter() - started
+    print(f"antes     {elapsed / len(slots) * 1000:7.1f} ms/comprobación  "
+          f"events.list {api.calls['events.list']:4d}  {api.bytes_sent / 1024:8.0f} KiB")
+
+    # Después: freebusy en frío, sincronización completa y consultas locales
+    api.calls.clear()
+    api.bytes_sent = 0
+    cache = CalendarBusyCache(days=args.days, max_age=60)
+    started = time.perf_counter()
+    cold = await cache.first_conflict(service, *slots[0])
+    cold_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    await cache._fill_task
+    sync_ms = (time.perf_counter() - started) * 1000
+    print(f"frío      {cold_ms:7.1f} ms (freebusy.query); sincronización completa {sync_ms:.0f} ms, "
+          f"events.list {api.calls['events.list']} páginas, {api.bytes_sent / 1024:.0f} KiB, "
+          f"{len(cache.index)} bloques")
+
+    api.calls.clear()
+    api.bytes_sent = 0
+    started = time.perf_counter()
+    cached = [await cache.first_conflict(service, s, e) for s, e in slots]
+    elapsed = time.perf_counter() - started
+    print(f"después   {elapsed / len(slots) * 1000:7.3f} ms/comprobación  "
+          f"llamadas {sum(api.calls.values()):4d} {api.bytes_sent / 1024:8.0f} KiB")
+
+    mismatches = sum((a is None) != (b is None) for a, b in zip(legacy, cached))
+    print(f"resultado {args.checks} comprobaciones, {sum(r is not None for r in legacy)} ocupadas, "
+          f"{mismatches} discrepancias (libre/ocupado) con events.list")
+
+    # Cambios en el calendario: el siguiente refresco solo trae lo cambiado
+    rng = random.Random(4)
+    for event_id in rng.sample(sorted(api.events), args.changes):
+        api.cancel_event(event_id)
+    for start, end in slots[:args.changes]:
+        api.add_event(start, end, "Nueva")
+    api.calls.clear()
+    api.bytes_sent = 0
+    cache.synced_at = 0
+    started = time.perf_counter()
+    results = [await cache.first_conflict(service, s, e) for s, e in slots[:args.changes]]
+    incremental_ms = (time.perf_counter() - started) * 1000
+    assert all(results), "Los eventos nuevos deberían estar en la cache"
+    print(f"syncToken {2 * args.changes} cambios aplicados en {incremental_ms:.0f} ms, "
+          f"events.list {api.calls['events.list']}, {api.bytes_sent / 1024:.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--checks", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--changes", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    bench_index(args)
+    asyncio.run(bench_api(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+API de Google Calendar falsa para benchmarks locales.
+
+Implementa lo que usa la app: events.list (rango de fechas, páginas,
+syncToken y proyección con `fields`), events.insert (también en batch
+HTTP) y freebusy.query.
+Se sirve en proceso con FakeGmailHttp (mismo protocolo `serve`).
+
+Cada petición HTTP cuesta `latency` segundos y cada evento servido
+`per_item` segundos adicionales.
+"""
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from email.parser import Parser
+from urllib.parse import parse_qs, urlparse
+
+import pytz
+from googleapiclient.discovery import build
+
+from benchmarks.fake_gmail import FakeGmailHttp
+
+TIMEZONE = pytz.timezone("Europe/Madrid")
+EVENTS_PATH = re.compile(r"/calendars/([^/]+)/events/?$")
+
+
+def _ts(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp, TIMEZONE).isoformat()
+
+
+def fake_event(event_id, start, end, summary, transparent=False):
+    """Evento con el peso de uno real (descripción, asistentes, enlaces...)."""
+    event = {
+        "kind": "calendar#event",
+        "id": event_id,
+        "status": "confirmed",
+        "htmlLink": f"https://www.google.com/calendar/event?eid={event_id}",
+        "created": "2026-01-01T10:00:00.000Z",
+        "updated": "2026-01-01T10:00:00.000Z",
+        "summary": summary,
+        "description": "Orden del día y documentación de la reunión. " * 6,
+        "location": "Sala 2 / https://meet.google.com/abc-defg-hij",
+        "creator": {"email": "me@example.com", "self": True},
+        "organizer": {"email": "me@example.com", "self": True},
+        "start": {"dateTime": _iso(start), "timeZone": "Europe/Madrid"},
+        "end": {"dateTime": _iso(end), "timeZone": "Europe/Madrid"},
+        "iCalUID": f"{event_id}@google.com",
+        "sequence": 0,
+        "attendees": [
+            {"email": f"persona{i}@example.com", "responseStatus": "accepted"} for i in range(4)
+        ] + [{"email": "me@example.com", "self": True, "responseStatus": "accepted"}],
+        "reminders": {"useDefault": True},
+        "eventType": "default",
+    }
+    if transparent:
+        event["transparency"] = "transparent"
+    return event
+
+
+def _project(event, fields):
+    # Proyección simplificada de `fields`: solo claves de primer nivel de items(...)
+    match = re.search(r"items\(([^)]*(?:\([^)]*\))?[^)]*)\)", fields or "")
+    if not match:
+        return event
+    keys = {re.sub(r"\(.*", "", key) for key in re.split(r",(?![^(]*\))", match.group(1))}
+    return {key: value for key, value in event.items() if key in keys}
+
+
+class FakeCalendarApi:
+    def __init__(self, latency=0.05, per_item=0.00002, page_size=250):
+        self.latency = latency
+        self.per_item = per_item
+        self.page_size = page_size
+        self.events = {}
+        # Registro de cambios para syncToken: event_id -> secuencia del último cambio
+        self.changed_at = {}
+        self.sequence = 0
+        # Agendas de otros asistentes (solo visibles por freebusy): email -> [(inicio, fin)]
+        self.other_busy = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # syncTokens anteriores a esta secuencia caducados (410), y events.list
+        # que fallarán con 503 antes de volver a responder bien
+        self.expired_sync_before = 0
+        self.list_errors = 0
+        self.requests = 0
+        self.bytes_sent = 0
+        self.calls = Counter()
+
+    # ---- datos ----
+    def _touch(self, event):
+        self.sequence += 1
+        self.events[event["id"]] = event
+        self.changed_at[event["id"]] = self.sequence
+
+    def add_event(self, start, end, summary="Reunión", transparent=False):
+        with self._lock:
+            event = fake_event(f"ev{next(self._ids)}", start, end, summary, transparent)
+            self._touch(event)
+            return event
+
+    def cancel_event(self, event_id):
+        with self._lock:
+            event = dict(self.events[event_id], status="cancelled")
+            self._touch(event)
+
+    def populate(self, count, days, seed=0, start=None):
+        """`count` eventos de 15-120 min en horario laboral a lo largo de `days` días."""
+        rng = random.Random(seed)
+        today = datetime.now(TIMEZONE).replace(hour=0, minute=0, second=0, microsecond=0)
+        start = start or today
+        for i in range(count):
+            day = start + timedelta(days=rng.randrange(days))
+            begin = TIMEZONE.localize(datetime(day.year, day.month, day.day, 8)).timestamp()
+            begin += rng.randrange(0, 10 * 60, 15) * 60
+            self.add_event(begin, begin + rng.choice((15, 30, 45, 60, 90, 120)) * 60,
+                           summary=f"Reunión {i}", transparent=rng.random() < 0.1)
+
+    def expire_sync_tokens(self):
+        """Los syncToken emitidos hasta ahora dejan de valer (410 fullSyncRequired)."""
+        with self._lock:
+            self.expired_sync_before = self.sequence + 1
+
+    def add_busy(self, calendar_id, start, end):
+        self.other_busy.setdefault(calendar_id, []).append((start, end))
+
+    def busy_blocks(self, time_min, time_max, calendar_id="primary"):
+        """Bloques ocupados fusionados, como freebusy."""
+        with self._lock:
+            if calendar_id != "primary":
+                intervals = sorted(self.other_busy[calendar_id])
+            else:
+                intervals = sorted(
+                    (_ts(e["start"]["dateTime"]), _ts(e["end"]["dateTime"]))
+                    for e in self.events.values()
+                    if e["status"] != "cancelled" and e.get("transparency") != "transparent"
+                )
+        merged = []
+        for start, end in intervals:
+            if end <= time_min or start >= time_max:
+                continue
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return merged
+
+    # ---- endpoints ----
+    def list_events(self, query):
+        params = {key: values[0] for key, values in parse_qs(query).items()}
+        offset = int(params.get("pageToken", 0))
+        size = min(int(params.get("maxResults", self.page_size)), 2500)
+        with self._lock:
+            if "syncToken" in params:
+                since = int(params["syncToken"])
+                items = [self.events[i] for i, seq in self.changed_at.items() if seq > since]
+            else:
+                time_min = _ts(params["timeMin"]) if "timeMin" in params else float("-inf")
+                time_max = _ts(params["timeMax"]) if "timeMax" in params else float("inf")
+                items = [
+                    e for e in self.events.values()
+                    if e["status"] != "cancelled"
+                    and _ts(e["end"]["dateTime"]) > time_min and _ts(e["start"]["dateTime"]) < time_max
+                ]
+                if params.get("orderBy") == "startTime":
+                    items.sort(key=lambda e: e["start"]["dateTime"])
+            sequence = self.sequence
+        page = items[offset:offset + size]
+        time.sleep(self.per_item * len(page))
+        response = {"kind": "calendar#events", "items": [_project(e, params.get("fields")) for e in page]}
+        if offset + size < len(items):
+            response["nextPageToken"] = str(offset + size)
+        else:
+            response["nextSyncToken"] = str(sequence)
+        return response
+
+    def handle(self, method, uri, body=None):
+        parsed = urlparse(uri)
+        if parsed.path.endswith("/freeBusy"):
+            self.calls["freebusy.query"] += 1
+            request = json.loads(body)
+            time_min, time_max = _ts(request["timeMin"]), _ts(request["timeMax"])
+            calendars = {}
+            for item in request["items"]:
+                if item["id"] != "primary" and item["id"] not in self.other_busy:
+                    calendars[item["id"]] = {"busy": [], "errors": [{"domain": "global", "reason": "notFound"}]}
+                    continue
+                calendars[item["id"]] = {"busy": [
+                    {"start": _iso(start), "end": _iso(end)}
+                    for start, end in self.busy_blocks(time_min, time_max, item["id"])
+                ]}
+            return 200, {"calendars": calendars}
+        if EVENTS_PATH.search(parsed.path):
+            if method == "POST":
+                self.calls["events.insert"] += 1
+                request = json.loads(body)
+                event = self.add_event(
+                    _ts(request["start"]["dateTime"]), _ts(request["end"]["dateTime"]), request["summary"]
+                )
+                return 200, event
+            self.calls["events.list"] += 1
+            if self.list_errors:
+                self.list_errors -= 1
+                return 503, {"error": {"code": 503, "message": "Backend Error"}}
+            sync_token = parse_qs(parsed.query).get("syncToken")
+            if sync_token and int(sync_token[0]) < self.expired_sync_before:
+                return 410, {"error": {"code": 410, "message": "Sync token is no longer valid",
+                                       "errors": [{"reason": "fullSyncRequired"}]}}
+            return 200, self.list_events(parsed.query)
+        return 404, {"error": {"code": 404, "message": f"Not found: {parsed.path}"}}
+
+    def batch(self, body, content_type):
+        if isinstance(body, bytes):
+            body = body.decode()
+        parsed = Parser().parsestr(f"Content-Type: {content_type}\r\n\r\n{body}")
+        boundary = "fake_batch_boundary"
+        chunks = []
+        for part in parsed.get_payload():
+            content_id = part["Content-ID"].strip("<>")
+            request = part.get_payload().lstrip().replace("\r\n", "\n")
+            head, _, inner_body = request.partition("\n\n")
+            method, path = head.split("\n", 1)[0].split(" ")[:2]
+            status, data = self.handle(method, path, inner_body or None)
+            chunks.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} OK\r\n"
+                "Content-Type: application/json\r\n\r\n"
+                f"{json.dumps(data)}\r\n"
+            )
+        chunks.append(f"--{boundary}--")
+        return f"multipart/mixed; boundary={boundary}", "".join(chunks).encode()
+
+    def serve(self, method, uri, body, content_type):
+        """Devuelve (status, content_type, content) para una petición HTTP."""
+        self.requests += 1
+        time.sleep(self.latency)
+        if "/batch/" in uri:
+            self.calls["batch"] += 1
+            batch_type, content = self.batch(body, content_type)
+            self.bytes_sent += len(content)
+            return 200, batch_type, content
+        status, data = self.handle(method, uri, body)
+        content = json.dumps(data).encode()
+        self.bytes_sent += len(content)
+        return status, "application/json", content
+
+
+def build_fake_calendar_service(api):
+    return build("calendar", "v3", http=FakeGmailHttp(api), static_discovery=True)
@@ -0,0 +1,376 @@
+"""
+API de Gmail falsa para benchmarks locales.
+
+- FakeGmailHttp: transporte en proceso compatible con httplib2.
+- StubGmailServer: servidor HTTP local (para el transporte async con httpx).
+
+Cada petición HTTP cuesta `latency` segundos (ida y vuelta simulada) y cada
+mensaje servido cuesta `per_item` segundos adicionales.
+"""
+import base64
+import contextlib
+import json
+import multiprocessing
+import re
+import threading
+import time
+from collections import Counter
+from email.parser import Parser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httplib2
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.discovery import build
+
+
+def _b64(text):
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+def fake_message(message_id, label_ids=("INBOX", "UNREAD"), html_size=0, format="full"):
+    """
+    Mensaje como lo devuelve messages.get. Con html_size > 0 es un
+    multipart/alternative con una parte HTML de ~html_size caracteres.
+    format="metadata" devuelve solo cabeceras, como Gmail.
+    """
+    text = f"Hola, este es el cuerpo del mensaje {message_id}."
+    headers = [
+        {"name": "From", "value": "alice@example.com"},
+        {"name": "Subject", "value": f"Asunto {message_id}"},
+        {"name": "Date", "value": "Tue, 14 Nov 2023 22:13:20 +0000"},
+    ]
+    if format == "metadata":
+        payload = {"mimeType": "text/plain", "headers": headers}
+    elif html_size:
+        row = f'<tr><td style="font-family:Arial;padding:4px">{text}</td></tr>'
+        html = "<html><body><table>" + row * (html_size // len(row) + 1) + "</table></body></html>"
+        payload = {
+            "mimeType": "multipart/alternative",
+            "headers": headers,
+            "parts": [
+                {"mimeType": "text/plain", "body": {"data": _b64(text)}},
+                {"mimeType": "text/html", "body": {"data": _b64(html)}},
+            ],
+        }
+    else:
+        payload = {"mimeType": "text/plain", "headers": headers, "body": {"data": _b64(text)}}
+    return {
+        "id": message_id,
+        "threadId": f"t{message_id}",
+        "labelIds": list(label_ids),
+        "snippet": f"Snippet {message_id}",
+        "historyId": "1",
+        "internalDate": "1700000000000",
+        "payload": payload,
+    }
+
+
+MESSAGE_PATH = re.compile(r"/users/me/messages/([^/?]+)")
+THREAD_PATH = re.compile(r"/users/me/threads/([^/?]+)")
+
+
+class FakeGmailApi:
+    def __init__(self, latency=0.02, per_item=0.0005, total_messages=500, html_size=0, thread_size=1,
+                 quota_per_second=None):
+        self.latency = latency
+        self.per_item = per_item
+        self.total_messages = total_messages
+        self.html_size = html_size
+        self.thread_size = thread_size
+        # Cuota por usuario como la de Gmail: si se supera, 429 rateLimitExceeded
+        self.quota_per_second = quota_per_second
+        self._quota_tokens = quota_per_second or 0
+        self._quota_updated = time.monotonic()
+        self._quota_lock = threading.Lock()
+        self.rate_limited = 0
+        self.requests = 0
+        self.bytes_sent = 0
+        self.calls = Counter()
+        # Cuerpos de messages.batchModify recibidos
+        self.batch_modifies = []
+        self.labels = [
+            {"id": "INBOX", "name": "INBOX", "type": "system"},
+            {"id": "UNREAD", "name": "UNREAD", "type": "system"},
+        ]
+        # Historial para history.list: deliver() añade un registro messagesAdded.
+        # Un startHistoryId anterior a history_floor ya ha caducado (404)
+        self.history_id = 100
+        self.history = []
+        self.history_floor = 0
+        # Mensajes borrados: messages.get responde 404
+        self.deleted = set()
+        self._history_lock = threading.Lock()
+
+    def deliver(self, message_id, label_ids=("INBOX", "UNREAD")):
+        """Simula la llegada de un correo. Devuelve el nuevo historyId."""
+        with self._history_lock:
+            self.history_id += 1
+            ref = {"id": message_id, "threadId": f"t{message_id}", "labelIds": list(label_ids)}
+            self.history.append({
+                "id": str(self.history_id),
+                "messages": [{"id": message_id, "threadId": ref["threadId"]}],
+                "messagesAdded": [{"message": ref}],
+            })
+            return self.history_id
+
+    def delete(self, message_id):
+        """Simula el borrado definitivo de un correo. Devuelve el nuevo historyId."""
+        with self._history_lock:
+            self.history_id += 1
+            self.deleted.add(message_id)
+            ref = {"id": message_id, "threadId": f"t{message_id}"}
+            self.history.append({
+                "id": str(self.history_id),
+                "messages": [ref],
+                "messagesDeleted": [{"message": ref}],
+            })
+            return self.history_id
+
+    def change_labels(self, message_id, add=(), remove=()):
+        """Simula un cambio de labels hecho desde otro cliente. Devuelve el nuevo historyId."""
+        with self._history_lock:
+            self.history_id += 1
+            ref = {"id": message_id, "threadId": f"t{message_id}"}
+            record = {"id": str(self.history_id), "messages": [ref]}
+            if add:
+                record["labelsAdded"] = [{"message": ref, "labelIds": list(add)}]
+            if remove:
+                record["labelsRemoved"] = [{"message": ref, "labelIds": list(remove)}]
+            self.history.append(record)
+            return self.history_id
+
+    def expire_history(self):
+        """Los historyId conocidos hasta ahora caducan, como tras ~1 semana en Gmail."""
+        with self._history_lock:
+            self.history_floor = self.history_id + 1
+
+    def history_since(self, start_history_id):
+        with self._history_lock:
+            records = [r for r in self.history if int(r["id"]) > start_history_id]
+            return {"history": records, "historyId": str(self.history_id)}
+
+    def handle(self, method, uri, body=None):
+        if "/users/me/labels" in uri:
+            return self.handle_labels(method, body)
+        match = THREAD_PATH.search(uri)
+        if match:
+            self.calls["threads.get"] += 1
+            return 200, self.thread(match.group(1), "format=metadata" in uri)
+        if uri.split("?")[0].endswith("/messages/batchModify"):
+            self.calls["messages.batchModify"] += 1
+            self.batch_modifies.append(json.loads(body))
+            return 200, {}
+        match = MESSAGE_PATH.search(uri)
+        if match:
+            self.calls["messages.get"] += 1
+            if match.group(1) in self.deleted:
+                return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+            format = "metadata" if "format=metadata" in uri else "full"
+            return 200, fake_message(match.group(1), html_size=self.html_size, format=format)
+        if "/users/me/profile" in uri:
+            return 200, {"emailAddress": "me@example.com", "historyId": str(self.history_id)}
+        if "/users/me/history" in uri:
+            self.calls["history.list"] += 1
+            start = int(re.search(r"startHistoryId=(\d+)", uri).group(1))
+            if start < self.history_floor:
+                return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+            return 200, self.history_since(start)
+        if "/users/me/watch" in uri:
+            self.calls["watch"] += 1
+            expiration = int((time.time() + 7 * 86400) * 1000)
+            return 200, {"historyId": str(self.history_id), "expiration": str(expiration)}
+        if "/users/me/messages" in uri:
+            max_results = int(re.search(r"maxResults=(\d+)", uri).group(1)) if "maxResults" in uri else 100
+            token = re.search(r"pageToken=(\d+)", uri)
+            start = int(token.group(1)) if token else 0
+            end = min(start + max_results, self.total_messages)
+            page = {"messages": [{"id": f"m{i}", "threadId": f"tm{i}"} for i in range(start, end)]}
+            if end < self.total_messages:
+                page["nextPageToken"] = str(end)
+            return 200, page
+        return 404, {"error": {"code": 404, "message": "not found"}}
+
+    def thread(self, thread_id, metadata):
+        """Hilo t<id>: el mensaje <id> y thread_size - 1 respuestas (la última, enviada)."""
+        message_id = thread_id[1:]
+        ids = [message_id] + [f"{message_id}-r{k}" for k in range(1, self.thread_size)]
+        messages = [
+            fake_message(
+                mid,
+                label_ids=("SENT",) if k and k == len(ids) - 1 else ("INBOX",),
+                html_size=self.html_size,
+                format="metadata" if metadata else "full",
+            )
+            for k, mid in enumerate(ids)
+        ]
+        for message in messages:
+            message["threadId"] = thread_id
+        return {"id": thread_id, "historyId": "100", "messages": messages}
+
+    def handle_labels(self, method, body):
+        self.calls[f"labels.{'create' if method == 'POST' else 'list'}"] += 1
+        if method == "POST":
+            label = {"id": f"Label_{len(self.labels)}", "type": "user", **json.loads(body)}
+            self.labels.append(label)
+            return 200, label
+        return 200, {"labels": self.labels}
+
+    def batch(self, body, content_type):
+        parsed = Parser().parsestr(f"Content-Type: {content_type}\r\n\r\n{body}")
+        boundary = "fake_batch_boundary"
+        chunks = []
+        for part in parsed.get_payload():
+            content_id = part["Content-ID"].strip("<>")
+            request_line = part.get_payload().lstrip().split("\n", 1)[0]
+            method, path = request_line.split(" ")[:2]
+            status, data = self.handle(method, path)
+            time.sleep(self.per_item)
+            chunks.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} OK\r\n"
+                "Content-Type: application/json\r\n\r\n"
+                f"{json.dumps(data)}\r\n"
+            )
+        chunks.append(f"--{boundary}--")
+        return f"multipart/mixed; boundary={boundary}", "".join(chunks).encode()
+
+    def _take_quota(self, uri):
+        if not self.quota_per_second:
+            return True
+        if "/threads/" in uri:
+            cost = 10
+        elif "/history" in uri:
+            cost = 2
+        elif "/labels" in uri or "/profile" in uri:
+            cost = 1
+        else:
+            cost = 5
+        with self._quota_lock:
+            now = time.monotonic()
+            self._quota_tokens = min(
+                self.quota_per_second,
+                self._quota_tokens + (now - self._quota_updated) * self.quota_per_second,
+            )
+            self._quota_updated = now
+            if self._quota_tokens < cost:
+                self.rate_limited += 1
+                return False
+            self._quota_tokens -= cost
+            return True
+
+    def serve(self, method, uri, body, content_type):
+        """Devuelve (status, content_type, content) para una petición HTTP."""
+        self.requests += 1
+        time.sleep(self.latency)
+        if not self._take_quota(uri):
+            error = {"error": {"code": 429, "message": "Rate limit exceeded",
+                               "errors": [{"reason": "rateLimitExceeded"}]}}
+            return 429, "application/json", json.dumps(error).encode()
+        if uri.rstrip("/").endswith("/batch") or "/batch/" in uri:
+            batch_type, content = self.batch(body, content_type)
+            self.bytes_sent += len(content)
+            return 200, batch_type, content
+        time.sleep(self.per_item)
+        status, data = self.handle(method, uri, body)
+        content = json.dumps(data).encode()
+        self.bytes_sent += len(content)
+        return status, "application/json", content
+
+
+class FakeGmailHttp:
+    """Transporte en proceso compatible con httplib2."""
+
+    def __init__(self, api):
+        self.api = api
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        headers = headers or {}
+        content_type = headers.get("content-type") or headers.get("Content-Type")
+        status, response_type, content = self.api.serve(method, uri, body, content_type)
+        return httplib2.Response({"status": status, "content-type": response_type}), content
+
+
+class StubGmailServer:
+    """Servidor HTTP local que responde como la API de Gmail."""
+
+    def __init__(self, api):
+        self.api = api
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _serve(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode() if length else None
+                status, response_type, content = api.serve(
+                    self.command, self.path, body, self.headers.get("Content-Type")
+                )
+                self.send_response(status)
+                self.send_header("Content-Type", response_type)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_POST = _serve
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 1024
+
+        self.httpd = Server(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _serve_in_process(latency, per_item, queue):
+    with StubGmailServer(FakeGmailApi(latency=latency, per_item=per_item)) as server:
+        queue.put(server.url)
+        threading.Event().wait()
+
+
+@contextlib.contextmanager
+def stub_gmail_server_process(latency=0.02, per_item=0.0005):
+    """
+    StubGmailServer en un proceso aparte, para que sus hilos no compitan por
+    el GIL con el event loop que se está midiendo. Devuelve la URL base.
+    """
+    # spawn: no heredar hilos/estado (grpc, event loop) del proceso que mide
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(
+        target=_serve_in_process, args=(latency, per_item, queue), daemon=True
+    )
+    process.start()
+    try:
+        yield queue.get(timeout=30)
+    finally:
+        process.terminate()
+        process.join()
+
+
+def build_fake_gmail_service(api, root_url=None):
+    """
+    Servicio discovery contra la API falsa: en proceso (root_url=None) o
+    contra un StubGmailServer (root_url=server.url).
+    """
+    if root_url is None:
+        return build("gmail", "v1", http=FakeGmailHttp(api), static_discovery=True)
+    return build(
+        "gmail", "v1",
+        credentials=AnonymousCredentials(),
+        static_discovery=True,
+        client_options={"api_endpoint": root_url},
+    )
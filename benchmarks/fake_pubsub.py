@@ -0,0 +1,75 @@
+"""
+Publicador local que sustituye a Pub/Sub: envía a /gmail/push el mismo
+cuerpo que una suscripción push real.
+
+Puede simular la latencia de entrega y las entregas duplicadas de Pub/Sub
+(entrega "al menos una vez").
+
+Uso (desde la raíz del proyecto, con la API levantada):
+    python -m benchmarks.fake_pubsub --url http://localhost:8001/gmail/push \\
+        --email me@example.com --history-id 12345
+"""
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import random
+
+import httpx
+
+SUBSCRIPTION = "projects/local/subscriptions/gmail-push"
+
+
+def build_push_envelope(email_address, history_id, message_id):
+    data = json.dumps({"emailAddress": email_address, "historyId": history_id})
+    return {
+        "message": {
+            "data": base64.b64encode(data.encode()).decode(),
+            "messageId": str(message_id),
+            "publishTime": "2026-10-18T10:00:00Z",
+        },
+        "subscription": SUBSCRIPTION,
+    }
+
+
+class FakePubSubPublisher:
+    def __init__(self, url, token=None, client=None, latency=0.0, duplicate_rate=0.0, seed=0):
+        self.url = url
+        self.params = {"token": token} if token else {}
+        self.client = client or httpx.AsyncClient()
+        self.latency = latency
+        self.duplicate_rate = duplicate_rate
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self.sent = 0
+
+    async def publish(self, email_address, history_id):
+        """Entrega la notificación (y a veces un duplicado). Devuelve el status HTTP."""
+        envelope = build_push_envelope(email_address, history_id, next(self._ids))
+        await asyncio.sleep(self.latency)
+        copies = 2 if self._random.random() < self.duplicate_rate else 1
+        for _ in range(copies):
+            response = await self.client.post(self.url, json=envelope, params=self.params)
+            self.sent += 1
+        return response.status_code
+
+
+async def _main(args):
+    async with httpx.AsyncClient() as client:
+        publisher = FakePubSubPublisher(args.url, token=args.token, client=client)
+        status = await publisher.publish(args.email, args.history_id)
+    print(f"POST {args.url} -> {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8001/gmail/push")
+    parser.add_argument("--token")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--history-id", type=int, required=True)
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark de carga del inbox: get_message uno a uno vs get_messages_batch.
+
+Con transporte async (httpx) el lote son peticiones concurrentes contra un
+servidor stub local; con GOOGLE_ASYNC_TRANSPORT=0 es la interfaz batch HTTP.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.inbox_batch_benchmark --latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import time
+
+# Sin el planificador de cuota: este benchmark no la mide (ver quota_benchmark)
+os.environ.setdefault("GOOGLE_QUOTA_ENABLED", "0")
+
+from app.auth import async_http  # noqa: E402
+from app.gmail.gmail_service import get_last_messages, get_message, get_messages_batch  # noqa: E402
+from benchmarks.fake_gmail import FakeGmailApi, StubGmailServer, build_fake_gmail_service  # noqa: E402
+
+
+async def load_serial(service, n, batch_size):
+    messages = await get_last_messages(service, max_results=n)
+    return [await get_message(service, m["id"]) for m in messages]
+
+
+async def load_batch(service, n, batch_size):
+    messages = await get_last_messages(service, max_results=n)
+    return await get_messages_batch(service, [m["id"] for m in messages], batch_size=batch_size)
+
+
+async def run(args):
+    mode = "async" if async_http.ASYNC_TRANSPORT else "batch HTTP"
+    print(f"transporte: {mode}, latencia {args.latency * 1000:.0f} ms, batch_size {args.batch_size}")
+    print(f"{'N':>5} {'serial (s)':>11} {'reqs':>5} {'batch (s)':>10} {'reqs':>5} {'speedup':>8}")
+
+    for n in [int(x) for x in args.sizes.split(",")]:
+        row = []
+        for loader in (load_serial, load_batch):
+            api = FakeGmailApi(latency=args.latency, total_messages=n)
+            with StubGmailServer(api) as server:
+                root_url = server.url if async_http.ASYNC_TRANSPORT else None
+                service = build_fake_gmail_service(api, root_url=root_url)
+                start = time.perf_counter()
+                emails = await loader(service, n, args.batch_size)
+                elapsed = time.perf_counter() - start
+            assert len(emails) == n
+            row.append((elapsed, api.requests))
+        (serial, serial_reqs), (batch, batch_reqs) = row
+        print(f"{n:>5} {serial:>11.3f} {serial_reqs:>5} {batch:>10.3f} {batch_reqs:>5} {serial / batch:>7.1f}x")
+
+    await async_http.close_async_http_client()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.02, help="segundos por ida y vuelta HTTP")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--sizes", default="20,50,100,200,500")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
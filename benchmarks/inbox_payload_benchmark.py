@@ -0,0 +1,57 @@
+"""
+Coste de cargar el inbox con bodies (format="full") frente a solo metadatos
+(format="metadata" + metadataHeaders) en un buzón con correos HTML pesados.
+
+Mide bytes recibidos de Gmail y tiempo de descarga + decodificación, con la
+API falsa en proceso (interfaz batch HTTP, sin latencia de red).
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.inbox_payload_benchmark --messages 50 --html-size 50000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+# Sin el planificador de cuota: este benchmark no la mide (ver quota_benchmark)
+os.environ.setdefault("GOOGLE_QUOTA_ENABLED", "0")
+
+from app.auth import async_http  # noqa: E402
+from app.gmail.message_store import MessageStore, list_messages  # noqa: E402
+from benchmarks.fake_gmail import FakeGmailApi, build_fake_gmail_service  # noqa: E402
+
+
+async def load(n, html_size, with_body):
+    api = FakeGmailApi(latency=0, per_item=0, total_messages=n, html_size=html_size)
+    service = build_fake_gmail_service(api)
+    store = MessageStore(":memory:")
+    start = time.perf_counter()
+    emails = await list_messages(service, store, limit=n, with_body=with_body)
+    elapsed = time.perf_counter() - start
+    assert len(emails) == n
+    return api.bytes_sent, elapsed
+
+
+async def run(args):
+    # Servicio en proceso: sin transporte async, batch HTTP
+    async_http.ASYNC_TRANSPORT = False
+    print(f"{args.messages} mensajes, HTML de ~{args.html_size // 1000} KB")
+    print(f"{'modo':<10} {'KB recibidos':>13} {'tiempo (ms)':>12}")
+    rows = {}
+    for name, with_body in (("full", True), ("metadata", False)):
+        rows[name] = await load(args.messages, args.html_size, with_body)
+        size, elapsed = rows[name]
+        print(f"{name:<10} {size / 1000:>13.1f} {elapsed * 1000:>12.1f}")
+    (full_size, full_time), (meta_size, meta_time) = rows["full"], rows["metadata"]
+    print(f"reducción: {full_size / meta_size:.0f}x bytes, {full_time / meta_time:.1f}x tiempo")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--html-size", type=int, default=50000)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark de extremo a extremo del análisis contra un backend LLM local
+(sin GEMINI_API_KEY ni red): rutas analyze, batch y cache.
+
+- analyze: analyze_email_structured con bodies distintos (todo fallos de cache)
+- batch:   analyze_emails_batch en lotes de `--batch-size` bodies nuevos
+- cache:   analyze_email_structured repitiendo los bodies de "analyze"
+
+Muestra correos/segundo, latencia p50/p95/p99 por llamada y llamadas al modelo.
+Con --backend http arranca benchmarks/llm_stub_server.py en un hilo.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.llm_backend_benchmark --backend fake --emails 200 --concurrency 8
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("ANALYSIS_CACHE_PATH", ":memory:")
+
+from app.ai import email_analysis_service  # noqa: E402
+from app.ai.llm_backends import FakeLlmBackend, HttpLlmBackend, set_llm_backend  # noqa: E402
+from benchmarks.llm_stub_server import start_stub_server  # noqa: E402
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def body(scenario, i):
+    return (f"[{scenario} {i}] Hola, ¿podemos revisar el presupuesto del proyecto el jueves "
+            f"a las 10:00? Adjunto las cifras del trimestre. Un saludo, Ana.")
+
+
+def run_scenario(name, calls, concurrency, emails_per_call, counter):
+    def timed(call):
+        start = time.perf_counter()
+        call()
+        return time.perf_counter() - start
+
+    calls_before = counter.calls
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, calls))
+    elapsed = time.perf_counter() - start
+
+    emails = len(calls) * emails_per_call
+    print(f"{name:<8} {emails / elapsed:10.1f} {percentile(latencies, 50) * 1000:9.1f} "
+          f"{percentile(latencies, 95) * 1000:9.1f} {percentile(latencies, 99) * 1000:9.1f} "
+          f"{counter.calls - calls_before:9d}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=("fake", "http"), default="fake")
+    parser.add_argument("--emails", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeLlmBackend(latency=args.latency, token_delay=args.token_delay)
+    if args.backend == "http":
+        server, url = start_stub_server(fake)
+        set_llm_backend(HttpLlmBackend(url))
+    else:
+        set_llm_backend(fake)
+
+    analyze = email_analysis_service.analyze_email_structured
+    analyze_batch = email_analysis_service.analyze_emails_batch
+
+    print(f"backend {args.backend}, latencia {args.latency}s, {args.emails} correos, "
+          f"concurrencia {args.concurrency}, lotes de {args.batch_size}")
+    print(f"{'ruta':<8} {'correos/s':>10} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'llamadas':>9}")
+
+    run_scenario(
+        "analyze",
+        [lambda i=i: analyze(body("analyze", i)) for i in range(args.emails)],
+        args.concurrency, 1, fake,
+    )
+    batches = [
+        [{"id": f"b{i}", "body": body("batch", i)}
+         for i in range(start, min(start + args.batch_size, args.emails))]
+        for start in range(0, args.emails, args.batch_size)
+    ]
+    run_scenario(
+        "batch",
+        [lambda chunk=chunk: analyze_batch(chunk) for chunk in batches],
+        args.concurrency, args.batch_size, fake,
+    )
+    run_scenario(
+        "cache",
+        [lambda i=i: analyze(body("analyze", i)) for i in range(args.emails)],
+        args.concurrency, 1, fake,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark del análisis con Gemini degradado.
+
+Un modelo falso que durante `--outage` segundos tarda `--hang` segundos en
+responder y falla con 503 (como un upstream saturado) y después se recupera.
+Llegan `--requests` análisis, uno cada `--interval` segundos (carga abierta,
+atendidos por un pool de hilos como el threadpool de FastAPI):
+
+- antes: llamada directa al backend (sin deadline, sin reintentos)
+- después: a través de LlmGuard (deadline, reintentos con jitter y circuit breaker)
+
+Uso (desde la raíz del proyecto):
+    ANALYSIS_CACHE_PATH=:memory: python -m benchmarks.llm_resilience_benchmark
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google.api_core import exceptions as google_exceptions
+
+from app.ai import email_analysis_service
+from app.ai.llm_backends import FakeLlmBackend, get_llm_backend, set_llm_backend
+from app.ai.llm_resilience import CircuitBreaker, LlmGuard
+
+
+class DegradedLlmBackend(FakeLlmBackend):
+    def __init__(self, outage, hang, **kwargs):
+        super().__init__(**kwargs)
+        self.outage = outage
+        self.hang = hang
+        self.started = time.monotonic()
+
+    def generate(self, prompt, timeout=None):
+        if time.monotonic() - self.started < self.outage:
+            with self._lock:
+                self.calls += 1
+            # Ignora timeout: el deadline lo tiene que imponer LlmGuard
+            time.sleep(self.hang)
+            raise google_exceptions.ServiceUnavailable("modelo sobrecargado")
+        return super().generate(prompt, timeout)
+
+
+def direct_analyze(body):
+    # Llamada original: sin deadline ni reintentos
+    prompt = email_analysis_service.build_analysis_prompt(body, "2026-10-18", "Sunday")
+    try:
+        return {"summary": get_llm_backend().generate(prompt)}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def run(name, analyze, args):
+    backend = DegradedLlmBackend(args.outage, args.hang, latency=args.latency, token_delay=0)
+    set_llm_backend(backend)
+
+    def request(i, arrived):
+        # Body distinto en cada petición para no acertar en la cache
+        result = analyze(f"Correo {i}: ¿revisamos el presupuesto el jueves?")
+        return time.monotonic() - arrived, result
+
+    start = time.monotonic()
+    futures = []
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        for i in range(args.requests):
+            time.sleep(max(0, start + i * args.interval - time.monotonic()))
+            futures.append(pool.submit(request, i, time.monotonic()))
+
+    latencies, errors, fallbacks = [], 0, 0
+    for future in futures:
+        latency, result = future.result()
+        latencies.append(latency)
+        if result.get("degraded"):
+            fallbacks += 1
+        elif "error" in result:
+            errors += 1
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<8} total {time.monotonic() - start:6.1f}s  p50 {p50 * 1000:7.0f} ms  "
+          f"p99 {p99 * 1000:7.0f} ms  errores {errors:3d}  respaldo {fallbacks:3d}  "
+          f"llamadas al modelo {backend.calls}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--interval", type=float, default=0.2)
+    parser.add_argument("--outage", type=float, default=6.0)
+    parser.add_argument("--hang", type=float, default=3.0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--threads", type=int, default=40)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--cooldown", type=float, default=2.0)
+    args = parser.parse_args()
+
+    print(f"{args.requests} análisis, uno cada {args.interval}s; caída de {args.outage}s "
+          f"con respuestas de {args.hang}s y 503")
+    run("antes", direct_analyze, args)
+
+    guard = LlmGuard(timeout=args.timeout, max_retries=2, backoff=0.1,
+                     breaker=CircuitBreaker(failures=5, cooldown=args.cooldown))
+    email_analysis_service.get_llm_guard = lambda: guard
+    run("después", email_analysis_service.analyze_email_structured, args)
+    metrics = guard.metrics()
+    print(f"breaker abierto {metrics['breaker']['times_opened']} veces, "
+          f"{metrics['retries']} reintentos, {metrics['timeouts']} timeouts, "
+          f"{metrics['short_circuited']} llamadas evitadas, "
+          f"{metrics['saturated']} rechazadas por hilos colgados")
+
+
+if __name__ == "__main__":
+    main()
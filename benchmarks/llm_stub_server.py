@@ -0,0 +1,73 @@
+"""
+Servidor HTTP local que sirve el backend LLM fake (para LLM_BACKEND=http).
+
+POST /generate {"prompt": ..., "stream": false} -> {"text": ...}
+POST /generate {"prompt": ..., "stream": true}  -> NDJSON de {"text": trozo}
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.llm_stub_server --port 8765 --latency 0.3
+    LLM_BACKEND=http LLM_HTTP_URL=http://127.0.0.1:8765/generate uvicorn app.main:app
+"""
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.ai.llm_backends import FakeLlmBackend
+
+
+def make_handler(backend):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if payload.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for piece in backend.stream(payload["prompt"]):
+                    line = (json.dumps({"text": piece}) + "\n").encode("utf-8")
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+                return
+
+            body = json.dumps({"text": backend.generate(payload["prompt"])}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_stub_server(backend, host="127.0.0.1", port=0):
+    """Arranca el servidor en un hilo. Devuelve (servidor, url)."""
+    server = ThreadingHTTPServer((host, port), make_handler(backend))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/generate"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    backend = FakeLlmBackend(latency=args.latency, token_delay=args.token_delay)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(backend))
+    print(f"stub LLM en http://{args.host}:{args.port}/generate")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
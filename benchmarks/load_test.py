@@ -0,0 +1,88 @@
+"""
+Prueba de carga de las rutas FastAPI contra un servidor stub de Gmail.
+
+Compara el transporte bloqueante en el threadpool (comportamiento anterior,
+GOOGLE_ASYNC_TRANSPORT=0) con el transporte async sobre httpx y muestra
+peticiones/segundo y latencia p50/p99.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.load_test --concurrency 100 --requests 1000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("MESSAGE_STORE_PATH", ":memory:")
+
+import httpx  # noqa: E402
+
+import app.main as main  # noqa: E402
+from app.auth import async_http  # noqa: E402
+from benchmarks.fake_gmail import (  # noqa: E402
+    FakeGmailApi,
+    build_fake_gmail_service,
+    stub_gmail_server_process,
+)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run_load(path, concurrency, total):
+    latencies = []
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+
+        async def worker():
+            while not queue.empty():
+                queue.get_nowait()
+                start = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return total / elapsed, percentile(latencies, 50), percentile(latencies, 99)
+
+
+async def run(args):
+    print(f"ruta {args.path}, concurrencia {args.concurrency}, {args.requests} peticiones, "
+          f"latencia stub {args.latency * 1000:.0f} ms")
+    print(f"{'modo':<12} {'req/s':>8} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+
+    api = FakeGmailApi()
+    with stub_gmail_server_process(latency=args.latency, per_item=0) as url:
+        # Un único cliente compartido, como la cache de google_auth
+        service = build_fake_gmail_service(api, root_url=url)
+        main.get_gmail_service = lambda: service
+
+        for mode, async_transport in (("threadpool", False), ("async", True)):
+            async_http.ASYNC_TRANSPORT = async_transport
+            rps, p50, p99 = await run_load(args.path, args.concurrency, args.requests)
+            print(f"{mode:<12} {rps:>8.1f} {p50 * 1000:>9.1f} {p99 * 1000:>9.1f}")
+
+    await async_http.close_async_http_client()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", default="/auth/user")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.05, help="segundos por petición al stub")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,99 @@
+"""
+Crear N reuniones: create_meeting una a una vs create_meetings_batch.
+
+Con la API de Calendar falsa (benchmarks/fake_calendar.py, `--latency` por
+petición) y la agenda con `--events` eventos, se piden `--meetings` reuniones
+en horario laboral de las próximas dos semanas; `--duplicates` de ellas
+repiten la franja de otra del mismo lote (choque dentro del lote).
+
+Mide tiempo total, peticiones HTTP y llamadas por método, y comprueba que
+ambos caminos crean y rechazan las mismas reuniones. La cuota de Calendar
+(CALENDAR_REQUESTS_PER_SECOND) está activa salvo con --no-quota.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.meeting_batch_benchmark --meetings 40 --duplicates 5
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+os.environ["GOOGLE_ASYNC_TRANSPORT"] = "0"
+if "--no-quota" in sys.argv:
+    os.environ["GOOGLE_QUOTA_ENABLED"] = "0"
+
+from app.calendar import calendar_service  # noqa: E402
+from app.calendar.busy_cache import TIMEZONE, clear_busy_caches  # noqa: E402
+from app.calendar.calendar_service import (  # noqa: E402
+    MeetingConflictError,
+    create_meeting,
+    create_meetings_batch,
+)
+from benchmarks.fake_calendar import FakeCalendarApi, build_fake_calendar_service  # noqa: E402
+
+
+def build_meetings(count, duplicates, seed=0):
+    rng = random.Random(seed)
+    today = datetime.now(TIMEZONE).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    meetings = []
+    for i in range(count - duplicates):
+        day = today + timedelta(days=rng.randrange(1, 15))
+        start = day.replace(hour=rng.randrange(9, 17), minute=rng.choice((0, 30)))
+        meetings.append({"title": f"Reunión {i}", "start_datetime": start,
+                         "duration_minutes": rng.choice((30, 60)), "attendees": [f"p{i}@example.com"]})
+    for i in range(duplicates):
+        original = rng.choice(meetings)
+        meetings.append(dict(original, title=f"Duplicada {i}"))
+    rng.shuffle(meetings)
+    return meetings
+
+
+async def run(mode, args, meetings):
+    api = FakeCalendarApi(latency=args.latency)
+    api.populate(args.events, 30, seed=1)
+    service = build_fake_calendar_service(api)
+    calendar_service.get_calendar_service = lambda credentials: service
+    clear_busy_caches()
+
+    started = time.perf_counter()
+    if mode == "uno a uno":
+        results = []
+        for meeting in meetings:
+            try:
+                await create_meeting(None, **meeting)
+                results.append("created")
+            except MeetingConflictError:
+                results.append("conflict")
+    else:
+        results = [r["status"] for r in await create_meetings_batch(None, meetings)]
+    elapsed = time.perf_counter() - started
+
+    calls = ", ".join(f"{name} {count}" for name, count in sorted(api.calls.items()))
+    print(f"{mode:<9} {elapsed * 1000:7.0f} ms  peticiones HTTP {api.requests:3d} ({calls})  "
+          f"creadas {results.count('created')}  en conflicto {results.count('conflict')}")
+    return results
+
+
+async def run_all(args):
+    meetings = build_meetings(args.meetings, args.duplicates)
+    one_by_one = await run("uno a uno", args, meetings)
+    batch = await run("lote", args, meetings)
+    print(f"resultados {'idénticos' if one_by_one == batch else 'DISTINTOS'} por reunión")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--meetings", type=int, default=40)
+    parser.add_argument("--duplicates", type=int, default=5)
+    parser.add_argument("--events", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--no-quota", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(run_all(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Coste de la instrumentación (app/observability/metrics.py) y ejemplo de
+lo que expone.
+
+Con la API de Gmail falsa en proceso (sin latencia) y el modelo fake:
+- /emails con el almacén ya caliente, alternando petición a petición con
+  métricas desactivadas y activadas (METRICS_ENABLED en caliente): medianas
+- cabeceras Server-Timing de /emails y /emails/{id}/analyze
+- tiempo y tamaño de /metrics
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.metrics_overhead_benchmark --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("MESSAGE_STORE_PATH", ":memory:")
+os.environ.setdefault("ANALYSIS_CACHE_PATH", ":memory:")
+os.environ["ANALYSIS_WORKER_ENABLED"] = "0"
+os.environ["GOOGLE_ASYNC_TRANSPORT"] = "0"
+
+import httpx  # noqa: E402
+
+import app.main as main  # noqa: E402
+from app.ai.llm_backends import FakeLlmBackend, set_llm_backend  # noqa: E402
+from app.observability import metrics  # noqa: E402
+from benchmarks.fake_gmail import FakeGmailApi, build_fake_gmail_service  # noqa: E402
+
+
+async def measure(client, path, requests):
+    """Alterna petición a petición con y sin métricas: el ruido afecta a ambos por igual."""
+    elapsed = {False: [], True: []}
+    for i in range(requests):
+        enabled = bool(i % 2)
+        metrics.METRICS_ENABLED = enabled
+        started = time.perf_counter()
+        response = await client.get(path)
+        elapsed[enabled].append(time.perf_counter() - started)
+        response.raise_for_status()
+    metrics.METRICS_ENABLED = True
+    return {enabled: sorted(values)[len(values) // 2] for enabled, values in elapsed.items()}
+
+
+async def run(args):
+    service = build_fake_gmail_service(FakeGmailApi(latency=0, per_item=0))
+    main.get_gmail_service = lambda: service
+    set_llm_backend(FakeLlmBackend(latency=args.llm_latency))
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+        path = f"/emails?page_size={args.page_size}"
+        first = await client.get(path)
+        print(f"Server-Timing /emails (frío):   {first.headers.get('server-timing')}")
+        response = await client.get(path)
+        print(f"Server-Timing /emails (caliente): {response.headers.get('server-timing')}")
+        message_id = response.json()[0]["id"]
+        response = await client.post(f"/emails/{message_id}/analyze")
+        print(f"Server-Timing /analyze:         {response.headers.get('server-timing')}")
+
+        medians = await measure(client, path, args.requests)
+        off, on = medians[False], medians[True]
+        print(f"/emails mediana sin métricas {off * 1e6:7.0f} µs, con métricas {on * 1e6:7.0f} µs "
+              f"({(on - off) * 1e6:+.0f} µs, {(on - off) / off * 100:+.1f}%)")
+
+        started = time.perf_counter()
+        response = await client.get("/metrics")
+        render_ms = (time.perf_counter() - started) * 1000
+        lines = response.text.splitlines()
+        print(f"/metrics {render_ms:.1f} ms, {len(response.content) / 1024:.1f} KiB, "
+              f"{sum(1 for line in lines if not line.startswith('#'))} series")
+        if args.show:
+            print("\n".join(line for line in lines if not line.startswith("#") and "_bucket" not in line))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--show", action="store_true", help="imprime las series (sin buckets)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
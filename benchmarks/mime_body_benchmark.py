@@ -0,0 +1,123 @@
+"""
+Micro-benchmark de extracción del body sobre mensajes multipart muy anidados.
+
+- antes: la get_message_body anterior (recursiva, decodifica cada parte de texto
+  que encuentra y asume UTF-8 estricto)
+- después: get_message_body (un solo recorrido iterativo, decodifica solo la
+  parte elegida y respeta el charset)
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.mime_body_benchmark --messages 500 --depth 12
+"""
+import argparse
+import base64
+import time
+
+from app.gmail.gmail_service import get_message_body
+
+
+def legacy_get_message_body(message):
+    def extract(parts):
+        for part in parts:
+            mime_type = part.get("mimeType", "")
+            if mime_type == "text/plain":
+                data = part.get("body", {}).get("data")
+                if data:
+                    return base64.urlsafe_b64decode(data).decode("utf-8")
+            if mime_type == "text/html":
+                data = part.get("body", {}).get("data")
+                if data:
+                    return base64.urlsafe_b64decode(data).decode("utf-8")
+            if part.get("parts"):
+                result = extract(part["parts"])
+                if result:
+                    return result
+        return ""
+
+    payload = message.get("payload", {})
+    if payload.get("body", {}).get("data"):
+        return base64.urlsafe_b64decode(payload["body"]["data"]).decode("utf-8")
+    return extract(payload.get("parts", []))
+
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def text_part(mime_type, text, charset="utf-8"):
+    return {
+        "mimeType": mime_type,
+        "headers": [{"name": "Content-Type", "value": f'{mime_type}; charset="{charset}"'}],
+        "body": {"data": _b64(text.encode(charset))},
+    }
+
+
+def attachment_part(i, size):
+    # Como en Gmail: los adjuntos llegan con attachmentId y sin data
+    return {
+        "mimeType": "application/pdf",
+        "filename": f"adjunto{i}.pdf",
+        "headers": [{"name": "Content-Disposition", "value": f'attachment; filename="adjunto{i}.pdf"'}],
+        "body": {"attachmentId": f"att{i}", "size": size},
+    }
+
+
+def nested_message(i, depth, charset):
+    """multipart/mixed anidado `depth` niveles, con un adjunto en cada nivel."""
+    body = f"Reunión el jueves a las 10:00 para revisar el presupuesto ({i}). Saludos, Begoña."
+    leaf = {
+        "mimeType": "multipart/alternative",
+        "parts": [
+            text_part("text/plain", body, charset),
+            text_part("text/html", f"<p>{body}</p>" * 50, charset),
+        ],
+    }
+    for level in range(depth):
+        leaf = {
+            "mimeType": "multipart/mixed" if level % 2 else "multipart/related",
+            "parts": [attachment_part(level, 2048), leaf],
+        }
+    return {"id": f"m{i}", "payload": leaf}
+
+
+def run(fn, corpus):
+    errors = 0
+    start = time.perf_counter()
+    for message in corpus:
+        try:
+            fn(message)
+        except UnicodeDecodeError:
+            errors += 1
+    return (time.perf_counter() - start) / len(corpus), errors
+
+
+def correct(fn, corpus):
+    ok = 0
+    for message in corpus:
+        try:
+            ok += "Begoña" in fn(message)
+        except UnicodeDecodeError:
+            pass
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--depth", type=int, default=12)
+    args = parser.parse_args()
+
+    corpus = [
+        nested_message(i, args.depth, "utf-8" if i % 4 else "iso-8859-1")
+        for i in range(args.messages)
+    ]
+
+    print(f"{args.messages} mensajes, profundidad {args.depth}, 25% en iso-8859-1")
+    for name, fn in (("antes", legacy_get_message_body), ("después", get_message_body)):
+        per_message, errors = run(fn, corpus)
+        print(f"{name:<8} {per_message * 1e6:8.1f} µs/mensaje  "
+              f"errores de decodificación: {errors:4d}  bodies correctos: {correct(fn, corpus)}")
+
+
+if __name__ == "__main__":
+    main()
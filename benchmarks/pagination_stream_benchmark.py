@@ -0,0 +1,77 @@
+"""
+Página completa (JSON) frente a streaming (NDJSON) de /emails.
+
+Contra el servidor stub de Gmail con transporte async: mide el tiempo hasta
+el primer correo, el tiempo total y el pico de memoria Python al servir una
+página grande sin nada en el almacén local.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.pagination_stream_benchmark --page-size 500
+"""
+import argparse
+import asyncio
+import os
+import time
+import tracemalloc
+
+# Sin el planificador de cuota: este benchmark no la mide (ver quota_benchmark)
+os.environ.setdefault("GOOGLE_QUOTA_ENABLED", "0")
+
+from app.auth import async_http  # noqa: E402
+from app.gmail.message_store import (  # noqa: E402
+    MessageStore,
+    iter_page_messages,
+    list_messages_page,
+    open_message_page,
+)
+from benchmarks.fake_gmail import FakeGmailApi, build_fake_gmail_service, stub_gmail_server_process  # noqa: E402
+
+
+async def page_json(service, page_size):
+    start = time.perf_counter()
+    messages, _ = await list_messages_page(service, MessageStore(":memory:"), page_size=page_size)
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed, len(messages)
+
+
+async def page_stream(service, page_size):
+    store = MessageStore(":memory:")
+    start = time.perf_counter()
+    first = None
+    count = 0
+    ids, _ = await open_message_page(service, store, page_size=page_size)
+    async for _ in iter_page_messages(service, store, ids):
+        if first is None:
+            first = time.perf_counter() - start
+        count += 1
+    return first, time.perf_counter() - start, count
+
+
+async def run(args):
+    async_http.ASYNC_TRANSPORT = True
+    print(f"página de {args.page_size} mensajes, latencia stub {args.latency * 1000:.0f} ms")
+    print(f"{'modo':<8} {'1er correo (ms)':>16} {'total (ms)':>11} {'pico mem (KB)':>14}")
+    with stub_gmail_server_process(latency=args.latency, per_item=0) as url:
+        service = build_fake_gmail_service(FakeGmailApi(), root_url=url)
+        for name, fn in (("json", page_json), ("ndjson", page_stream)):
+            await fn(service, 20)  # calentamiento (conexiones)
+            first, total, count = await fn(service, args.page_size)
+            assert count == args.page_size
+            # Memoria en una pasada aparte: tracemalloc ralentiza mucho
+            tracemalloc.start()
+            await fn(service, args.page_size)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{name:<8} {first * 1000:>16.1f} {total * 1000:>11.1f} {peak / 1000:>14.0f}")
+    await async_http.close_async_http_client()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Reducción de tokens y rendimiento del preprocesado de bodies.
+
+Usa un corpus sintético (newsletters HTML, respuestas con historial citado,
+cadenas de Outlook, firmas, logs largos) o un directorio con ficheros .txt/.html.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.preprocessing_benchmark --copies 200
+    python -m benchmarks.preprocessing_benchmark --corpus ruta/a/correos
+"""
+import argparse
+import os
+import pathlib
+import time
+
+from app.ai.body_preprocessing import ANALYSIS_BODY_TOKEN_BUDGET, preprocess_email_body
+
+PARAGRAPH = (
+    "Te escribo para confirmar los detalles de la entrega del proyecto. "
+    "Necesitamos revisar el presupuesto y cerrar la fecha de la reunión con el cliente. "
+)
+
+
+def html_newsletter(i):
+    rows = "".join(
+        f'<tr><td style="padding:8px;font-family:Arial">&nbsp;<a href="https://example.com/p/{n}">'
+        f"Oferta {n}</a>&nbsp;&nbsp;-&nbsp;{PARAGRAPH}</td></tr>"
+        for n in range(12)
+    )
+    return (
+        "<html><head><style>td{color:#333;font-size:14px}" + "x{}" * 200 + "</style></head>"
+        f'<body><div class="container"><h1>Newsletter {i}</h1><table>{rows}</table>'
+        "<script>trackOpen();</script></div></body></html>"
+    )
+
+
+def gmail_html_reply(i):
+    quoted = "<br>".join(PARAGRAPH for _ in range(8))
+    return (
+        f"<div dir=\"ltr\">Hola, perfecto para el jueves ({i}).<br><br>Gracias</div>"
+        '<div class="gmail_quote"><div class="gmail_attr">El lun, 12 oct 2026 a las 9:00, '
+        f"Ana escribió:<br></div><blockquote>{quoted}<blockquote>{quoted}</blockquote>"
+        "</blockquote></div>"
+    )
+
+
+def plain_reply_chain(i):
+    quoted = "\n".join(f"> {PARAGRAPH}" for _ in range(10))
+    return (
+        f"Vale, lo vemos el jueves {i}.\n\n\n   Un saludo,   Pedro\n\n-- \nPedro Pérez\n"
+        "Director de proyectos\nTel. 600 000 000\n\n"
+        f"El lun, 12 oct 2026 a las 9:00, Ana <ana@example.com> escribió:\n{quoted}\n"
+    )
+
+
+def outlook_chain(i):
+    older = "\n".join(PARAGRAPH for _ in range(10))
+    return (
+        f"Adjunto la factura {i}.\r\n\r\nEnviado desde mi iPhone\r\n\r\n"
+        "De: Ana <ana@example.com>\r\nEnviado: lunes, 12 de octubre de 2026 9:00\r\n"
+        f"Para: Pedro\r\nAsunto: Factura\r\n\r\n{older}\r\n"
+    )
+
+
+def long_log(i):
+    return f"Os paso el log del error {i}:\n" + "\n".join(
+        f"2026-10-18 10:{n % 60:02d}:00 ERROR worker-{n} timeout after 30s" for n in range(3000)
+    )
+
+
+def synthetic_corpus(copies):
+    generators = (html_newsletter, gmail_html_reply, plain_reply_chain, outlook_chain, long_log)
+    return [gen(i) for i in range(copies) for gen in generators]
+
+
+def load_corpus(path):
+    return [
+        p.read_text(encoding="utf-8", errors="replace")
+        for p in sorted(pathlib.Path(path).iterdir())
+        if p.suffix in (".txt", ".html", ".eml")
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", help="directorio con correos .txt/.html")
+    parser.add_argument("--copies", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=ANALYSIS_BODY_TOKEN_BUDGET)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.copies)
+    total_bytes = sum(len(body.encode("utf-8")) for body in corpus)
+
+    original = reduced = 0
+    start = time.perf_counter()
+    for body in corpus:
+        result = preprocess_email_body(body, token_budget=args.budget)
+        original += result["original_tokens"]
+        reduced += result["reduced_tokens"]
+    elapsed = time.perf_counter() - start
+
+    print(f"correos        : {len(corpus)} ({total_bytes / 1e6:.1f} MB, budget {args.budget} tokens)")
+    print(f"tokens         : {original} -> {reduced} (reducción {1 - reduced / original:.1%})")
+    print(f"rendimiento    : {len(corpus) / elapsed:,.0f} correos/s, "
+          f"{total_bytes / 1e6 / elapsed:.1f} MB/s")
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    main()
@@ -0,0 +1,114 @@
+"""
+Coste del profiling por petición (app/observability/profiling.py) y
+ejemplo de perfil de /emails.
+
+Con la API de Gmail falsa en proceso (`--latency` por petición) y el
+almacén ya caliente:
+- apagado: /emails alternando petición a petición entre el middleware en
+  paso directo (sin PROFILING_ADMIN_TOKEN) y con token pero sin pedir
+  perfil, que es lo que paga cualquier petición normal: medianas
+- encendido: /emails con ?profile=1 frente a sin él
+- resumen del último perfil: muestras por hilo y funciones hoja más vistas
+  pidiendo también el body (descarga y decodificación de los cuerpos)
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.profiling_benchmark --requests 2000 --profiled 50
+"""
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter
+
+os.environ.setdefault("MESSAGE_STORE_PATH", ":memory:")
+os.environ.setdefault("ANALYSIS_CACHE_PATH", ":memory:")
+os.environ["ANALYSIS_WORKER_ENABLED"] = "0"
+os.environ["GOOGLE_ASYNC_TRANSPORT"] = "0"
+os.environ["PROFILING_ADMIN_TOKEN"] = "benchmark-token"
+
+import httpx  # noqa: E402
+
+import app.main as main  # noqa: E402
+from app.observability import profiling  # noqa: E402
+from benchmarks.fake_gmail import FakeGmailApi, build_fake_gmail_service  # noqa: E402
+
+ADMIN = {"X-Admin-Token": "benchmark-token"}
+
+
+async def alternate(client, requests, first, second):
+    """Alterna petición a petición: el ruido afecta a ambos por igual."""
+    elapsed = ([], [])
+    for i in range(requests):
+        which = i % 2
+        path, headers, token = (first, second)[which]
+        profiling.PROFILING_ADMIN_TOKEN = token
+        started = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        elapsed[which].append(time.perf_counter() - started)
+        response.raise_for_status()
+    profiling.PROFILING_ADMIN_TOKEN = "benchmark-token"
+    return [sorted(values)[len(values) // 2] for values in elapsed]
+
+
+def summarize(collapsed, top):
+    threads, leaves = Counter(), Counter()
+    for line in collapsed.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        frames = stack.split(";")
+        threads[frames[0]] += int(count)
+        leaves[frames[-1]] += int(count)
+    total = sum(threads.values()) or 1
+    for name, count in threads.most_common():
+        print(f"  {count / total:6.1%}  hilo {name}")
+    print("  funciones hoja:")
+    for name, count in leaves.most_common(top):
+        print(f"  {count / total:6.1%}  {name}")
+
+
+async def run(args):
+    api = FakeGmailApi(latency=args.latency)
+    service = build_fake_gmail_service(api)
+    main.get_gmail_service = lambda: service
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+        path = f"/emails?page_size={args.page_size}"
+        (await client.get(path)).raise_for_status()
+
+        off, idle = await alternate(client, args.requests, (path, {}, None), (path, {}, "benchmark-token"))
+        print(f"apagado   /emails mediana sin token {off * 1e6:6.0f} µs, con token sin perfil "
+              f"{idle * 1e6:6.0f} µs ({(idle - off) * 1e6:+.0f} µs)")
+
+        plain, profiled = await alternate(
+            client, args.profiled * 2, (path, {}, "benchmark-token"), (path + "&profile=1", ADMIN, "benchmark-token")
+        )
+        print(f"encendido /emails mediana {plain * 1000:.2f} ms, con ?profile=1 {profiled * 1000:.2f} ms "
+              f"({(profiled - plain) / plain * 100:+.1f}%)")
+
+        # Con body: descarga y decodificación de los cuerpos, que aún no están en el almacén
+        response = await client.get(path + "&fields=id,subject,body&profile=1", headers=ADMIN)
+        profile_id = response.headers["x-profile-id"]
+        info = (await client.get("/admin/profiles", headers=ADMIN)).json()["profiles"][0]
+        collapsed = (await client.get(f"/admin/profiles/{profile_id}", headers=ADMIN)).text
+        print(f"perfil {profile_id}: {info['route']} {info['duration_ms']} ms, {info['samples']} muestras, "
+              f"{len(collapsed.splitlines())} pilas distintas")
+        summarize(collapsed, args.top)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(collapsed)
+            print(f"pilas guardadas en {args.output} (speedscope / flamegraph.pl)")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--profiled", type=int, default=50)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--output", help="guarda el último perfil en este fichero")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
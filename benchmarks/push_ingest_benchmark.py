@@ -0,0 +1,124 @@
+"""
+Correo nuevo visible para el cliente: polling del historial vs push de Pub/Sub.
+
+Con la API de Gmail falsa llegan `--messages` correos en `--duration` segundos:
+- polling: sync_message_store cada `--poll-interval` segundos (como el poller)
+- push: por cada correo el publicador local (benchmarks/fake_pubsub.py) llama
+  a POST /gmail/push de la app (en proceso, vía ASGI) con `--pubsub-latency`
+
+Mide el tiempo desde la llegada del correo hasta el evento SSE "mailbox" que
+lo anuncia, y las llamadas a history.list.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.push_ingest_benchmark --messages 40 --duration 20 --poll-interval 5
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+os.environ.setdefault("MESSAGE_STORE_PATH", ":memory:")
+os.environ.setdefault("ANALYSIS_CACHE_PATH", ":memory:")
+os.environ["ANALYSIS_WORKER_ENABLED"] = "0"
+os.environ["GOOGLE_ASYNC_TRANSPORT"] = "0"
+# El webhook solo acepta notificaciones con el push activado y el token correcto
+os.environ["GMAIL_PUSH_TOPIC"] = "projects/local/topics/gmail"
+os.environ["GMAIL_PUSH_VERIFICATION_TOKEN"] = "benchmark-token"
+
+import httpx  # noqa: E402
+
+import app.main as app_main  # noqa: E402
+from app.gmail import gmail_push_service  # noqa: E402
+from app.gmail.gmail_push_service import PushIngestor  # noqa: E402
+from app.gmail.mailbox_events import get_mailbox_events  # noqa: E402
+from app.gmail.message_store import full_resync, get_message_store, sync_message_store  # noqa: E402
+from benchmarks.fake_gmail import FakeGmailApi, build_fake_gmail_service  # noqa: E402
+from benchmarks.fake_pubsub import FakePubSubPublisher  # noqa: E402
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run(mode, args):
+    api = FakeGmailApi(latency=args.latency, per_item=0)
+    service = build_fake_gmail_service(api)
+    store = get_message_store()
+    await full_resync(service, store)
+
+    hub = get_mailbox_events()
+    queue = hub.subscribe()
+    delivered_at, visible_at = {}, {}
+
+    async def consume():
+        while len(visible_at) < args.messages:
+            event = await queue.get()
+            now = time.monotonic()
+            for message_id in event["added"]:
+                visible_at.setdefault(message_id, now)
+
+    transport = httpx.ASGITransport(app=app_main.app)
+    client = httpx.AsyncClient(transport=transport, base_url="http://app")
+    publisher = FakePubSubPublisher(
+        "/gmail/push", token="benchmark-token", client=client,
+        latency=args.pubsub_latency, duplicate_rate=0.1,
+    )
+    gmail_push_service._ingestor = PushIngestor(store, get_service=lambda: service)
+
+    async def poll():
+        while True:
+            await asyncio.sleep(args.poll_interval)
+            await sync_message_store(service, store)
+
+    consumer = asyncio.create_task(consume())
+    poller = asyncio.create_task(poll()) if mode == "polling" else None
+    pushes = []
+
+    rng = random.Random(1)
+    arrivals = sorted(rng.uniform(0, args.duration) for _ in range(args.messages))
+    start = time.monotonic()
+    for i, at in enumerate(arrivals):
+        await asyncio.sleep(max(0, start + at - time.monotonic()))
+        message_id = f"new{i}"
+        history_id = api.deliver(message_id)
+        delivered_at[message_id] = time.monotonic()
+        if mode == "push":
+            pushes.append(asyncio.create_task(publisher.publish("me@example.com", history_id)))
+
+    await asyncio.wait_for(consumer, args.poll_interval + 10)
+    await asyncio.gather(*pushes)
+    if poller:
+        poller.cancel()
+    hub.unsubscribe(queue)
+    await client.aclose()
+
+    latencies = [visible_at[mid] - delivered_at[mid] for mid in delivered_at]
+    print(f"{mode:<8} media {sum(latencies) / len(latencies) * 1000:7.0f} ms  "
+          f"p50 {percentile(latencies, 50) * 1000:7.0f} ms  p99 {percentile(latencies, 99) * 1000:7.0f} ms  "
+          f"history.list {api.calls['history.list']:3d}  notificaciones {publisher.sent:3d}")
+
+
+async def run_all(args):
+    # Un único event loop: el almacén y el planificador de cuota guardan primitivas asyncio
+    for mode in ("polling", "push"):
+        await run(mode, args)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=40)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--poll-interval", type=float, default=5)
+    parser.add_argument("--pubsub-latency", type=float, default=0.2)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    print(f"{args.messages} correos en {args.duration}s; polling cada {args.poll_interval}s, "
+          f"Pub/Sub con {args.pubsub_latency}s de latencia y 10% de duplicados")
+    asyncio.run(run_all(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Ráfaga de llamadas a Gmail contra una API falsa que aplica la cuota por
+usuario (250 unidades/s) y responde 429 rateLimitExceeded al superarla.
+
+- sin planificador: cada llamada sale en cuanto puede y no se reintenta
+- con planificador: token bucket con el coste de cada método, backoff ante
+  429 y prioridad de las llamadas interactivas sobre las de fondo
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.quota_benchmark --background 300 --interactive 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from googleapiclient.errors import HttpError
+
+from app.auth import async_http, quota
+from app.auth.async_http import execute_async
+from benchmarks.fake_gmail import FakeGmailApi, build_fake_gmail_service
+
+
+async def timed_call(request, latencies, failures):
+    start = time.perf_counter()
+    try:
+        await execute_async(request)
+    except HttpError:
+        failures.append(1)
+    latencies.append(time.perf_counter() - start)
+
+
+async def scenario(args, scheduled):
+    quota.QUOTA_ENABLED = scheduled
+    async_http.RATE_LIMIT_MAX_RETRIES = quota.RATE_LIMIT_MAX_RETRIES if scheduled else 0
+    quota._scheduler = quota.QuotaScheduler()
+
+    api = FakeGmailApi(latency=args.latency, per_item=0, quota_per_second=args.quota)
+    service = build_fake_gmail_service(api)
+    background, interactive = [], []
+    bg_failures, it_failures = [], []
+
+    async def background_burst():
+        with quota.background_priority():
+            await asyncio.gather(*(
+                timed_call(service.users().messages().get(userId="me", id=f"m{i}"), background, bg_failures)
+                for i in range(args.background)
+            ))
+
+    async def interactive_clicks():
+        for i in range(args.interactive):
+            await asyncio.sleep(args.click_interval)
+            await timed_call(service.users().getProfile(userId="me"), interactive, it_failures)
+
+    start = time.perf_counter()
+    await asyncio.gather(background_burst(), interactive_clicks())
+    elapsed = time.perf_counter() - start
+    return elapsed, background, interactive, len(bg_failures), len(it_failures), api.rate_limited
+
+
+async def run(args):
+    # API falsa en proceso: transporte bloqueante en el threadpool
+    async_http.ASYNC_TRANSPORT = False
+    print(f"{args.background} messages.get de fondo + {args.interactive} getProfile interactivos, "
+          f"cuota {args.quota:.0f} unidades/s")
+    print(f"{'modo':<15} {'total (s)':>9} {'429s':>5} {'fallos fondo':>13} {'fallos inter.':>14} "
+          f"{'p50 inter. (ms)':>16}")
+    for name, scheduled in (("sin scheduler", False), ("con scheduler", True)):
+        elapsed, _, interactive, bg_fail, it_fail, limited = await scenario(args, scheduled)
+        p50 = statistics.median(interactive) * 1000
+        print(f"{name:<15} {elapsed:>9.2f} {limited:>5} {bg_fail:>13} {it_fail:>14} {p50:>16.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--background", type=int, default=300)
+    parser.add_argument("--interactive", type=int, default=20)
+    parser.add_argument("--click-interval", type=float, default=0.2)
+    parser.add_argument("--quota", type=float, default=250)
+    parser.add_argument("--latency", type=float, default=0.02)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
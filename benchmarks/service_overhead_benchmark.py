@@ -0,0 +1,67 @@
+"""
+Coste por petición de obtener el cliente de Gmail.
+
+- antes: leer token.json + build() del discovery en cada petición
+- después: get_gmail_service() con credenciales en memoria y cliente cacheado
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.service_overhead_benchmark --iterations 200
+"""
+import argparse
+import datetime
+import json
+import os
+import tempfile
+import time
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+
+from app.auth import google_auth
+
+
+def write_fake_token(path):
+    expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    with open(path, "w") as f:
+        json.dump({
+            "token": "fake-access-token",
+            "refresh_token": "fake-refresh-token",
+            "client_id": "fake-client-id",
+            "client_secret": "fake-client-secret",
+            "token_uri": "https://oauth2.googleapis.com/token",
+            "scopes": google_auth.SCOPES,
+            "expiry": expiry.isoformat() + "Z",
+        }, f)
+
+
+def uncached_service():
+    creds = Credentials.from_authorized_user_file(google_auth.TOKEN_PATH, google_auth.SCOPES)
+    return build("gmail", "v1", credentials=creds)
+
+
+def measure(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        google_auth.TOKEN_PATH = os.path.join(tmp, "token.json")
+        write_fake_token(google_auth.TOKEN_PATH)
+
+        before = measure(uncached_service, args.iterations)
+        after = measure(google_auth.get_gmail_service, args.iterations)
+
+    print(f"antes   : {before * 1000:8.3f} ms/petición")
+    print(f"después : {after * 1000:8.3f} ms/petición")
+    print(f"mejora  : {before / after:8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Sugerencia de huecos libres (app/calendar/slot_finder.py) con agendas densas.
+
+- algoritmo: barrido (merge_busy + free_slots) frente a probar cada hueco
+  candidato de 15 min contra todos los intervalos de todos los asistentes
+- extremo a extremo: suggest_slots contra la API de Calendar falsa
+  (benchmarks/fake_calendar.py), una sola freebusy.query
+
+Las agendas están casi llenas para que los primeros huecos libres queden
+al final del horizonte (el peor caso para la búsqueda).
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.slot_suggestion_benchmark --attendees 30 --days 28 --count 5
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime
+
+os.environ["GOOGLE_ASYNC_TRANSPORT"] = "0"
+
+from app.calendar.busy_cache import TIMEZONE  # noqa: E402
+from app.calendar.slot_finder import free_slots, merge_busy, suggest_slots, working_windows  # noqa: E402
+from benchmarks.fake_calendar import FakeCalendarApi, build_fake_calendar_service  # noqa: E402
+
+STEP = 15 * 60
+
+
+def synthetic_calendars(attendees, start, days, free_days=3, per_day=6, seed=0):
+    """
+    Cada asistente tiene `per_day` reuniones de 30-120 min al día entre las 8 y las 19.
+    Solo en los `free_days` últimos días todos respetan una franja común libre.
+    """
+    rng = random.Random(seed)
+    first_day = datetime.fromtimestamp(start, TIMEZONE).date()
+    shared_free = {}
+    for offset in range(days - free_days, days):
+        hour = rng.randrange(9, 16)
+        shared_free[offset] = (hour * 3600, (hour + rng.choice((1, 2))) * 3600)
+
+    calendars = []
+    for _ in range(attendees):
+        busy = []
+        for offset in range(days):
+            day = first_day.toordinal() + offset
+            midnight = TIMEZONE.localize(datetime.fromordinal(day)).timestamp()
+            for _ in range(per_day):
+                begin = rng.randrange(8 * 3600, 19 * 3600, STEP)
+                length = rng.choice((30, 45, 60, 90, 120)) * 60
+                free = shared_free.get(offset)
+                if free and begin < free[1] and begin + length > free[0]:
+                    continue
+                busy.append((midnight + begin, midnight + begin + length))
+        busy.sort()
+        calendars.append(busy)
+    return calendars
+
+
+def naive_slots(calendars, windows, duration, count):
+    intervals = [interval for busy in calendars for interval in busy]
+    slots = []
+    for window_start, window_end in windows:
+        cursor = -(-window_start // STEP) * STEP
+        while cursor + duration <= window_end:
+            if all(end <= cursor or start >= cursor + duration for start, end in intervals):
+                slots.append((cursor, cursor + duration))
+                if len(slots) == count:
+                    return slots
+                cursor += duration
+            else:
+                cursor += STEP
+    return slots
+
+
+def bench_algorithm(args):
+    start = TIMEZONE.localize(datetime(2026, 11, 2, 0, 0)).timestamp()
+    end = start + args.days * 86400
+    calendars = synthetic_calendars(args.attendees, start, args.days)
+    total = sum(len(busy) for busy in calendars)
+    duration = args.duration * 60
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        fast = free_slots(merge_busy(calendars), working_windows(start, end), duration, args.count)
+    fast_ms = (time.perf_counter() - started) / args.repeat * 1000
+
+    started = time.perf_counter()
+    slow = naive_slots(calendars, list(working_windows(start, end)), duration, args.count)
+    slow_ms = (time.perf_counter() - started) * 1000
+
+    assert fast == slow, f"El barrido no coincide con la búsqueda ingenua: {fast} != {slow}"
+    first = datetime.fromtimestamp(fast[0][0], TIMEZONE).strftime("%a %d %H:%M") if fast else "-"
+    print(f"algoritmo {args.attendees} agendas, {total} intervalos en {args.days} días: "
+          f"barrido {fast_ms:.2f} ms, ingenuo {slow_ms:.0f} ms; {len(fast)} huecos idénticos (primero {first})")
+
+
+async def bench_api(args):
+    api = FakeCalendarApi(latency=args.latency)
+    api.populate(args.days * 6, args.days, seed=1)
+    now = time.time()
+    attendees = [f"persona{i}@example.com" for i in range(args.attendees)]
+    for email, busy in zip(attendees, synthetic_calendars(args.attendees, now, args.days)):
+        for interval in busy:
+            api.add_busy(email, *interval)
+    service = build_fake_calendar_service(api)
+
+    started = time.perf_counter()
+    result = await suggest_slots(service, args.duration, attendees + ["externo@otra.org"],
+                                 days=args.days, count=args.count)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    first = result["slots"][0]["start"] if result["slots"] else "-"
+    print(f"API       {elapsed_ms:.0f} ms, freebusy.query {api.calls['freebusy.query']}, "
+          f"{len(result['slots'])} huecos (primero {first}), sin acceso: {list(result['unavailable_calendars'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--attendees", type=int, default=30)
+    parser.add_argument("--days", type=int, default=28)
+    parser.add_argument("--duration", type=int, default=60)
+    parser.add_argument("--count", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    bench_algorithm(args)
+    asyncio.run(bench_api(args))
+
+
+if __name__ == "__main__":
+    main()
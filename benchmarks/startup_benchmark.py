@@ -0,0 +1,92 @@
+"""
+Informe de arranque en frío basado en `python -X importtime`.
+
+Lanza `--runs` intérpretes nuevos que importan app.main (sin GEMINI_API_KEY
+ni token), mide el tiempo total de cada proceso y el tiempo de import de
+app.main, y lista los imports directos de app.main que más pesan.
+Sale con código 1 si la mediana del import supera `--target-ms`
+(STARTUP_TARGET_MS), para poder usarlo como control en CI.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.startup_benchmark --runs 5 --target-ms 1000
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+STARTUP_TARGET_MS = float(os.environ.get("STARTUP_TARGET_MS", "1000"))
+
+
+def parse_importtime(stderr):
+    """
+    [(profundidad, módulo, self_us, acumulado_us)] de la salida de -X importtime:
+    "import time:  self |  acumulado | <2 espacios por nivel>módulo"
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def run_once(module):
+    env = {k: v for k, v in os.environ.items() if k != "GEMINI_API_KEY"}
+    env.setdefault("MESSAGE_STORE_PATH", ":memory:")
+    env.setdefault("ANALYSIS_CACHE_PATH", ":memory:")
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-W", "ignore", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    wall = time.perf_counter() - start
+    rows = parse_importtime(result.stderr)
+    total = next(cumulative for _, name, _, cumulative in rows if name == module)
+    return wall, total, rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=12)
+    parser.add_argument("--target-ms", type=float, default=STARTUP_TARGET_MS)
+    args = parser.parse_args()
+
+    runs = [run_once(args.module) for _ in range(args.runs)]
+    wall = statistics.median(r[0] for r in runs) * 1000
+    total = statistics.median(r[1] for r in runs) / 1000
+
+    # Imports directos del módulo (profundidad 1 bajo él), de la última ejecución
+    # importtime escribe cada módulo al terminar de importarlo: sus hijos son
+    # las filas anteriores hasta volver a su profundidad
+    _, _, rows = runs[-1]
+    root = next(i for i, row in enumerate(rows) if row[1] == args.module)
+    root_depth = rows[root][0]
+    children = []
+    for depth, name, _, cumulative in reversed(rows[:root]):
+        if depth <= root_depth:
+            break
+        if depth == root_depth + 1:
+            children.append((name, cumulative))
+    children.sort(key=lambda row: row[1], reverse=True)
+
+    print(f"{args.module}: proceso completo {wall:.0f} ms, import {total:.0f} ms "
+          f"(mediana de {args.runs}), objetivo {args.target_ms:.0f} ms")
+    print(f"{'import directo':<45} {'acumulado (ms)':>15}")
+    for name, cumulative in children[:args.top]:
+        print(f"{name:<45} {cumulative / 1000:>15.1f}")
+
+    if total > args.target_ms:
+        print(f"❌ el import de {args.module} supera el objetivo de {args.target_ms:.0f} ms")
+        sys.exit(1)
+    print("✅ dentro del objetivo")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Tiempo hasta el primer campo útil: análisis normal vs streaming.
+
+Con el backend LLM fake (FakeLlmBackend, determinista) compara
+analyze_email_structured (hay que esperar la respuesta entera) con
+analyze_email_stream (cada campo sale en cuanto el parser incremental lo cierra).
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.streaming_analysis_benchmark --runs 5
+"""
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault("ANALYSIS_CACHE_PATH", ":memory:")
+
+from app.ai import email_analysis_service  # noqa: E402
+from app.ai.llm_backends import FakeLlmBackend, set_llm_backend  # noqa: E402
+
+USEFUL_FIELDS = ("summary", "is_important")
+
+
+def measure_blocking(body):
+    start = time.perf_counter()
+    email_analysis_service.analyze_email_structured(body)
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed, elapsed
+
+
+def measure_stream(body):
+    start = time.perf_counter()
+    first = useful = None
+    pending = set(USEFUL_FIELDS)
+    for kind, *payload in email_analysis_service.analyze_email_stream(body):
+        now = time.perf_counter() - start
+        if kind != "field":
+            continue
+        if first is None:
+            first = now
+        pending.discard(payload[0])
+        if useful is None and not pending:
+            useful = now
+    return first, useful, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    args = parser.parse_args()
+
+    set_llm_backend(FakeLlmBackend(latency=args.first_token_latency, token_delay=args.token_delay))
+
+    print(f"{'modo':<10} {'1er campo (ms)':>15} {'summary+is_important (ms)':>26} {'total (ms)':>11}")
+    for name, measure in (("normal", measure_blocking), ("stream", measure_stream)):
+        # Un body distinto por ejecución para no tocar la cache de análisis
+        rows = [measure(f"Correo {name} {i}: ¿revisamos el presupuesto el jueves?")
+                for i in range(args.runs)]
+        first, useful, total = (statistics.median(col) * 1000 for col in zip(*rows))
+        print(f"{name:<10} {first:>15.1f} {useful:>26.1f} {total:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
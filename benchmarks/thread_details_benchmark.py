@@ -0,0 +1,59 @@
+"""
+Coste de abrir un correo (GET /emails/{id}) en un hilo con varias respuestas.
+
+- antes: messages.get(format=full) + threads.get(format=full) en cada apertura
+- después: body desde el almacén + un threads.get(format=metadata) cacheado;
+  reabrir el hilo solo cuesta un history.list (por si ha llegado una respuesta)
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.thread_details_benchmark --thread-size 6 --html-size 20000
+"""
+import argparse
+import asyncio
+import os
+
+# Sin el planificador de cuota: este benchmark no la mide (ver quota_benchmark)
+os.environ.setdefault("GOOGLE_QUOTA_ENABLED", "0")
+
+from app.auth import async_http  # noqa: E402
+from app.auth.async_http import execute_async  # noqa: E402
+from app.gmail.message_store import MessageStore, get_stored_message, get_thread_summary  # noqa: E402
+from benchmarks.fake_gmail import FakeGmailApi, build_fake_gmail_service  # noqa: E402
+
+
+async def open_legacy(service, store, message_id):
+    msg = await execute_async(service.users().messages().get(userId="me", id=message_id, format="full"))
+    await execute_async(service.users().threads().get(userId="me", id=msg["threadId"]))
+
+
+async def open_thread_aware(service, store, message_id):
+    msg = await get_stored_message(service, store, message_id)
+    await get_thread_summary(service, store, msg["threadId"])
+
+
+async def run(args):
+    async_http.ASYNC_TRANSPORT = False
+    print(f"hilo de {args.thread_size} mensajes, HTML de ~{args.html_size // 1000} KB, "
+          f"{args.opens} aperturas del mismo correo")
+    print(f"{'modo':<10} {'llamadas':>9} {'KB recibidos':>13}")
+    for name, open_fn in (("antes", open_legacy), ("después", open_thread_aware)):
+        api = FakeGmailApi(latency=0, per_item=0, html_size=args.html_size, thread_size=args.thread_size)
+        service = build_fake_gmail_service(api)
+        store = MessageStore(":memory:")
+        # Almacén ya sincronizado, como tras cargar la bandeja
+        store.set_history_id(api.history_id)
+        for _ in range(args.opens):
+            await open_fn(service, store, "m1")
+        print(f"{name:<10} {api.requests:>9} {api.bytes_sent / 1000:>13.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--thread-size", type=int, default=6)
+    parser.add_argument("--html-size", type=int, default=20000)
+    parser.add_argument("--opens", type=int, default=3)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
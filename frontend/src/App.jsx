@@ -155,14 +155,35 @@ function App() {
     // 1. Carga inicial
     loadEmails(true);
 
-    // 2. Refresh cada 60s
-    const intervalId = setInterval(() => {
-      loadEmails(false);
-    }, 60000);
+    // 2. Refresh cuando el backend avisa de cambios en el buzón (push o polling del historial)
+    const events = new EventSource(`${API}/gmail/events`);
+    events.addEventListener("mailbox", () => loadEmails(false));
+
+    // 3. Refresh de respaldo: cada 60 s mientras la conexión SSE no esté abierta
+    //    (o se haya caído) y cada 5 min cuando los cambios llegan por SSE
+    let sseLive = false;
+    let timeoutId;
+    const scheduleRefresh = () => {
+      clearTimeout(timeoutId);
+      timeoutId = setTimeout(() => {
+        loadEmails(false);
+        scheduleRefresh();
+      }, sseLive ? 300000 : 60000);
+    };
+    events.onopen = () => { sseLive = true; };
+    events.onerror = () => {
+      // Conexión caída: vuelve enseguida al intervalo corto
+      if (sseLive) {
+        sseLive = false;
+        scheduleRefresh();
+      }
+    };
+    scheduleRefresh();
 
     return () => {
       cancelled = true;
-      clearInterval(intervalId);
+      events.close();
+      clearTimeout(timeoutId);
     };
   }, [currentLabel]);
 
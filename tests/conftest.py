@@ -0,0 +1,9 @@
+import os
+
+# Antes de importar la app: almacenes en memoria, sin worker ni transporte real
+os.environ["MESSAGE_STORE_PATH"] = ":memory:"
+os.environ["ANALYSIS_CACHE_PATH"] = ":memory:"
+os.environ["ANALYSIS_WORKER_ENABLED"] = "0"
+os.environ["GOOGLE_ASYNC_TRANSPORT"] = "0"
+os.environ["GOOGLE_QUOTA_ENABLED"] = "0"
+os.environ["LLM_BACKEND"] = "fake"
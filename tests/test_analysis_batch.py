@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from app.ai import email_analysis_service
+from app.ai.email_analysis_service import analyze_emails_batch, parse_analysis_text
+from app.ai.llm_backends import FakeLlmBackend, set_llm_backend
+
+
+class BatchDropsEverything(FakeLlmBackend):
+    """Responde a los lotes con un array vacío: todo cae al fallback por correo."""
+
+    def render(self, prompt):
+        if '<EMAIL id="' in prompt:
+            return "[]"
+        return json.dumps(self.analysis)
+
+
+class AlwaysArray(FakeLlmBackend):
+    """Responde siempre con un array JSON, también a los prompts de un solo correo."""
+
+    def render(self, prompt):
+        return "[]"
+
+
+@pytest.fixture
+def backend():
+    backend = BatchDropsEverything(latency=0, token_delay=0)
+    set_llm_backend(backend)
+    yield backend
+    set_llm_backend(None)
+
+
+def test_item_fallback_preprocesses_once_and_shares_cache_key(backend, monkeypatch):
+    preprocessed = []
+    original = email_analysis_service.preprocess_email_body
+
+    def counting(body):
+        preprocessed.append(body)
+        return original(body)
+
+    monkeypatch.setattr(email_analysis_service, "preprocess_email_body", counting)
+    emails = [
+        {"id": "a", "body": "<p>Hola, ¿nos vemos el martes a las 10?</p>"},
+        {"id": "b", "body": "Factura de octubre adjunta.\n\n-- \nFirma de empresa"},
+    ]
+
+    first = analyze_emails_batch(emails)
+    assert set(first) == {"a", "b"} and all("summary" in r for r in first.values())
+    assert len(preprocessed) == 2
+    # 1 llamada de lote + 1 por correo en el fallback
+    assert backend.calls == 3
+
+    # El fallback guardó en la cache con la misma clave que mira el lote
+    assert analyze_emails_batch(emails) == first
+    assert backend.calls == 3
+
+
+@pytest.mark.parametrize("text", ["[]", "3", '"ok"', "null", "true"])
+def test_parse_analysis_text_rejects_non_object_json(text):
+    data, cacheable = parse_analysis_text(text)
+    assert isinstance(data, dict) and "summary" in data
+    assert data["raw_output"] == text
+    assert not cacheable
+
+
+def test_parse_analysis_text_unwraps_single_object_array():
+    data, cacheable = parse_analysis_text('[{"summary": "Reunión", "suggested_label": "Pagos"}]')
+    assert data["summary"] == "Reunión" and data["suggested_label"] == "facturas"
+    assert cacheable
+
+
+def test_array_reply_falls_back_without_caching():
+    backend = AlwaysArray(latency=0, token_delay=0)
+    set_llm_backend(backend)
+    try:
+        emails = [{"id": "a", "body": "Hola, ¿revisas el contrato?"}]
+        first = analyze_emails_batch(emails)
+        assert first["a"]["raw_output"] == "[]"
+        # No se cacheó: vuelve a preguntar (lote + fallback)
+        analyze_emails_batch(emails)
+        assert backend.calls == 4
+    finally:
+        set_llm_backend(None)
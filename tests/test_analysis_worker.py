@@ -0,0 +1,184 @@
+import asyncio
+import time
+from collections import deque
+
+import pytest
+
+from app.ai import analysis_worker
+from app.ai.analysis_worker import AnalysisWorker, RateLimiter, get_analysis_worker_status
+from app.ai.email_analysis_service import analyze_email_structured
+from app.ai.llm_backends import FakeLlmBackend, set_llm_backend
+from app.gmail import message_store
+from app.gmail.message_store import MessageStore
+from benchmarks.fake_gmail import fake_message
+
+
+@pytest.fixture
+def store():
+    store = MessageStore(":memory:")
+    for i in range(5):
+        store.save_message(fake_message(f"m{i}"))
+    return store
+
+
+@pytest.fixture
+def gemini():
+    backend = FakeLlmBackend(latency=0, token_delay=0)
+    set_llm_backend(backend)
+    yield backend
+    set_llm_backend(None)
+
+
+def make_worker(analyze_fn, store, get_service=lambda: None, **kwargs):
+    options = {"concurrency": 2, "per_minute": 1000, "max_attempts": 3, "backoff_seconds": 0.01}
+    options.update(kwargs)
+    return AnalysisWorker(analyze_fn, store=store, get_service=get_service, **options)
+
+
+def test_enqueue_deduplicates_ids(store, gemini):
+    async def scenario():
+        store.save_analysis("m4", {"summary": "ya analizado"})
+        worker = make_worker(analyze_email_structured, store)
+        worker.enqueue(["m0", "m1", "m0", "m4"])
+        worker.enqueue(["m1", "m2"])
+        assert worker.status()["backlog"] == 3
+
+        worker.start()
+        await worker.join()
+        await worker.stop()
+        return worker
+
+    worker = asyncio.run(scenario())
+    assert gemini.calls == 3
+    assert worker.status()["completed"] == 3
+    assert all(store.get_analysis(mid) for mid in ("m0", "m1", "m2"))
+
+
+def test_error_result_is_retried_with_backoff(store):
+    attempts = []
+
+    def flaky(email_text):
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            return {"summary": "Error analizando correo", "error": "429 Resource exhausted"}
+        return {"summary": email_text[:20]}
+
+    async def scenario():
+        worker = make_worker(flaky, store, backoff_seconds=0.05)
+        worker.start()
+        worker.enqueue(["m0"])
+        await worker.join()
+        await worker.stop()
+        return worker
+
+    worker = asyncio.run(scenario())
+    status = worker.status()
+    assert (status["completed"], status["retries"], status["failed"]) == (1, 2, 0)
+    # Backoff exponencial: 0.05 s y después 0.1 s
+    assert attempts[1] - attempts[0] >= 0.05
+    assert attempts[2] - attempts[1] >= 0.1
+    assert store.get_analysis("m0") == {"summary": "Hola, este es el cue"}
+
+
+def test_fetch_exception_is_retried_then_abandoned(store):
+    calls = []
+
+    def broken_service():
+        calls.append(1)
+        raise ConnectionError("503 Backend Error")
+
+    async def scenario():
+        # m9 no está en el almacén: get_stored_message tiene que ir a Gmail
+        worker = make_worker(lambda text: {"summary": text}, store, get_service=broken_service)
+        worker.start()
+        worker.enqueue(["m9"])
+        await worker.join()
+        await worker.stop()
+        return worker
+
+    worker = asyncio.run(scenario())
+    status = worker.status()
+    assert len(calls) == 3
+    assert (status["completed"], status["retries"], status["failed"]) == (0, 2, 1)
+    assert status["backlog"] == 0 and status["in_flight"] == 0
+
+
+def test_rate_limiter_blocks_over_per_minute():
+    async def scenario():
+        limiter = RateLimiter(per_minute=2)
+        await limiter.acquire()
+        await limiter.acquire()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire(), 0.05)
+
+        # Pasado un minuto desde las llamadas anteriores vuelve a haber hueco
+        limiter._calls = deque(t - 60 for t in limiter._calls)
+        await asyncio.wait_for(limiter.acquire(), 0.05)
+        return len(limiter._calls)
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_status_counts_backlog_and_in_flight(store):
+    release = asyncio.Event()
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+
+        def slow(email_text):
+            asyncio.run_coroutine_threadsafe(release.wait(), loop).result()
+            return {"summary": "ok"}
+
+        worker = make_worker(slow, store, concurrency=1)
+        worker.enqueue(["m0", "m1", "m2"])
+        before = worker.status()
+
+        worker.start()
+        while not worker.status()["in_flight"]:
+            await asyncio.sleep(0.01)
+        during = worker.status()
+
+        release.set()
+        await worker.join()
+        await worker.stop()
+        return before, during, worker.status()
+
+    before, during, after = asyncio.run(scenario())
+    assert (before["running"], before["backlog"], before["in_flight"]) == (False, 3, 0)
+    assert (during["running"], during["backlog"], during["in_flight"]) == (True, 2, 1)
+    assert (after["running"], after["backlog"], after["completed"]) == (False, 0, 3)
+
+
+def test_listener_only_while_started(store, monkeypatch):
+    monkeypatch.setattr(message_store, "_new_message_listeners", [])
+    monkeypatch.setattr(analysis_worker, "_worker", None)
+
+    # Leer el estado (p. ej. /metrics) no crea el worker ni registra el listener
+    assert get_analysis_worker_status()["running"] is False
+    assert analysis_worker._worker is None
+
+    async def scenario():
+        worker = make_worker(lambda text: {"summary": text}, store)
+        assert message_store._new_message_listeners == []
+        worker.start()
+        assert message_store._new_message_listeners == [worker.on_new_messages]
+        await worker.stop()
+        assert message_store._new_message_listeners == []
+
+    asyncio.run(scenario())
+
+
+def test_app_lifespan_runs_background_tasks_without_deprecated_events():
+    import warnings
+
+    from fastapi.testclient import TestClient
+
+    import app.main as main
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        with TestClient(main.app):
+            tasks = list(main._background_tasks)
+            assert tasks and not any(task.done() for task in tasks)
+    assert main._background_tasks == []
+    assert all(task.cancelled() for task in tasks)
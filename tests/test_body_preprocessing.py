@@ -0,0 +1,55 @@
+from app.ai.body_preprocessing import TRUNCATION_MARK, preprocess_email_body
+
+
+def text_of(body, **kwargs):
+    return preprocess_email_body(body, **kwargs)["text"]
+
+
+def test_plain_text_addresses_are_not_taken_for_html():
+    body = "Escribe a Pedro <p.smith@x> o a <a@b.com>.\nGracias"
+    assert text_of(body) == body
+
+
+def test_html_to_text_drops_tags_scripts_and_gmail_quote():
+    body = (
+        "<html><head><style>p {color: red}</style></head><body>"
+        "<p>Hola&nbsp;Ana,</p><div>¿Nos vemos el <b>martes</b>?<br>Un saludo</div>"
+        '<div class="gmail_quote">El lun, Ana escribió:<blockquote>Texto viejo</blockquote></div>'
+        '<a href="mailto:ana@example.com">ana@example.com</a>'
+        "</body></html>"
+    )
+    assert text_of(body) == "Hola Ana,\n\n¿Nos vemos el martes?\nUn saludo\n\nana@example.com"
+
+
+def test_reply_history_and_signatures_are_removed():
+    body = "\n".join([
+        "Confirmo la reunión.",
+        "> Cita en línea",
+        "",
+        "--",
+        "Ana Pérez | Finanzas",
+        "El lun, 3 oct 2024 a las 10:00, Luis <luis@example.com> escribió:",
+        "> mensaje anterior",
+    ])
+    assert text_of(body) == "Confirmo la reunión."
+
+    outlook = "Vale.\nEnviado desde mi iPhone\n\nDe: Luis\nEnviado: lunes\nPara: Ana\n\nHistorial"
+    assert text_of(outlook) == "Vale."
+
+    # Una línea que empieza por "De:" sin el resto de la cabecera se conserva
+    assert text_of("De: parte de Luis, gracias.\nHasta luego") == "De: parte de Luis, gracias.\nHasta luego"
+
+
+def test_only_quoted_history_falls_back_to_the_original():
+    body = "---------- Forwarded message ---------\nFactura de octubre adjunta"
+    assert text_of(body) == body
+
+
+def test_budget_truncates_on_a_word_boundary():
+    result = preprocess_email_body("uno dos tres cuatro cinco seis siete ocho", token_budget=5)
+    assert result["text"] == "uno dos tres cuatro" + TRUNCATION_MARK
+    assert result["reduced_tokens"] < result["original_tokens"]
+
+    # Varias líneas: se cuentan los saltos y la línea que no cabe se corta
+    text = text_of("primera línea\nsegunda línea larga", token_budget=6)
+    assert text == "primera línea\nsegunda" + TRUNCATION_MARK
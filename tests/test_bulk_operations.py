@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.gmail.gmail_label_service import apply_bulk_operations, get_label_index
+from benchmarks.fake_gmail import FakeGmailApi, build_fake_gmail_service
+
+
+@pytest.fixture
+def api(monkeypatch):
+    api = FakeGmailApi(latency=0, per_item=0)
+    service = build_fake_gmail_service(api)
+    monkeypatch.setattr(main, "get_gmail_service", lambda: service)
+    get_label_index().clear()
+    yield api
+    get_label_index().clear()
+
+
+def bulk(api, operations):
+    return asyncio.run(apply_bulk_operations(main.get_gmail_service(), operations))
+
+
+def by_id(results):
+    return {result["id"]: result for result in results}
+
+
+def test_ids_with_the_same_changes_share_one_batch_modify(api):
+    results = bulk(api, [
+        {"action": "archive", "message_ids": ["m1", "m2"]},
+        {"action": "mark_read", "message_ids": ["m3"]},
+        {"action": "archive", "message_ids": ["m4", "m1"]},
+        {"action": "label", "message_ids": ["m5"], "label_name": "Facturas"},
+    ])
+    assert api.calls["messages.batchModify"] == 3
+    bodies = sorted(api.batch_modifies, key=lambda body: body["ids"])
+    assert bodies[0] == {"ids": ["m1", "m2", "m4"], "addLabelIds": [], "removeLabelIds": ["INBOX"]}
+    assert bodies[1] == {"ids": ["m3"], "addLabelIds": [], "removeLabelIds": ["UNREAD"]}
+    assert bodies[2]["ids"] == ["m5"] and bodies[2]["addLabelIds"] == ["Label_2"]
+    assert len(results) == 5 and all(r["status"] == "ok" for r in results)
+
+
+def test_conflicting_ops_for_one_id_apply_in_request_order(api):
+    results = by_id(bulk(api, [
+        {"action": "mark_read", "message_ids": ["m1", "m2"]},
+        {"action": "mark_unread", "message_ids": ["m1"]},
+        {"action": "trash", "message_ids": ["m2"]},
+        {"action": "archive", "message_ids": ["m2"]},
+    ]))
+    assert (results["m1"]["action"], results["m1"]["addLabelIds"], results["m1"]["removeLabelIds"]) == (
+        "mark_unread", ["UNREAD"], []
+    )
+    assert results["m2"]["actions"] == ["mark_read", "trash", "archive"]
+    assert (results["m2"]["addLabelIds"], results["m2"]["removeLabelIds"]) == (["TRASH"], ["INBOX", "UNREAD"])
+    # Un solo batchModify por resultado distinto, no uno por acción
+    assert api.calls["messages.batchModify"] == 2
+
+
+def test_chunks_of_at_most_1000_ids(api):
+    ids = [f"m{i}" for i in range(2500)]
+    results = bulk(api, [{"action": "archive", "message_ids": ids}])
+    assert [len(body["ids"]) for body in api.batch_modifies] == [1000, 1000, 500]
+    assert [r["id"] for r in results] == ids
+
+
+def test_unknown_action_or_missing_label_is_400(api):
+    with TestClient(main.app) as client:
+        response = client.post("/emails/bulk", json={"operations": [
+            {"action": "archive", "message_ids": ["m1"]},
+            {"action": "explode", "message_ids": ["m2"]},
+        ]})
+        assert response.status_code == 400
+        assert "explode" in response.json()["detail"]
+
+        response = client.post("/emails/bulk", json={"operations": [
+            {"action": "label", "message_ids": ["m1"]},
+        ]})
+        assert response.status_code == 400
+    assert api.calls["messages.batchModify"] == 0
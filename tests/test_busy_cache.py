@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.calendar.busy_cache import TIMEZONE, CalendarBusyCache, to_timestamp
+from benchmarks.fake_calendar import FakeCalendarApi, build_fake_calendar_service
+
+
+@pytest.fixture
+def api():
+    return FakeCalendarApi(latency=0, per_item=0)
+
+
+@pytest.fixture
+def service(api):
+    return build_fake_calendar_service(api)
+
+
+def slot(hour, minutes=30):
+    day = datetime.now(TIMEZONE) + timedelta(days=1)
+    start = day.replace(hour=hour, minute=0, second=0, microsecond=0, tzinfo=None)
+    return to_timestamp(start), to_timestamp(start + timedelta(minutes=minutes))
+
+
+async def wait_fill(cache):
+    if cache._fill_task is not None:
+        await asyncio.wait([cache._fill_task])
+    # Los done-callbacks corren en la siguiente vuelta del loop
+    await asyncio.sleep(0)
+
+
+def test_cold_cache_answers_from_freebusy_then_hands_off_to_the_index(api, service):
+    api.add_event(*slot(10, 60), summary="Comité")
+    cache = CalendarBusyCache()
+
+    async def scenario():
+        # Fría: responde freebusy (sin títulos) y se llena en segundo plano
+        first = await cache.first_conflict(service, *slot(10))
+        assert cache.stats()["filling"]
+        await wait_fill(cache)
+        second = await cache.first_conflict(service, *slot(10))
+        free = await cache.first_conflict(service, *slot(12))
+        return first, second, free
+
+    first, second, free = asyncio.run(scenario())
+    assert (first, second, free) == ("Ocupado", "Comité", None)
+    assert (cache.freebusy_queries, cache.local_queries, cache.full_syncs) == (1, 2, 1)
+    assert api.calls["events.list"] == 1
+
+
+def test_failed_fill_is_logged_and_retried(api, service, capsys):
+    api.list_errors = 1
+    cache = CalendarBusyCache()
+
+    async def scenario():
+        loop_errors = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: loop_errors.append(context))
+        await cache.first_conflict(service, *slot(10))
+        await wait_fill(cache)
+        assert (cache.ready, cache.fill_errors) == (False, 1)
+
+        # La siguiente consulta vuelve a intentarlo
+        await cache.first_conflict(service, *slot(10))
+        await wait_fill(cache)
+        return loop_errors
+
+    assert asyncio.run(scenario()) == []
+    assert cache.ready and cache.stats()["filling"] is False
+    assert "Error llenando la cache de agenda" in capsys.readouterr().out
+    assert api.calls["events.list"] == 2
+
+
+def test_expired_sync_token_triggers_full_resync(api, service):
+    cache = CalendarBusyCache(max_age=0)
+
+    async def scenario():
+        await cache.refresh(service)
+        api.add_event(*slot(10), summary="Incremental")
+        assert await cache.first_conflict(service, *slot(10)) == "Incremental"
+        assert (cache.full_syncs, cache.incremental_syncs) == (1, 1)
+
+        # 410: el syncToken ya no vale, se vuelve a llenar la ventana entera
+        api.expire_sync_tokens()
+        api.add_event(*slot(12), summary="Tras el 410")
+        assert await cache.first_conflict(service, *slot(12)) == "Tras el 410"
+        assert await cache.first_conflict(service, *slot(10)) == "Incremental"
+
+    asyncio.run(scenario())
+    assert cache.full_syncs == 2
+    assert cache.freebusy_queries == 0
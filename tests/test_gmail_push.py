@@ -0,0 +1,124 @@
+import asyncio
+
+import httpx
+import pytest
+
+import app.main as main
+from app.gmail import gmail_push_service, message_store
+from app.gmail.gmail_push_service import InvalidPushMessage, PushIngestor, decode_push_message
+from app.gmail.mailbox_events import MailboxEventHub, get_mailbox_events
+from app.gmail.message_store import MessageStore, full_resync
+from benchmarks.fake_gmail import FakeGmailApi, build_fake_gmail_service
+from benchmarks.fake_pubsub import FakePubSubPublisher, build_push_envelope
+
+TOKEN = "push-secret"
+
+
+@pytest.fixture
+def api():
+    return FakeGmailApi(latency=0, per_item=0)
+
+
+@pytest.fixture
+def push(api, monkeypatch):
+    """App con el push activado, un almacén propio y el ingestor sobre la API falsa."""
+    service = build_fake_gmail_service(api)
+    store = MessageStore(":memory:")
+    monkeypatch.setattr(message_store, "_store", store)
+    monkeypatch.setattr(main, "PUSH_ENABLED", True)
+    monkeypatch.setattr(main, "GMAIL_PUSH_VERIFICATION_TOKEN", TOKEN)
+    ingestor = PushIngestor(store, get_service=lambda: service)
+    monkeypatch.setattr(gmail_push_service, "_ingestor", ingestor)
+    return service, store, ingestor
+
+
+def publisher(client, token=TOKEN):
+    return FakePubSubPublisher("/gmail/push", token=token, client=client)
+
+
+def app_client():
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://app")
+
+
+def test_decode_push_message_round_trip_and_invalid_bodies():
+    envelope = build_push_envelope("me@example.com", 12345, 7)
+    assert decode_push_message(envelope) == {"emailAddress": "me@example.com", "historyId": 12345, "messageId": "7"}
+
+    for body in ({}, {"message": {}}, {"message": {"data": "no es base64 json"}}, []):
+        with pytest.raises(InvalidPushMessage):
+            decode_push_message(body)
+
+
+def test_webhook_requires_push_enabled_and_the_verification_token(push, monkeypatch):
+    async def scenario():
+        async with app_client() as client:
+            statuses = [
+                await publisher(client, token=None).publish("me@example.com", 1),
+                await publisher(client, token="otro").publish("me@example.com", 1),
+                # Cuerpo inválido con token correcto: ack (204) para que Pub/Sub no reintente
+                (await client.post("/gmail/push", params={"token": TOKEN}, json={"message": {}})).status_code,
+            ]
+            monkeypatch.setattr(main, "PUSH_ENABLED", False)
+            statuses.append(await publisher(client).publish("me@example.com", 1))
+            return statuses
+
+    assert asyncio.run(scenario()) == [403, 403, 204, 404]
+    assert push[2].received == 0
+
+
+def test_duplicate_and_out_of_order_notifications_are_ignored(api, push):
+    service, store, ingestor = push
+
+    async def scenario():
+        await full_resync(service, store)
+        first = api.deliver("n1")
+        second = api.deliver("n2")
+        async with app_client() as client:
+            pubsub = publisher(client)
+            assert await pubsub.publish("me@example.com", second) == 204
+            await pubsub.publish("me@example.com", second)  # duplicado
+            await pubsub.publish("me@example.com", first)  # llega tarde
+            await ingestor.join()
+            # Otra cuenta: se ignora sin sincronizar
+            await pubsub.publish("otra@example.com", second + 10)
+
+    asyncio.run(scenario())
+    assert (ingestor.received, ingestor.ignored, ingestor.syncs) == (3, 2, 1)
+    assert api.calls["history.list"] == 1
+    assert store.has_message("n1") and store.has_message("n2")
+
+
+def test_sync_changes_fan_out_to_every_sse_subscriber(api, push):
+    service, store, ingestor = push
+    hub = get_mailbox_events()
+
+    async def scenario():
+        await full_resync(service, store)
+        queues = [hub.subscribe(), hub.subscribe()]
+        try:
+            history_id = api.deliver("n1")
+            async with app_client() as client:
+                await publisher(client).publish("me@example.com", history_id)
+                await ingestor.join()
+            return [queue.get_nowait() for queue in queues], [queue.qsize() for queue in queues]
+        finally:
+            for queue in queues:
+                hub.unsubscribe(queue)
+
+    events, left = asyncio.run(scenario())
+    assert events[0] == events[1]
+    assert (events[0]["added"], events[0]["resync"]) == (["n1"], False)
+    assert left == [0, 0]
+
+
+def test_slow_subscriber_drops_oldest_events():
+    async def scenario():
+        hub = MailboxEventHub(queue_size=2)
+        queue = hub.subscribe()
+        for i in range(3):
+            hub.publish({"historyId": str(i)})
+        return [queue.get_nowait()["historyId"] for _ in range(2)], hub.stats()
+
+    received, stats = asyncio.run(scenario())
+    assert received == ["1", "2"]
+    assert (stats["published"], stats["dropped"], stats["subscribers"]) == (3, 1, 1)
@@ -0,0 +1,73 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+from app.auth import async_http, google_auth
+
+
+class FakeRefreshCredentials(Credentials):
+    """Renovación sin red: cuenta las llamadas y deja un token nuevo."""
+
+    refreshes = 0
+
+    def refresh(self, request):
+        type(self).refreshes += 1
+        self.token = f"token-{self.refreshes}"
+        self.expiry = datetime.utcnow() + timedelta(hours=1)
+
+
+def expired_credentials():
+    FakeRefreshCredentials.refreshes = 0
+    return FakeRefreshCredentials(
+        token="old", refresh_token="refresh", client_id="id", client_secret="secret",
+        token_uri="https://oauth2.googleapis.com/token",
+        expiry=datetime.utcnow() - timedelta(minutes=1),
+    )
+
+
+@pytest.fixture
+def token_path(tmp_path, monkeypatch):
+    path = tmp_path / "token.json"
+    monkeypatch.setattr(google_auth, "TOKEN_PATH", str(path))
+    google_auth.invalidate_credentials()
+    yield path
+    google_auth.invalidate_credentials()
+
+
+def test_refresh_persists_token_and_drops_cached_services(token_path):
+    creds = expired_credentials()
+    google_auth._set_credentials(creds)
+    google_auth._services[("gmail", "v1", id(creds))] = (object(), 0)
+
+    assert google_auth.get_credentials() is creds
+    assert FakeRefreshCredentials.refreshes == 1
+    assert json.loads(token_path.read_text())["token"] == "token-1"
+    assert google_auth._services == {}
+
+    # Ya válidas: no se vuelven a renovar
+    assert google_auth.refresh_credentials(creds) is creds
+    assert FakeRefreshCredentials.refreshes == 1
+
+
+def test_stale_credentials_are_refreshed_but_not_persisted(token_path):
+    current, stale = expired_credentials(), expired_credentials()
+    google_auth._set_credentials(current)
+
+    google_auth.refresh_credentials(stale)
+    assert stale.valid
+    assert not token_path.exists()
+    assert google_auth._credentials is current
+
+
+def test_connection_slots_are_per_event_loop():
+    async def slots():
+        first = async_http._connection_slots()
+        assert async_http._connection_slots() is first
+        async with first:
+            pass
+        return first
+
+    assert asyncio.run(slots()) is not asyncio.run(slots())
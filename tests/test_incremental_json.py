@@ -0,0 +1,115 @@
+import json
+
+import pytest
+
+from app.ai import email_analysis_service
+from app.ai.incremental_json import IncrementalJsonObjectParser
+from app.ai.llm_backends import FakeLlmBackend, set_llm_backend
+from app.ai.llm_resilience import CircuitOpenError
+
+DOCUMENT = {
+    "summary": 'Dice "hola", usa \\ y ñ, {no es} [un objeto]',
+    "meeting_detected": True,
+    "duration_minutes": 45,
+    "proposed_datetime": None,
+    "attendees": [{"email": "a@example.com", "tags": ["x", "y"]}, {"email": "b@example.com"}],
+    "extra": {"nested": {"deep": [1, 2, {"k": "v,}"}]}},
+    "is_important": False,
+}
+
+
+def feed_all(parser, chunks):
+    fields = []
+    for chunk in chunks:
+        fields.extend(parser.feed(chunk))
+    return fields
+
+
+def test_whole_document_in_order():
+    parser = IncrementalJsonObjectParser()
+    fields = parser.feed(json.dumps(DOCUMENT, ensure_ascii=False))
+    assert fields == list(DOCUMENT.items())
+    assert parser.finished
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+def test_tokens_split_across_chunks(size):
+    text = "```json\n" + json.dumps(DOCUMENT, indent=2) + "\n```"
+    parser = IncrementalJsonObjectParser()
+    fields = feed_all(parser, [text[i:i + size] for i in range(0, len(text), size)])
+    assert fields == list(DOCUMENT.items())
+    assert parser.fields == DOCUMENT
+
+
+def test_escapes_inside_keys_and_values():
+    text = r'{"qu\"ote": "a\\", "uniñ": "é\n\"}", "end": 1}'
+    parser = IncrementalJsonObjectParser()
+    fields = feed_all(parser, list(text))
+    assert fields == [('qu"ote', "a\\"), ("uniñ", 'é\n"}'), ("end", 1)]
+
+
+def test_field_emitted_as_soon_as_complete():
+    parser = IncrementalJsonObjectParser()
+    assert parser.feed('{"summary": "Reuni') == []
+    assert parser.feed('ón el lunes", "tags": ["a"') == [("summary", "Reunión el lunes")]
+    assert parser.feed(', "b"]') == [("tags", ["a", "b"])]
+    # Un escalar solo está completo al llegar la coma o el cierre
+    assert parser.feed(', "count": 12') == []
+    assert parser.feed("3}") == [("count", 123)]
+    assert parser.finished
+
+
+def test_truncated_input_keeps_only_complete_fields():
+    parser = IncrementalJsonObjectParser()
+    fields = parser.feed('{"summary": "ok", "nested": {"a": [1, 2], "b": "sin cerr')
+    assert fields == [("summary", "ok")]
+    assert not parser.finished
+    assert parser.fields == {"summary": "ok"}
+
+
+def test_invalid_value_is_skipped_and_text_after_object_ignored():
+    parser = IncrementalJsonObjectParser()
+    fields = parser.feed('{"bad": tru, "good": null} {"ignored": 1}')
+    assert fields == [("good", None)]
+    assert parser.finished
+
+
+# =========================
+# analyze_email_stream: eventos tipados
+# =========================
+@pytest.fixture
+def fake_backend():
+    def install(analysis):
+        backend = FakeLlmBackend(latency=0, token_delay=0, analysis=analysis)
+        set_llm_backend(backend)
+        return backend
+
+    yield install
+    set_llm_backend(None)
+
+
+def test_model_fields_named_like_control_events_are_fields(fake_backend):
+    analysis = {"summary": "Resumen", "error": "campo del modelo", "done": False, "is_important": True}
+    fake_backend(analysis)
+    events = list(email_analysis_service.analyze_email_stream("Correo con campos raros " * 3))
+
+    assert [e for e in events if e[0] != "field"] == [("done", events[-1][1])]
+    fields = {key: value for kind, key, value in events[:-1]}
+    assert fields["error"] == "campo del modelo" and fields["done"] is False
+
+
+def test_circuit_open_fallback_ends_with_done_not_error(fake_backend, monkeypatch):
+    fake_backend({"summary": "no se usa"})
+
+    class OpenGuard:
+        timeout = 1
+
+        def streaming(self):
+            raise CircuitOpenError("circuito abierto")
+
+    monkeypatch.setattr(email_analysis_service, "get_llm_guard", lambda: OpenGuard())
+    events = list(email_analysis_service.analyze_email_stream("Otro correo distinto para el stream"))
+
+    kinds = [event[0] for event in events]
+    assert "error" not in kinds and kinds[-1] == "done"
+    assert events[-1][1]["degraded"] is True
@@ -0,0 +1,123 @@
+import threading
+import time
+
+import pytest
+
+from app.ai.llm_resilience import CircuitBreaker, CircuitOpenError, LlmGuard, LlmTimeoutError
+
+
+def make_guard(failures=3, cooldown=30, **kwargs):
+    options = {"timeout": 1, "max_retries": 2, "backoff": 0}
+    options.update(kwargs)
+    return LlmGuard(breaker=CircuitBreaker(failures=failures, cooldown=cooldown), **options)
+
+
+def failing(timeout):
+    raise ConnectionError("503 Backend Error")
+
+
+def test_breaker_counts_failed_calls_not_attempts():
+    guard = make_guard(failures=3)
+    for expected in (1, 2):
+        with pytest.raises(ConnectionError):
+            guard.call(failing)
+        assert (guard.breaker.state, guard.breaker.consecutive_failures) == ("closed", expected)
+    assert (guard.calls, guard.retries) == (6, 4)
+
+    with pytest.raises(ConnectionError):
+        guard.call(failing)
+    assert guard.breaker.state == "open"
+
+    # Abierto: ni siquiera se llama
+    with pytest.raises(CircuitOpenError):
+        guard.call(lambda timeout: pytest.fail("no debería llamarse"))
+    assert guard.short_circuited == 1
+
+
+def test_retried_call_that_succeeds_resets_failures():
+    guard = make_guard(failures=2)
+    with pytest.raises(ConnectionError):
+        guard.call(failing)
+    attempts = []
+
+    def flaky(timeout):
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("reset")
+        return "ok"
+
+    assert guard.call(flaky) == "ok"
+    assert (guard.breaker.state, guard.breaker.consecutive_failures) == ("closed", 0)
+
+
+def test_half_open_lets_one_trial_through_then_closes_or_reopens():
+    guard = make_guard(failures=1, cooldown=0.05, max_retries=0)
+    with pytest.raises(ConnectionError):
+        guard.call(failing)
+    assert guard.breaker.state == "open"
+
+    # Tras el enfriamiento la prueba falla: vuelve a open
+    time.sleep(0.06)
+    with pytest.raises(ConnectionError):
+        guard.call(failing)
+    assert (guard.breaker.state, guard.breaker.times_opened) == ("open", 2)
+
+    # Mientras la prueba está en vuelo, el resto de llamadas no pasa
+    time.sleep(0.06)
+    started, release = threading.Event(), threading.Event()
+
+    def trial(timeout):
+        started.set()
+        release.wait()
+        return "ok"
+
+    result = []
+    thread = threading.Thread(target=lambda: result.append(guard.call(trial)))
+    thread.start()
+    started.wait()
+    assert guard.breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        guard.call(lambda timeout: "ok")
+    release.set()
+    thread.join()
+    assert result == ["ok"] and guard.breaker.state == "closed"
+
+
+def test_deadline_raises_timeout_and_counts_it():
+    guard = make_guard(timeout=0.05, max_retries=0)
+    release = threading.Event()
+    started = time.perf_counter()
+    with pytest.raises(LlmTimeoutError):
+        guard.call(lambda timeout: release.wait())
+    assert time.perf_counter() - started < 0.5
+    assert guard.timeouts == 1 and guard.metrics()["abandoned_in_flight"] == 1
+
+    release.set()
+    for _ in range(100):
+        if not guard.metrics()["abandoned_in_flight"]:
+            break
+        time.sleep(0.01)
+    assert guard.metrics()["abandoned_in_flight"] == 0
+
+
+def test_saturated_executor_fails_fast():
+    guard = make_guard(failures=10, timeout=0.05, max_retries=0, max_in_flight=2)
+    release = threading.Event()
+    for _ in range(2):
+        with pytest.raises(LlmTimeoutError):
+            guard.call(lambda timeout: release.wait())
+
+    # Los dos hilos siguen colgados: no se encola a esperar el deadline
+    called = []
+    started = time.perf_counter()
+    with pytest.raises(CircuitOpenError):
+        guard.call(lambda timeout: called.append(1))
+    assert time.perf_counter() - started < 0.02
+    assert called == [] and guard.saturated == 1
+
+    release.set()
+    for _ in range(100):
+        if not guard.metrics()["abandoned_in_flight"]:
+            break
+        time.sleep(0.01)
+    assert guard.call(lambda timeout: "ok") == "ok"
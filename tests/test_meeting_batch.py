@@ -0,0 +1,77 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.calendar import calendar_service
+from app.calendar.busy_cache import TIMEZONE, clear_busy_caches, get_busy_cache, to_timestamp
+from benchmarks.fake_calendar import FakeCalendarApi, build_fake_calendar_service
+
+
+@pytest.fixture
+def api(monkeypatch):
+    api = FakeCalendarApi(latency=0, per_item=0)
+    service = build_fake_calendar_service(api)
+    monkeypatch.setattr(calendar_service, "get_calendar_service", lambda credentials: service)
+    clear_busy_caches()
+    yield api
+    clear_busy_caches()
+
+
+def meeting(title, start, minutes=60):
+    return {"title": title, "start_datetime": start, "duration_minutes": minutes, "attendees": []}
+
+
+def tomorrow_at(hour, minute=0):
+    day = datetime.now(TIMEZONE) + timedelta(days=1)
+    return day.replace(hour=hour, minute=minute, second=0, microsecond=0, tzinfo=None)
+
+
+def fail_inserts(monkeypatch, titles):
+    """Las inserciones de `titles` fallan la primera vez que se intentan."""
+    original = calendar_service._execute_batch_http
+    remaining = set(titles)
+
+    def execute(service, requests):
+        failing = {
+            request_id for request_id, request in requests.items()
+            if json.loads(request.body)["summary"] in remaining
+        }
+        responses = original(service, {k: v for k, v in requests.items() if k not in failing})
+        for request_id in failing:
+            remaining.discard(json.loads(requests[request_id].body)["summary"])
+            responses[request_id] = (None, RuntimeError("503 Backend Error"))
+        return responses
+
+    monkeypatch.setattr(calendar_service, "_execute_batch_http", execute)
+
+
+def test_batch_conflicts_first_meeting_wins(api):
+    results = asyncio.run(calendar_service.create_meetings_batch(None, [
+        meeting("A", tomorrow_at(10)),
+        meeting("B", tomorrow_at(10, 30)),
+        meeting("C", tomorrow_at(12)),
+    ]))
+    assert [r["status"] for r in results] == ["created", "conflict", "created"]
+    assert "'A'" in results[1]["detail"]
+
+
+def test_failed_insert_does_not_leave_phantom_busy_block(api, monkeypatch):
+    fail_inserts(monkeypatch, {"A"})
+    results = asyncio.run(calendar_service.create_meetings_batch(None, [
+        meeting("A", tomorrow_at(10)),
+        meeting("B", tomorrow_at(10, 30)),
+        meeting("C", tomorrow_at(10, 45)),
+    ]))
+    # A falla; B deja de chocar y se crea; C choca con B (que sí existe)
+    assert [r["status"] for r in results] == ["error", "created", "conflict"]
+    assert "'B'" in results[2]["detail"]
+    assert sorted(e["summary"] for e in api.events.values()) == ["B"]
+
+    # Tampoco queda nada de A para comprobaciones posteriores
+    start = to_timestamp(TIMEZONE.localize(tomorrow_at(10)))
+    conflict = asyncio.run(get_busy_cache().first_conflict(
+        calendar_service.get_calendar_service(None), start, start + 15 * 60
+    ))
+    assert conflict is None
@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+
+from app.gmail import message_store
+from app.gmail.message_store import (
+    MessageStore,
+    get_thread_summary,
+    list_messages_page,
+    sync_message_store,
+)
+from benchmarks.fake_gmail import FakeGmailApi, build_fake_gmail_service
+
+
+@pytest.fixture
+def api():
+    return FakeGmailApi(latency=0, per_item=0, total_messages=12)
+
+
+@pytest.fixture
+def service(api):
+    return build_fake_gmail_service(api)
+
+
+@pytest.fixture
+def store():
+    return MessageStore(":memory:")
+
+
+@pytest.fixture
+def changes(monkeypatch):
+    received = []
+    monkeypatch.setattr(message_store, "_change_listeners", [received.append])
+    return received
+
+
+def page_ids(messages):
+    return [m["id"] for m in messages]
+
+
+# =========================
+# PAGINACIÓN
+# =========================
+def test_first_page_from_store_continues_with_gmail_cursor(api, service, store):
+    async def scenario():
+        # m5..m9 se guardan antes que m0..m4 y todos tienen el mismo internalDate
+        second, _ = await list_messages_page(service, store, "INBOX", page_size=5, cursor="5")
+        first, cursor = await list_messages_page(service, store, "INBOX", page_size=5)
+        requests = api.requests
+        again, again_cursor = await list_messages_page(service, store, "INBOX", page_size=5)
+        assert api.requests == requests
+        return first, second, again, cursor, again_cursor
+
+    first, second, again, cursor, again_cursor = asyncio.run(scenario())
+    assert page_ids(first) == page_ids(again) == ["m0", "m1", "m2", "m3", "m4"]
+    assert page_ids(second) == ["m5", "m6", "m7", "m8", "m9"]
+    assert again_cursor == cursor
+
+
+def test_list_by_label_breaks_internal_date_ties_by_id(store):
+    for message_id, internal_date in (("a", 1), ("c", 2), ("b", 2)):
+        store.save_message({"id": message_id, "internalDate": str(internal_date), "labelIds": ["INBOX"]})
+    assert page_ids(store.list_by_label("INBOX", 3)) == ["c", "b", "a"]
+    assert page_ids(store.list_by_label("ALL_MAIL", 3)) == ["c", "b", "a"]
+
+
+# =========================
+# HILOS
+# =========================
+def test_cached_thread_summary_sees_reply_that_arrived_since_last_poll(api, service, store):
+    async def scenario():
+        await sync_message_store(service, store)
+        first = await get_thread_summary(service, store, "tm1")
+        cached = await get_thread_summary(service, store, "tm1")
+        assert api.calls["threads.get"] == 1
+
+        # Llega una respuesta al hilo y todavía no ha pasado el polling
+        api.thread_size = 2
+        api.history_id += 1
+        api.history.append({
+            "id": str(api.history_id),
+            "messages": [{"id": "m1-r1", "threadId": "tm1"}],
+            "messagesAdded": [{"message": {"id": "m1-r1", "threadId": "tm1", "labelIds": ["SENT"]}}],
+        })
+        fresh = await get_thread_summary(service, store, "tm1")
+        return first, cached, fresh
+
+    first, cached, fresh = asyncio.run(scenario())
+    assert first == cached and first["messageCount"] == 1
+    assert fresh["messageCount"] == 2 and fresh["messages"][-1]["id"] == "m1-r1"
+    assert api.calls["threads.get"] == 2
+
+
+# =========================
+# SYNC INCREMENTAL
+# =========================
+def test_incremental_sync_applies_added_deleted_and_label_changes(api, service, store, changes):
+    async def scenario():
+        await sync_message_store(service, store)
+        await list_messages_page(service, store, "INBOX", page_size=5)
+        store.save_analysis("m0", {"category": "work"})
+
+        api.deliver("n1")
+        api.delete("m0")
+        api.change_labels("m1", add=["STARRED"], remove=["UNREAD"])
+        await sync_message_store(service, store)
+
+    asyncio.run(scenario())
+    assert store.has_message("n1")
+    assert not store.has_message("m0") and store.get_analysis("m0") is None
+    assert "STARRED" in store.get_message("m1")["labelIds"]
+    assert "UNREAD" not in store.get_message("m1")["labelIds"]
+    assert store.get_history_id() == str(api.history_id)
+    assert changes[-1] == {
+        "historyId": str(api.history_id),
+        "added": ["n1"],
+        "deleted": ["m0"],
+        "updated": ["m1"],
+        "resync": False,
+    }
+    # Un solo history.list por sincronización, y el mensaje nuevo solo con metadatos
+    assert api.calls["history.list"] == 1
+    assert not store.has_body("n1")
+
+
+def test_incremental_sync_without_changes_notifies_nothing(api, service, store, changes):
+    async def scenario():
+        await sync_message_store(service, store)
+        await sync_message_store(service, store)
+
+    asyncio.run(scenario())
+    assert [c["resync"] for c in changes] == [True]
+
+
+# =========================
+# RESYNC
+# =========================
+def test_expired_history_resyncs_and_keeps_analyses_of_existing_messages(api, service, store, changes):
+    async def scenario():
+        await sync_message_store(service, store)
+        await list_messages_page(service, store, "INBOX", page_size=5)
+        await get_thread_summary(service, store, "tm1")
+        store.save_analysis("m1", {"category": "work"})
+        store.save_analysis("m2", {"category": "spam"})
+
+        # m2 se borra mientras el historial caduca: Gmail ya no dirá que se borró
+        api.deleted.add("m2")
+        api.history_id += 1
+        api.expire_history()
+        await sync_message_store(service, store)
+
+    asyncio.run(scenario())
+    assert changes[-1]["resync"] is True
+    assert store.get_history_id() == str(api.history_id)
+    assert not store.has_message("m1")
+    assert store.get_thread_summary("tm1") is None
+    assert store.get_analysis("m1") == {"category": "work"}
+    assert store.get_analysis("m2") is None
+
+
+def test_logout_clear_still_wipes_analyses(store):
+    store.save_analysis("m1", {"category": "work"})
+    store.clear()
+    assert store.get_analysis("m1") is None
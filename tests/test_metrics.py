@@ -0,0 +1,117 @@
+import re
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.observability.metrics import (
+    HTTP_LATENCY,
+    HTTP_REQUESTS,
+    Counter,
+    Histogram,
+    MetricsMiddleware,
+    MetricsRegistry,
+    RequestTiming,
+    stage,
+)
+
+SERVER_TIMING_ENTRY = re.compile(r'^[a-z]+;dur=\d+\.\d(;desc="\d+x")?$')
+
+
+def build_app():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        with stage("cache"):
+            pass
+        with stage("cache"):
+            pass
+        with stage("google"):
+            pass
+        return {"id": item_id}
+
+    return app
+
+
+def requests_for(route):
+    return {key: value for key, value in HTTP_REQUESTS.values().items() if key[1] == route}
+
+
+# =========================
+# ETIQUETAS DE RUTA
+# =========================
+def test_requests_are_labelled_by_route_template():
+    with TestClient(build_app()) as client:
+        for item_id in ("1", "2", "abc"):
+            assert client.get(f"/items/{item_id}").status_code == 200
+
+    assert requests_for("/items/{item_id}")[("GET", "/items/{item_id}", "200")] >= 3
+    # Ninguna serie con el id concreto
+    assert not [key for key in HTTP_REQUESTS.values() if key[1].startswith("/items/") and "{" not in key[1]]
+    latency = [sample for sample in HTTP_LATENCY.samples() if 'route="/items/{item_id}"' in sample[0]]
+    assert latency
+
+
+def test_unknown_paths_share_the_unmatched_label():
+    before = requests_for("unmatched").get(("GET", "unmatched", "404"), 0)
+    with TestClient(build_app()) as client:
+        assert client.get("/nope/1").status_code == 404
+        assert client.get("/nope/2").status_code == 404
+
+    assert requests_for("unmatched")[("GET", "unmatched", "404")] == before + 2
+    assert not [key for key in HTTP_REQUESTS.values() if key[1].startswith("/nope")]
+
+
+def test_app_routes_use_their_template_even_on_error_status(monkeypatch):
+    monkeypatch.setattr("app.observability.profiling.PROFILING_ADMIN_TOKEN", None)
+    with TestClient(main.app) as client:
+        assert client.get("/admin/profiles/123").status_code == 404
+
+    assert ("GET", "/admin/profiles/{profile_id}", "404") in HTTP_REQUESTS.values()
+
+
+# =========================
+# SERVER-TIMING
+# =========================
+def test_server_timing_header_lists_stages_and_total():
+    with TestClient(build_app()) as client:
+        response = client.get("/items/1")
+
+    entries = response.headers["server-timing"].split(", ")
+    assert all(SERVER_TIMING_ENTRY.match(entry) for entry in entries), entries
+    names = [entry.split(";")[0] for entry in entries]
+    assert names == ["cache", "google", "app"]
+    assert entries[0].endswith(';desc="2x"')
+    assert "desc" not in entries[1]
+
+
+def test_request_timing_header_without_stages_has_only_app():
+    header = RequestTiming().header()
+    assert re.fullmatch(r"app;dur=\d+\.\d", header)
+
+
+# =========================
+# FORMATO PROMETHEUS
+# =========================
+def test_registry_renders_counters_histograms_and_collectors():
+    registry = MetricsRegistry()
+    counter = registry.register(Counter("demo_total", "Demo", ("kind",)))
+    histogram = registry.register(Histogram("demo_seconds", "Demo", ("kind",), buckets=(0.1, 1)))
+    registry.add_collector(lambda: [("demo_ratio", "gauge", "Demo", [({"cache": 'a"b'}, 0.5)])])
+    registry.add_collector(lambda: 1 / 0)
+
+    counter.inc(kind="x")
+    counter.inc(2, kind="x")
+    histogram.observe(0.05, kind="x")
+    histogram.observe(5, kind="x")
+
+    lines = registry.render().splitlines()
+    assert 'demo_total{kind="x"} 3' in lines
+    assert 'demo_seconds_bucket{kind="x",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{kind="x",le="1"} 1' in lines
+    assert 'demo_seconds_bucket{kind="x",le="+Inf"} 2' in lines
+    assert 'demo_seconds_count{kind="x"} 2' in lines
+    assert 'demo_ratio{cache="a\\"b"} 0.5' in lines
+    assert "# TYPE demo_seconds histogram" in lines
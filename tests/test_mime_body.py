@@ -0,0 +1,64 @@
+import base64
+
+from app.gmail.gmail_service import decode_part, get_message_body, iter_text_parts
+
+
+def encoded(text, charset="utf-8"):
+    return base64.urlsafe_b64encode(text.encode(charset)).decode().rstrip("=")
+
+
+def text_part(mime_type, text, charset="utf-8", **extra):
+    return {
+        "mimeType": mime_type,
+        "headers": [{"name": "Content-Type", "value": f'{mime_type}; charset="{charset}"'}],
+        "body": {"data": encoded(text, charset)},
+        **extra,
+    }
+
+
+NESTED = {
+    "mimeType": "multipart/mixed",
+    "parts": [
+        {
+            "mimeType": "multipart/related",
+            "parts": [
+                {
+                    "mimeType": "multipart/alternative",
+                    "parts": [
+                        text_part("text/plain", "Reunión mañana, café incluido", charset="iso-8859-1"),
+                        text_part("text/html", "<p>Reunión mañana</p>"),
+                    ],
+                },
+                {"mimeType": "image/png", "body": {"attachmentId": "img"}},
+            ],
+        },
+        text_part("text/plain", "adjunto.txt", filename="adjunto.txt"),
+    ],
+}
+
+
+def test_nested_multipart_in_document_order_without_attachments():
+    parts = list(iter_text_parts(NESTED))
+    assert [mime_type for mime_type, _ in parts] == ["text/plain", "text/html"]
+    assert decode_part(parts[1][1]) == "<p>Reunión mañana</p>"
+
+
+def test_iso_8859_1_part_is_decoded_with_its_charset():
+    assert get_message_body({"payload": NESTED}) == "Reunión mañana, café incluido"
+
+
+def test_html_only_and_unknown_charset():
+    html_only = {"mimeType": "multipart/alternative", "parts": [text_part("text/html", "<b>Hola</b>")]}
+    assert get_message_body({"payload": html_only}) == "<b>Hola</b>"
+
+    part = text_part("text/plain", "Año")
+    part["headers"] = [{"name": "Content-Type", "value": "text/plain; charset=x-desconocido"}]
+    assert decode_part(part) == "Año"
+
+
+def test_single_part_and_metadata_messages():
+    single = {"headers": [], "body": {"data": encoded("Solo texto")}}
+    assert get_message_body({"payload": single}) == "Solo texto"
+    # format="metadata": sin partes ni datos
+    assert get_message_body({"payload": {"mimeType": "text/plain", "headers": []}}) == ""
+    assert get_message_body({}) == ""
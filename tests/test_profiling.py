@@ -0,0 +1,79 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.observability import profiling
+from app.observability.profiling import ProfileStore, StackSampler, check_admin_token
+
+TOKEN = "s3cret"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ADMIN_TOKEN", TOKEN)
+    monkeypatch.setattr(profiling, "_profile_store", ProfileStore())
+    with TestClient(main.app) as client:
+        yield client
+
+
+# =========================
+# /admin/profiles
+# =========================
+@pytest.mark.parametrize("headers", [{}, {"X-Admin-Token": "wrong"}, {"X-Admin-Token": ""}])
+def test_admin_profiles_rejects_missing_or_wrong_token(client, headers):
+    assert client.get("/admin/profiles", headers=headers).status_code == 403
+    assert client.get("/admin/profiles/1-1", headers=headers).status_code == 403
+
+
+def test_admin_profiles_disabled_without_configured_token(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ADMIN_TOKEN", None)
+    assert not check_admin_token("")
+    with TestClient(main.app) as client:
+        response = client.get("/admin/profiles", headers={"X-Admin-Token": "anything"})
+    assert response.status_code == 404
+
+
+def test_profiled_request_can_be_listed_and_downloaded(client):
+    auth = {"X-Admin-Token": TOKEN}
+    response = client.get("/admin/profiles?profile=1", headers=auth)
+    assert response.status_code == 200
+    profile_id = response.headers["x-profile-id"]
+
+    profiles = client.get("/admin/profiles", headers=auth).json()["profiles"]
+    assert [p["id"] for p in profiles] == [profile_id]
+    assert profiles[0]["route"] == "/admin/profiles" and profiles[0]["status"] == 200
+
+    download = client.get(f"/admin/profiles/{profile_id}", headers=auth)
+    assert download.status_code == 200
+    assert f'profile-{profile_id}.folded' in download.headers["content-disposition"]
+    assert client.get("/admin/profiles/0-0", headers=auth).status_code == 404
+
+
+def test_profile_request_without_token_is_rejected_before_running(client):
+    response = client.get("/admin/profiles", headers={"X-Profile": "1"})
+    assert response.status_code == 403
+    assert "x-profile-id" not in response.headers
+    assert profiling.get_profile_store().list() == []
+
+
+def test_requests_without_profile_flag_are_not_sampled(client):
+    response = client.get("/admin/profiles", headers={"X-Admin-Token": TOKEN})
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+
+
+# =========================
+# MUESTREO
+# =========================
+def test_sampler_collapsed_output_counts_identical_stacks():
+    sampler = StackSampler(interval=0.001, max_seconds=1)
+    sampler.stacks.update({"main;a (x.py:1);b (x.py:5)": 3, "main;a (x.py:1)": 1})
+    assert sampler.collapsed() == "main;a (x.py:1);b (x.py:5) 3\nmain;a (x.py:1) 1\n"
+
+
+def test_profile_store_keeps_most_recent_first_and_bounded():
+    store = ProfileStore(max_profiles=2)
+    for i in range(3):
+        store.add({"id": str(i)}, f"stack {i}\n")
+    assert [info["id"] for info in store.list()] == ["2", "1"]
+    assert store.get("0") is None and store.get("2") == "stack 2\n"
@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+from app.auth import quota
+from app.auth.quota import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    QuotaScheduler,
+    TokenBucket,
+    is_rate_limited,
+    method_cost,
+)
+
+
+def test_method_cost_uses_gmail_table_and_one_unit_elsewhere():
+    assert method_cost("gmail.users.messages.get") == ("gmail", 5)
+    assert method_cost("gmail.users.messages.batchModify") == ("gmail", 50)
+    assert method_cost("gmail.users.unknown") == ("gmail", quota.DEFAULT_GMAIL_COST)
+    assert method_cost("calendar.events.insert") == ("calendar", 1)
+
+
+def test_rate_limit_detection():
+    assert is_rate_limited(429, None)
+    assert is_rate_limited(403, b'{"reason": "userRateLimitExceeded"}')
+    assert not is_rate_limited(403, b'{"reason": "insufficientPermissions"}')
+    assert not is_rate_limited(500, b"rateLimitExceeded")
+
+
+def test_interactive_acquires_go_ahead_of_queued_background():
+    async def scenario():
+        bucket = TokenBucket(rate=100, burst_seconds=0.1)  # 10 unidades
+        await bucket.acquire(10, PRIORITY_BACKGROUND)
+        order = []
+
+        async def take(name, priority):
+            await bucket.acquire(5, priority)
+            order.append(name)
+
+        tasks = [asyncio.create_task(take(f"bg{i}", PRIORITY_BACKGROUND)) for i in range(3)]
+        await asyncio.sleep(0)
+        assert bucket.queued == 3
+        tasks += [asyncio.create_task(take(f"ui{i}", PRIORITY_INTERACTIVE)) for i in range(2)]
+        await asyncio.gather(*tasks)
+        return order
+
+    # Las interactivas adelantan a las de fondo ya encoladas; FIFO dentro de cada prioridad
+    assert asyncio.run(scenario()) == ["ui0", "ui1", "bg0", "bg1", "bg2"]
+
+
+def test_cancelled_waiter_does_not_block_the_queue():
+    async def scenario():
+        bucket = TokenBucket(rate=100, burst_seconds=0.1)
+        await bucket.acquire(10, PRIORITY_INTERACTIVE)
+        abandoned = asyncio.create_task(bucket.acquire(5, PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0)
+        abandoned.cancel()
+        await asyncio.wait_for(bucket.acquire(5, PRIORITY_BACKGROUND), timeout=1)
+        return bucket.queued
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_pause_after_429_holds_every_acquire_until_backoff_ends():
+    async def scenario():
+        bucket = TokenBucket(rate=1000, burst_seconds=1)
+        bucket.pause(0.2)
+        start = time.monotonic()
+        await bucket.acquire(1, PRIORITY_INTERACTIVE)
+        return time.monotonic() - start
+
+    # Con el bucket lleno antes del 429, sin la pausa saldría al instante
+    assert asyncio.run(scenario()) >= 0.2
+
+
+def test_pause_does_not_refill_during_backoff():
+    async def scenario():
+        bucket = TokenBucket(rate=100, burst_seconds=0.1)
+        bucket.pause(0.1)
+        start = time.monotonic()
+        # 10 unidades: 0.1 s de pausa + 0.1 s rellenando desde cero
+        await bucket.acquire(10, PRIORITY_INTERACTIVE)
+        return time.monotonic() - start
+
+    assert asyncio.run(scenario()) >= 0.19
+
+
+def test_scheduler_backoff_pauses_the_bucket_of_that_api(monkeypatch):
+    monkeypatch.setattr(quota, "QUOTA_ENABLED", True)
+    monkeypatch.setattr(quota, "RATE_LIMIT_BACKOFF_SECONDS", 0.1)
+    monkeypatch.setattr(quota.random, "uniform", lambda a, b: 1.0)
+
+    async def scenario():
+        scheduler = QuotaScheduler()
+        delay = scheduler.backoff("gmail.users.messages.get", "me", attempt=1)
+        start = time.monotonic()
+        await scheduler.acquire("gmail.users.labels.list", user="me")
+        gmail_wait = time.monotonic() - start
+
+        start = time.monotonic()
+        await scheduler.acquire("calendar.events.list", user="me")
+        calendar_wait = time.monotonic() - start
+        return delay, gmail_wait, calendar_wait, scheduler.metrics()
+
+    delay, gmail_wait, calendar_wait, metrics = asyncio.run(scenario())
+    assert delay == 0.2
+    assert gmail_wait >= 0.2
+    assert calendar_wait < 0.1
+    assert metrics["retries"] == 1 and metrics["calls"] == 2
+    assert metrics["queue_wait"]["interactive"]["count"] == 2
@@ -0,0 +1,109 @@
+import asyncio
+from datetime import datetime, timezone
+
+from app.calendar.busy_cache import TIMEZONE
+from app.calendar.slot_finder import (
+    FREEBUSY_MAX_CALENDARS,
+    free_slots,
+    merge_busy,
+    query_busy,
+    suggest_slots,
+    working_windows,
+)
+from benchmarks.fake_calendar import FakeCalendarApi, build_fake_calendar_service
+
+HOUR = 3600
+
+
+def madrid(*args):
+    return TIMEZONE.localize(datetime(*args)).timestamp()
+
+
+# =========================
+# BARRIDO
+# =========================
+def test_merge_busy_sweeps_overlapping_contiguous_and_nested_blocks():
+    primary = [(0, 10), (20, 30), (50, 60)]
+    alice = [(5, 15), (30, 35), (52, 55)]
+    bob = [(40, 45), (100, 110)]
+    assert list(merge_busy([primary, alice, bob])) == [
+        [0, 15],     # solape
+        [20, 35],    # contiguo (30 == 30)
+        [40, 45],
+        [50, 60],    # contenido
+        [100, 110],
+    ]
+
+
+def test_merge_busy_handles_empty_lists():
+    assert list(merge_busy([])) == []
+    assert list(merge_busy([[], [(1, 2)], []])) == [[1, 2]]
+
+
+def test_free_slots_skips_busy_blocks_aligned_to_step():
+    windows = [(0, 8 * HOUR)]
+    busy = [[HOUR, 2 * HOUR + 600]]
+    slots = free_slots(busy, windows, duration=HOUR, count=3, step=900)
+    assert slots == [(0, HOUR), (2 * HOUR + 900, 3 * HOUR + 900), (3 * HOUR + 900, 4 * HOUR + 900)]
+
+
+# =========================
+# CAMBIO DE HORA (Europe/Madrid)
+# =========================
+def test_working_windows_follow_madrid_offset_across_spring_dst():
+    # Domingo 30/03/2025: a las 2:00 pasan a ser las 3:00 (CET -> CEST)
+    start, end = madrid(2025, 3, 28), madrid(2025, 4, 1)
+    windows = list(working_windows(start, end, "09:00", "18:00", work_days={0, 1, 2, 3, 4}))
+    assert windows == [
+        (madrid(2025, 3, 28, 9), madrid(2025, 3, 28, 18)),
+        (madrid(2025, 3, 31, 9), madrid(2025, 3, 31, 18)),
+    ]
+    # 9:00 en Madrid es 8:00 UTC el viernes y 7:00 UTC el lunes
+    assert datetime.fromtimestamp(windows[0][0], timezone.utc).hour == 8
+    assert datetime.fromtimestamp(windows[1][0], timezone.utc).hour == 7
+    assert all(window_end - window_start == 9 * HOUR for window_start, window_end in windows)
+
+
+def test_working_window_that_crosses_the_change_has_its_real_length():
+    every_day = set(range(7))
+    spring = list(working_windows(madrid(2025, 3, 30), madrid(2025, 3, 31), "01:00", "04:00", every_day))
+    autumn = list(working_windows(madrid(2025, 10, 26), madrid(2025, 10, 27), "01:00", "04:00", every_day))
+    assert [end - start for start, end in spring] == [2 * HOUR]
+    assert [end - start for start, end in autumn] == [4 * HOUR]
+
+
+# =========================
+# FREEBUSY
+# =========================
+def test_query_busy_splits_calendars_and_reports_partial_errors():
+    api = FakeCalendarApi(latency=0, per_item=0)
+    service = build_fake_calendar_service(api)
+    start = madrid(2025, 6, 2)
+    api.add_event(start + 10 * HOUR, start + 11 * HOUR)
+    attendees = [f"user{i}@example.com" for i in range(FREEBUSY_MAX_CALENDARS + 9)]
+    for email in attendees[::2]:
+        api.add_busy(email, start + 12 * HOUR, start + 13 * HOUR)
+
+    busy, errors = asyncio.run(query_busy(service, ["primary"] + attendees, start, start + 86400))
+    assert api.calls["freebusy.query"] == 2
+    assert busy["primary"] == [(start + 10 * HOUR, start + 11 * HOUR)]
+    assert set(busy) == {"primary", *attendees[::2]}
+    assert errors == {email: "notFound" for email in attendees[1::2]}
+
+
+def test_suggest_slots_ignores_unavailable_calendars_and_reports_them():
+    api = FakeCalendarApi(latency=0, per_item=0)
+    service = build_fake_calendar_service(api)
+    monday = madrid(2025, 6, 2)
+    api.add_event(monday + 9 * HOUR, monday + 10 * HOUR)
+    api.add_busy("alice@example.com", monday + 10 * HOUR, monday + 11 * HOUR)
+
+    result = asyncio.run(suggest_slots(
+        service, 60, attendees=["alice@example.com", "ghost@example.com"],
+        start=datetime(2025, 6, 2), days=1, count=2,
+    ))
+    assert result["unavailable_calendars"] == {"ghost@example.com": "notFound"}
+    assert [slot["start"] for slot in result["slots"]] == [
+        "2025-06-02T11:00:00+02:00",
+        "2025-06-02T12:00:00+02:00",
+    ]